@@ -1,14 +1,29 @@
+import hashlib
+import inspect
 import json
 import os
 import configparser
 import re
-import requests
-import google.generativeai as genai
+import threading
 import time
 import uuid
-from flask import Flask, render_template, request, jsonify
+from contextlib import nullcontext
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+# First, so the boot clock covers every import below
+from warmup import Warmup, boot
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, stream_with_context
 from twilio.twiml.voice_response import VoiceResponse
-from llm_manager import LLMManager
+from llm_manager import STREAM_TRUNCATED, LLMManager, is_valid_response
+from response_cache import ResponseCache, build_synonyms
+from kb_index import KnowledgeBaseIndex
+from content_bundle import ContentStore
+from session_store import ConversationSession, create_session_store
+from history_window import HistoryWindow, estimate_tokens, message_tokens
+from telemetry import telemetry
+from tenants import Tenant, TenantRegistry
+from speculation import DEFAULT_PREDICTIONS, Speculator
+from audio_cache import CLIP_NAME, AudioCache
 
 app = Flask(__name__)
 
@@ -18,177 +33,227 @@ app = Flask(__name__)
 
 def load_config():
     config = configparser.ConfigParser()
-    config.read('config.ini')
+    # SYLVAN_CONFIG points a process at another config file (e.g. the load benchmark's)
+    config.read(os.environ.get('SYLVAN_CONFIG', 'config.ini'))
     return config
 
 config = load_config()
+telemetry.configure(config)
 
 # ----------------------------
-# Load Knowledge Base JSON
+# Content: Knowledge Base, System Context, Conversation Config
 # ----------------------------
 
-def load_knowledge_base():
-    try:
-        with open('knowledge_base.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print("Error loading knowledge_base.json:", e)
-        return {}
-
-def load_conversation_config():
-    try:
-        with open('conversation_config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print("Error loading conversation_config.json:", e)
-        return {}
-
-knowledge_base = load_knowledge_base()
-conversation_config = load_conversation_config()
+# Every content file is read once into an immutable bundle (prompt, KB index,
+# keyword rules, intent router) that the watcher rebuilds and swaps on change
+content = ContentStore(config)
 
 # ----------------------------
 # Conversation Memory
 # ----------------------------
 
-conversations = {}
-
-class ConversationSession:
-    def __init__(self):
-        self.history = []
-        self.last_active = time.time()
-        self.context = {}
-
-    def add_message(self, role, content):
-        self.history.append({"role": role, "content": content})
-        self.last_active = time.time()
-        # Keep history manageable - last 10 messages (5 turns)
-        if len(self.history) > 10:
-            self.history = self.history[-10:]
-
-    def get_history_string(self):
-        history_str = ""
-        for msg in self.history:
-            role_name = "User" if msg["role"] == "user" else "Receptionist"
-            history_str += f"{role_name}: {msg['content']}\n"
-        return history_str
+# Sessions live in a pluggable store ([sessions] backend = memory | sqlite)
+conversations = create_session_store(config)
+# Token-budgeted history; older turns fold into session.context slots and summary
+history_window = HistoryWindow(config)
 
 def get_session(session_id):
-    # Clean up old sessions first
-    cleanup_sessions()
-    if not session_id or session_id not in conversations:
-        session_id = str(uuid.uuid4())
-        conversations[session_id] = ConversationSession()
-    return session_id, conversations[session_id]
-
-def cleanup_sessions():
-    current_time = time.time()
-    # Remove sessions older than 30 minutes
-    timeout = 30 * 60
-    expired = [sid for sid, session in conversations.items()
-               if current_time - session.last_active > timeout]
-    for sid in expired:
-        del conversations[sid]
+    with telemetry.span('session_fetch'):
+        session = conversations.get(session_id) if session_id else None
+        if session is None:
+            session_id = str(uuid.uuid4())
+            session = ConversationSession(session_id)
+            conversations.save(session)
+    return session_id, session
+
+def get_call_session(call_sid):
+    """Session for a Twilio call, keyed by its CallSid so every utterance shares one history."""
+    if not call_sid:
+        return get_session(None)
+    with telemetry.span('session_fetch'):
+        session = conversations.get(call_sid)
+        if session is None:
+            session = ConversationSession(call_sid)
+            conversations.save(session)
+    return call_sid, session
+
+def record_turn(session, user_message, reply, abandoned=None):
+    """Append a turn to the session and save it.
+
+    abandoned is the Event of a background voice answer: once the call has
+    ended or stopped waiting, the turn is dropped so a deleted session is
+    not saved again and nothing is speculated for it.
+    """
+    # Checked and saved under pending_lock, so end_call cannot delete the session in between
+    with pending_lock if abandoned is not None else nullcontext():
+        if abandoned is not None and abandoned.is_set():
+            print(f"[DEBUG] Dropping a background answer for {session.id}; the call stopped waiting for it.")
+            return
+        session.add_message("user", user_message)
+        session.add_message("assistant", reply)
+        history_window.fold(session)
+        conversations.save(session)
+    speculate(session)
+
+# Twilio CallStatus values after which the call's session can go
+ENDED_CALL_STATUSES = {'completed', 'busy', 'failed', 'no-answer', 'canceled'}
 
 # ----------------------------
-# System Prompt & Context
+# Initialize LLM Manager
 # ----------------------------
 
-def load_system_context():
-    """Load business-specific context from JSON."""
-    try:
-        with open('system_context.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading system_context.json: {e}")
-        return {}
+llm_manager = LLMManager(config, content.current.system_prompt)
 
-system_config = load_system_context()
+# Cache of provider answers for near-identical turns; cleared whenever the
+# content it was built from reloads (all of it for the base directory, one
+# tenant's namespace for a location)
+response_cache = None
+if config.getboolean('cache', 'enabled', fallback=True):
+    response_cache = ResponseCache.from_config(config, content.current.knowledge_base)
 
-def build_system_prompt(config):
-    if not config:
-        return "You are a helpful AI assistant."
+def apply_content(bundle):
+    """Point the long-lived objects at a freshly reloaded content bundle."""
+    llm_manager.set_system_prompt(bundle.system_prompt)
+    if response_cache is not None:
+        response_cache.set_synonyms(build_synonyms(bundle.knowledge_base))
+        response_cache.invalidate()
 
-    biz = config.get('business_profile', {})
-    persona = config.get('agent_persona', {})
-    
-    prompt = f"""You are a {persona.get('role', 'Helpful Assistant')} for {biz.get('name', 'this business')}. {biz.get('description', '')}
-
-**Your Personality:**
-"""
-    for trait in persona.get('tone', []):
-        prompt += f"- {trait}\n"
-
-    prompt += f"""
-**Key Information:**
-- **Location:** {biz.get('location', '')}
-- **Phone:** {biz.get('contact', {}).get('phone', '')}
-- **Services:** {', '.join(config.get('services', []))}
-"""
-    
-    if config.get('key_selling_points'):
-         prompt += "- **Why Choose Us:** " + " ".join(config.get('key_selling_points', [])) + "\n"
-    
-    if config.get('special_offers'):
-        prompt += "\n**Current Special Offers:**\n"
-        for offer in config.get('special_offers', []):
-            prompt += f"- {offer}\n"
-
-    prompt += "\n**Response Guidelines:**\n"
-    for idx, rule in enumerate(persona.get('instructions', []), 1):
-        prompt += f"{idx}. {rule}\n"
-
-    if config.get('conversation_examples'):
-        prompt += "\n**Conversation Flow Examples:**\n"
-        for ex in config.get('conversation_examples', []):
-            prompt += f"\n*User: \"{ex['user_input']}\"*\n*Receptionist: \"{ex['model_response']}\"*\n"
-            
-    return prompt
-
-SYSTEM_PROMPT = build_system_prompt(system_config)
-
-def load_context():
-    """Load context from knowledge base to build system prompt extension."""
-    context_str = ""
-    # Load Knowledge Base
-    try:
-        with open('knowledge_base.json', 'r') as f:
-            kb_data = json.load(f)
-        context_str += "\n\n**Frequently Asked Questions:**\n"
-        for q in kb_data.get('questions', []):
-            context_str += f"- Q: {', '.join(q['keywords'])}\n  A: {q['answer']}\n"
-    except Exception as e:
-        print(f"[ERROR] Failed to load knowledge_base.json: {e}")
+def apply_tenant_content(tenant_id, bundle):
+    """A location's content was loaded or reloaded: its cached answers may be stale."""
+    if response_cache is not None:
+        response_cache.invalidate(namespace=tenant_id)
 
-    return context_str
+content.subscribe(apply_content)
+content.start_watching()
+
+# ----------------------------
+# Tenants (one per location)
+# ----------------------------
 
-DYNAMIC_CONTEXT = load_context()
+# The base directory's content and manager are the default tenant; locations
+# under [tenants] directory share its pools, workers and provider health
+default_tenant = Tenant('', config, content, llm_manager)
+tenants = TenantRegistry(config, default_tenant, lambda cfg, prompt: LLMManager(
+    cfg, prompt, transports=llm_manager.transports, executor=llm_manager.executor, health=llm_manager.health,
+    rate_limits=llm_manager.rate_limits), on_content=apply_tenant_content)
+tenants.start_watching(content.interval)
+
+# Prime provider connections / prompt caches off the request path and keep
+# a local model loaded ([warmup]); see warmup.py
+warmup = Warmup(llm_manager, config)
+warmup.start()
+
+_tenant = ContextVar('tenant', default=default_tenant)
+
+def current_tenant():
+    return _tenant.get()
+
+def current_bundle():
+    return _tenant.get().content.current
+
+@app.before_request
+def select_tenant():
+    """Pick the location from the Twilio number called, else from the Host header."""
+    _tenant.set(tenants.resolve(request.values.get('To'), request.host))
+
+def answer_namespace():
+    """Cache namespace: the tenant, plus the channel profile, since voice answers are cut shorter."""
+    tenant = current_tenant()
+    profile = tenant.llm_manager.profiles.get(telemetry.current_channel())
+    return f"{tenant.id}:{profile.name}" if profile else tenant.id
+
+def personalized(session):
+    """Whether the session's prompt carries its slots / summary note, which the cache key does not cover."""
+    return history_window.context_note(session) is not None
+
+def cached_answer(message, session):
+    if response_cache is None or personalized(session):
+        return None
+    answer = response_cache.get(message, session.history, namespace=answer_namespace())
+    telemetry.count('sylvan_cache_lookups_total', result='miss' if answer is None else 'hit')
+    return answer
+
+def remember_answer(message, session, ai_response):
+    if response_cache is not None and is_valid_response(ai_response) and not personalized(session):
+        response_cache.put(message, session.history, ai_response, namespace=answer_namespace())
 
 # ----------------------------
-# Initialize LLM Manager
+# Speculative Pre-generation
 # ----------------------------
 
-# Combine System Prompt and Dynamic Context for the manager
-FULL_SYSTEM_PROMPT = SYSTEM_PROMPT + DYNAMIC_CONTEXT
-llm_manager = LLMManager(config, FULL_SYSTEM_PROMPT)
+# Opt-in ([speculation] enabled): after each bot turn, answer the caller's
+# likely next messages in the background; see speculation.py
+speculator = Speculator.from_config(config)
+
+def turn_key(session):
+    """Identifies the bot turn a speculative answer follows; None unless the bot spoke last."""
+    if session.history and session.history[-1]['role'] == 'assistant':
+        return hashlib.sha1(session.history[-1]['content'].encode()).hexdigest()[:16]
+    return None
+
+def speculation_candidates(session):
+    """(message, tokens, history, prompt tokens) for each predicted next message that would reach a model."""
+    bundle = current_bundle()
+    bot_hits = bundle.keyword_rules.match(session.history[-1]['content'])
+    predictions = bundle.conversation_config.get('predictions', DEFAULT_PREDICTIONS)
+    prefix_tokens = estimate_tokens(bundle.system_prompt)
+    candidates, seen = [], set()
+    for category, messages in predictions.items():
+        if category not in bot_hits:
+            continue
+        for message in messages:
+            # Scripted and routed replies are instant already
+            if message in seen or scripted_reply(message, session, bundle=bundle) or (
+                    bundle.intent_router and bundle.intent_router.classify(message, first_turn=False)):
+                continue
+            seen.add(message)
+            history = model_history(message, session)
+            cost = prefix_tokens + estimate_tokens(message) + sum(message_tokens(m) for m in history)
+            candidates.append((message, bundle.normalizer.tokens(message), history, cost))
+    return candidates
+
+def speculate(session):
+    if speculator is None or turn_key(session) is None:
+        return
+    manager = current_tenant().llm_manager
+    if inspect.iscoroutinefunction(manager.get_response):
+        # The ASGI twin's manager lives on its event loop, not on worker threads
+        return
+    channel = telemetry.current_channel()
+
+    def generate(message, history):
+        with telemetry.turn('speculative'):
+            return manager.get_response(message, history, channel=channel)
+
+    speculator.speculate(session.id, turn_key(session), speculation_candidates(session), generate)
+
+def speculated_answer(message, session):
+    key = turn_key(session)
+    if speculator is None or key is None:
+        return None
+    answer = speculator.lookup(session.id, key, current_bundle().normalizer.tokens(message))
+    return answer if is_valid_response(answer) else None
 
 # ----------------------------
 # Backchannel / Short Reply Handling
 # ----------------------------
 
-def classify_short_reply(user_text: str) -> str:
+def classify_short_reply(user_text: str, hits=None, bundle=None) -> str:
     """
     Very small heuristic classifier for short / vague replies.
     Returns: 'affirmative', 'uncertain', 'small_talk', or 'other'.
+    `hits` is keyword_rules.match(user_text) when the caller already has it.
     """
     text = user_text.strip().lower()
-    keywords = conversation_config.get('keywords', {})
     
     if len(text.split()) <= 3:
-        if any(p in text for p in keywords.get('affirmative', [])):
+        if hits is None:
+            hits = (bundle or current_bundle()).keyword_rules.match(text)
+        if "affirmative" in hits:
             return "affirmative"
-        if any(p in text for p in keywords.get('uncertain', [])):
+        if "uncertain" in hits:
             return "uncertain"
-        if any(p in text for p in keywords.get('small_talk', [])):
+        if "small_talk" in hits:
             return "small_talk"
     return "other"
 
@@ -196,56 +261,75 @@ def classify_short_reply(user_text: str) -> str:
 # Response Validation & Post-Processing
 # ----------------------------
 
-def validate_response(user_message, response_text, session=None):
-    """Ensure response quality and consistency."""
-    user_lower = user_message.lower().strip()
-    resp_lower = response_text.lower()
+# Relaxed pattern: Look for any sequence of 9 or more digits (handling user typos like '444444444')
+PHONE_PATTERN = re.compile(r'\d[\d\s\-\.]{8,}\d')
 
-    # --- Short reply handling ---
-    reply_type = classify_short_reply(user_message)
+def scripted_reply(user_message, session=None, hits=None, bundle=None):
+    """Scripted answer for short affirmative / uncertain replies, or None.
+
+    Depends only on the user message and the last bot turn, so streaming
+    callers can check it before asking a provider for anything. Callers
+    that already hold the turn's bundle pass it, so a reload in between
+    cannot mix two bundles.
+    """
+    bundle = bundle or current_bundle()
+    reply_type = classify_short_reply(user_message, hits, bundle)
     last_bot_msg = None
     if session and session.history and session.history[-1]['role'] == 'assistant':
-        last_bot_msg = session.history[-1]['content'].lower()
+        last_bot_msg = session.history[-1]['content']
 
     # Access scripted responses
-    scripts = conversation_config.get('responses', {})
+    scripts = bundle.conversation_config.get('responses', {})
 
     # If last bot message was offering to schedule and user says yes/ok/etc.
     if reply_type == "affirmative" and last_bot_msg:
-        if any(k in last_bot_msg for k in ['schedule', 'book', 'assessment', 'checkup', 'appointment', 'time', 'availability']):
-            response_text = scripts.get('affirmative_scheduling', 
+        bot_hits = bundle.keyword_rules.match(last_bot_msg)
+        if "scheduling_offer" in bot_hits:
+            return scripts.get('affirmative_scheduling', 
                 "Awesome. What works better for you—weekdays after school or weekends?"
             )
-        elif "price" in last_bot_msg or "cost" in last_bot_msg:
-            response_text = scripts.get('pricing_needs_info',
+        elif "pricing_offer" in bot_hits:
+            return scripts.get('pricing_needs_info',
                 "Got it. To give you an exact price, I just need your child's grade and what subject they're struggling with?"
             )
 
     elif reply_type == "uncertain":
-        response_text = scripts.get('uncertain_offer',
+        return scripts.get('uncertain_offer',
             "Totally fair. Want a quick rundown of how we work, or should we just book the $49 checkup?"
         )
+    return None
+
+def validate_response(user_message, response_text, session=None):
+    """Ensure response quality and consistency."""
+    user_lower = user_message.lower().strip()
+    resp_lower = response_text.lower()
+    bundle = current_bundle()
+    # One pass over the user text for every keyword category
+    user_hits = bundle.keyword_rules.match(user_lower)
 
+    # --- Short reply handling ---
+    reply_type = classify_short_reply(user_message, user_hits, bundle)
+    scripted = scripted_reply(user_message, session, user_hits, bundle)
+    if scripted:
+        response_text = scripted
     elif reply_type == "small_talk" and not response_text:
-        response_text = scripts.get('greeting_small_talk',
+        response_text = bundle.conversation_config.get('responses', {}).get('greeting_small_talk',
             "Hi! I'm here to help. What's going on with your child's learning?"
         )
 
     # --- Existing calendar / scheduling logic ---
     if session and session.history:
         if len(session.history) > 0 and session.history[-1]['role'] == 'assistant':
-            last_bot_msg = session.history[-1]['content'].lower()
-            affirmative_responses = ['yes', 'sure', 'ok', 'okay', 'please', 'i would', 'id like that', 'go ahead']
-            is_affirmative = any(phrase in user_lower for phrase in affirmative_responses)
-            was_offering_schedule = any(k in last_bot_msg for k in ['schedule', 'book', 'assessment', 'checkup', 'time'])
+            last_bot_msg = session.history[-1]['content']
+            is_affirmative = "affirmative_followup" in user_hits
+            was_offering_schedule = "calendar_offer" in bundle.keyword_rules.match(last_bot_msg)
             if is_affirmative and was_offering_schedule and '[CALENDAR_EMBED]' not in response_text:
                 if "calendar" not in resp_lower:
                     response_text += "\n\nAwesome. Pick a time right here:\n[CALENDAR_EMBED]"
                 else:
                     response_text += "\n[CALENDAR_EMBED]"
 
-    scheduling_keywords = ['schedule', 'book', 'appointment', 'visit', 'cost', 'price', 'checkup', 'assessment', 'weekdays', 'weekends', 'morning', 'afternoon', 'evening']
-    if any(k in user_lower for k in scheduling_keywords) and '[CALENDAR_EMBED]' not in response_text:
+    if "scheduling_request" in user_hits and '[CALENDAR_EMBED]' not in response_text:
         if "calendar" not in resp_lower:
             response_text += "\n\nLet's get you on the books. Pick a time:\n[CALENDAR_EMBED]"
         else:
@@ -264,9 +348,7 @@ def validate_response(user_message, response_text, session=None):
     # --- Offline/Fallback Data Capture ---
     # If the response is the default fallback, but we detect a phone number, override it.
     # This prevents "I'm not sure" responses when the user provides the info we just asked for.
-    # Relaxed pattern: Look for any sequence of 9 or more digits (handling user typos like '444444444')
-    phone_pattern = re.compile(r'\d[\d\s\-\.]{8,}\d') 
-    if "not 100% sure" in response_text and phone_pattern.search(user_message):
+    if "not 100% sure" in response_text and PHONE_PATTERN.search(user_message):
         response_text = "Thanks! I've noted down your information. A director will reach out to you shortly to help."
         # Optionally log this success
         print(f"[OFFLINE CAPTURE] Captured contact info: {user_message}")
@@ -275,26 +357,71 @@ def validate_response(user_message, response_text, session=None):
 
     return response_text
 
+def validate_stream_tail(user_message, streamed_text, session=None):
+    """Streaming form of validate_response.
+
+    Returns ('tail', text) when post-processing only appends to what has
+    already been streamed (e.g. [CALENDAR_EMBED] injection), or
+    ('replace', text) when the whole reply has to be swapped out.
+    """
+    final_text = validate_response(user_message, streamed_text, session)
+    if streamed_text and final_text.startswith(streamed_text):
+        return 'tail', final_text[len(streamed_text):]
+    return 'replace', final_text
+
 # ----------------------------
 # Main Logic
 # ----------------------------
 
-def find_answer(message, session_id):
+def routed_answer(message, session):
+    intent_router = current_bundle().intent_router
+    if intent_router is None:
+        return None
+    with telemetry.span('intent_router'):
+        answer = intent_router.route(message, session)
+    telemetry.count('sylvan_router_turns_total', result='absorbed' if answer else 'llm')
+    return answer
+
+def model_history(message, session):
+    """Windowed history plus this turn's retrieved facts (fit() puts system notes up front)."""
+    history = history_window.prompt_history(session)
+    retriever = current_bundle().retriever
+    if retriever is None:
+        return history
+    with telemetry.span('retrieval'):
+        note = retriever.context_note(message, session.history)
+    return history + [note] if note else history
+
+def find_answer(message, session_id, abandoned=None):
     _, session = get_session(session_id)
     
-    # Get Response via Manager
-    ai_response = llm_manager.get_response(message, session.history)
-    
+    ai_response = routed_answer(message, session) or cached_answer(message, session)
+    if ai_response is None:
+        ai_response = speculated_answer(message, session)
+        if ai_response is None:
+            # Get Response via Manager
+            ai_response = current_tenant().llm_manager.get_response(message, model_history(message, session),
+                                                                    channel=telemetry.current_channel())
+        remember_answer(message, session, ai_response)
+    return finish_turn(message, ai_response, session, abandoned)
+
+def kb_fallback(message):
+    telemetry.count('sylvan_kb_fallbacks_total')
+    with telemetry.span('kb_fallback'):
+        return search_knowledge_base(message, current_bundle().knowledge_base)
+
+def finish_turn(message, ai_response, session, abandoned=None):
+    """KB fallback, validation and history bookkeeping for a provider answer."""
     # Final Fallback to Knowledge Base Search if all LLMs fail
-    if ai_response in ["OPENROUTER_FAILED", "LOCAL_FAILED", "OPENAI_FAILED", "GEMINI_FAILED", "GEMINI_NOT_CONFIGURED"] or not ai_response:
+    if not is_valid_response(ai_response):
         # from knowledge_base_search import search_knowledge_base  # type: ignore
-        ai_response = search_knowledge_base(message, knowledge_base)
+        ai_response = kb_fallback(message)
         
     # Validate & Post-process
-    final_response = validate_response(message, ai_response, session)
+    with telemetry.span('validate'):
+        final_response = validate_response(message, ai_response, session)
     # Update History
-    session.add_message("user", message)
-    session.add_message("assistant", final_response)
+    record_turn(session, message, final_response, abandoned)
     return final_response
 
 # ----------------------------
@@ -303,9 +430,9 @@ def find_answer(message, session_id):
 
 @app.route('/')
 def home():
-    calendar_url = config.get('calendar', 'calendar_url', fallback='')
-    contact_phone = config.get('contact', 'phone', fallback='1-800-EDUCATE')
-    contact_email = config.get('contact', 'email', fallback='info@sylvanlearning.com')
+    calendar_url = current_tenant().config.get('calendar', 'calendar_url', fallback='')
+    contact_phone = current_tenant().config.get('contact', 'phone', fallback='1-800-EDUCATE')
+    contact_email = current_tenant().config.get('contact', 'email', fallback='info@sylvanlearning.com')
     return render_template(
         'index.html',
         calendar_url=calendar_url,
@@ -313,104 +440,436 @@ def home():
         contact_email=contact_email
     )
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    data = request.json
-    user_message = data.get('message', '')
-    session_id = data.get('session_id')
-    # Ensure session exists
-    session_id, _ = get_session(session_id)
-    response_text = find_answer(user_message, session_id)
-    print(f"[DEBUG] Raw response: {response_text}")
-    # Replace calendar embed
+def contact_phone():
+    """The current location's phone number from its system_context.json."""
+    contact = current_bundle().system_config.get('business_profile', {}).get('contact', {})
+    return contact.get('phone') or '(636) 552-4351'
+
+def render_calendar_embed(response_text):
+    """Replace the [CALENDAR_EMBED] marker for the web chat."""
     if '[CALENDAR_EMBED]' in response_text:
-        calendar_url = config.get('calendar', 'calendar_url', fallback='')
+        calendar_url = current_tenant().config.get('calendar', 'calendar_url', fallback='')
         if calendar_url:
             calendar_html = f''
             response_text = response_text.replace('[CALENDAR_EMBED]', calendar_html)
         else:
             response_text = response_text.replace(
                 '[CALENDAR_EMBED]',
-                'Please contact us at (636) 552-4351 to schedule an appointment.'
+                f'Please contact us at {contact_phone()} to schedule an appointment.'
             )
+    return response_text
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    data = request.json
+    user_message = data.get('message', '')
+    session_id = data.get('session_id')
+    with telemetry.turn('web'):
+        # Ensure session exists
+        session_id, _ = get_session(session_id)
+        response_text = find_answer(user_message, session_id)
+        print(f"[DEBUG] Raw response: {response_text}")
+        response_text = render_calendar_embed(response_text)
     return jsonify({'response': response_text, 'session_id': session_id})
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def finish_stream(user_message, parts, session, session_id):
+    """Closing SSE events for a streamed turn: KB fallback, validated tail, history."""
+    events = []
+    streamed_text = ''.join(parts)
+    if not parts:
+        # Every provider failed before streaming anything
+        streamed_text = kb_fallback(user_message)
+        events.append(sse_event('token', {'text': streamed_text}))
+
+    with telemetry.span('validate'):
+        kind, text = validate_stream_tail(user_message, streamed_text, session)
+    final_response = streamed_text + text if kind == 'tail' else text
+    record_turn(session, user_message, final_response)
+    events.append(sse_event('done', {
+        kind: render_calendar_embed(text),
+        'response': render_calendar_embed(final_response),
+        'session_id': session_id
+    }))
+    return events
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Server-sent events version of /api/chat.
+
+    Emits `session`, then one `token` per provider chunk, then a single
+    `done` event carrying the post-processed tail (or a full replacement)
+    and the final rendered response.
+    """
+    data = request.json
+    user_message = data.get('message', '')
+    session_id, session = get_session(data.get('session_id'))
+    tenant = current_tenant()
+
+    def generate():
+        # The body is iterated after the request's context has been left
+        _tenant.set(tenant)
+        with telemetry.turn('web_stream'):
+            yield sse_event('session', {'session_id': session_id})
+            parts = []
+            truncated = False
+            canned = (scripted_reply(user_message, session) or routed_answer(user_message, session)
+                      or cached_answer(user_message, session) or speculated_answer(user_message, session))
+            chunks = [canned] if canned else tenant.llm_manager.stream_response(
+                user_message, model_history(user_message, session), channel=telemetry.current_channel())
+            for chunk in chunks:
+                if chunk is STREAM_TRUNCATED:
+                    truncated = True
+                    continue
+                parts.append(chunk)
+                yield sse_event('token', {'text': chunk})
+            if not canned and not truncated:
+                remember_answer(user_message, session, ''.join(parts))
+
+            for event in finish_stream(user_message, parts, session, session_id):
+                yield event
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/internal/pool-stats')
+def pool_stats():
+    return jsonify(llm_manager.pool_stats())
+
+@app.route('/internal/reload-rules', methods=['POST'])
+def reload_rules():
+    """Rebuild all content now instead of waiting for the watcher."""
+    store = current_tenant().content
+    if not store.reload(force=True):
+        return jsonify({'reloaded': False}), 500
+    bundle = store.current
+    return jsonify({'reloaded': True, 'keywords': len(bundle.keyword_rules), 'build_ms': round(bundle.build_ms, 2)})
+
+@app.route('/internal/token-usage')
+def token_usage():
+    return jsonify(current_tenant().llm_manager.token_stats())
+
+@app.route('/internal/session-stats')
+def session_stats():
+    return jsonify(conversations.stats())
+
+@app.route('/internal/cache-stats')
+def cache_stats():
+    return jsonify(response_cache.stats() if response_cache else {'enabled': False})
+
+@app.route('/internal/router-stats')
+def router_stats():
+    intent_router = current_bundle().intent_router
+    return jsonify(intent_router.stats() if intent_router else {'enabled': False})
+
+def status_report(manager, registry=None):
+    """Everything an operator wants on one page: provider health, pools, tokens, cache, sessions."""
+    intent_router = current_bundle().intent_router
+    return {
+        'providers': manager.health_stats(),
+        'routing': manager.routed_chain(),
+        'coalescing': manager.coalesce_stats(),
+        'audio': audio_cache.stats() if audio_cache else {'enabled': False},
+        'rate_limits': manager.rate_limit_stats(),
+        'pools': manager.pool_stats(),
+        'tokens': manager.token_stats(),
+        'cache': response_cache.stats() if response_cache else {'enabled': False},
+        'sessions': conversations.stats(),
+        'router': intent_router.stats() if intent_router else {'enabled': False},
+        'content': current_tenant().content.stats(),
+        'tenants': (registry or tenants).stats(),
+        'speculation': speculator.stats() if speculator else {'enabled': False},
+        'boot': dict(boot.stats(), warmup=warmup.stats()),
+    }
+
+@app.route('/internal/status')
+def status():
+    return jsonify(status_report(current_tenant().llm_manager))
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@app.route('/metrics')
+def metrics():
+    """Latency histograms, fallback / cache counters and token counts for Prometheus."""
+    return Response(telemetry.render(llm_manager.usage.snapshot()), content_type=PROMETHEUS_CONTENT_TYPE)
+
+# ----------------------------
+# Pre-rendered voice audio
+# ----------------------------
+
+# Fixed lines and the defaults for the conversation_config.json voice scripts
+NO_SPEECH_GOODBYE = "I didn't hear anything. Please call back. Goodbye!"
+NO_INPUT_LINE = "I didn't catch that."
+SLOW_ANSWER_LINE = "Sorry, that is taking longer than expected. Could you ask me again?"
+REPEAT_LINE = "Sorry, could you say that again?"
+VOICE_SCRIPT_DEFAULTS = {
+    'voice_affirmative_scheduling': "Great. What day and time generally work best for you, weekdays after school or weekends?",
+    'voice_uncertain_offer': "That’s okay. Would you like a quick overview of our programs, or do you prefer to talk about pricing first?",
+    'voice_filler': "One moment while I check on that.",
+}
+
+# With an [audio] engine configured, spoken lines are served as cached clips
+# (<Play>) instead of live TTS (<Say>); see audio_cache.py
+audio_cache = AudioCache.from_config(config)
+AUDIO_URL = config.get('audio', 'base_url', fallback='/audio').rstrip('/')
+AUDIO_MAX_AGE = 365 * 24 * 3600
+
+def voice_script(name, bundle=None):
+    scripts = (bundle or current_bundle()).conversation_config.get('responses', {})
+    return scripts.get(name, VOICE_SCRIPT_DEFAULTS[name])
+
+def voice_scripted_lines(bundle):
+    """Every line a caller can hear that does not come from a model."""
+    return ([voice_greeting_text(bundle), NO_SPEECH_GOODBYE, NO_INPUT_LINE, SLOW_ANSWER_LINE, REPEAT_LINE]
+            + [voice_script(name, bundle) for name in VOICE_SCRIPT_DEFAULTS])
+
+def speak(target, text):
+    """<Play> the cached clip for text when there is one, otherwise <Say> it."""
+    clip = audio_cache.lookup(text) if audio_cache else None
+    if clip:
+        target.play(f"{AUDIO_URL}/{clip}")
+    else:
+        target.say(text, voice='alice')
+
+@app.route('/audio/<name>')
+def audio(name):
+    """Clips are content-addressed, so they can be cached forever."""
+    if audio_cache is None or not CLIP_NAME.match(name):
+        return '', 404
+    response = send_from_directory(os.path.abspath(audio_cache.directory), name, max_age=AUDIO_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={AUDIO_MAX_AGE}, immutable'
+    return response
+
 # ----------------------------
 # Twilio Voice Routes
 # ----------------------------
 
-@app.route('/voice', methods=['POST'])
-def voice():
+def voice_greeting_text(bundle=None):
+    greet = (bundle or current_bundle()).knowledge_base.get("greeting", "Welcome to Sylvan Learning!")
+    return "Welcome to Sylvan Learning. " + greet
+
+if audio_cache is not None:
+    audio_cache.prerender(voice_scripted_lines(content.current))
+    # Edited scripts hash to new clips; the old ones age out of the cache
+    content.subscribe(lambda bundle: audio_cache.prerender(voice_scripted_lines(bundle)))
+
+def voice_greeting_twiml():
     resp = VoiceResponse()
-    greet = knowledge_base.get("greeting", "Welcome to Sylvan Learning!")
     # Use 'alice' for a standard female voice, or specify language/voice
     gather = resp.gather(input='speech', action='/voice/handle-input', timeout=3)
-    gather.say("Welcome to Sylvan Learning. " + greet, voice='alice')
-    resp.say("I didn't hear anything. Please call back. Goodbye!", voice='alice')
+    speak(gather, voice_greeting_text())
+    speak(resp, NO_SPEECH_GOODBYE)
     return str(resp)
 
-@app.route('/voice/handle-input', methods=['POST'])
-def voice_handle_input():
+def start_call(call_sid):
+    """Create the call's session up front, seeded with the greeting the caller hears."""
+    _, session = get_call_session(call_sid)
+    if not session.history:
+        session.add_message("assistant", voice_greeting_text())
+        conversations.save(session)
+    return session
+
+def end_call(call_sid, call_status):
+    """Free a call's session as soon as Twilio reports that the call is over."""
+    if call_sid and call_status in ENDED_CALL_STATUSES:
+        with pending_lock:
+            drop_pending_answer(call_sid)
+            return conversations.delete(call_sid)
+    return False
+
+def voice_fast_path_reply(user_speech):
+    """Scripted reply for short affirmations / uncertainty on voice, or None for the full AI flow."""
+    reply_type = classify_short_reply(user_speech)
+
+    if reply_type == "affirmative":
+        return voice_script('voice_affirmative_scheduling')
+    elif reply_type == "uncertain":
+        return voice_script('voice_uncertain_offer')
+    return None
+
+def voice_prompt_twiml(msg):
     resp = VoiceResponse()
-    user_speech = request.values.get('SpeechResult', '').lower()
+    gather = resp.gather(input='speech', action='/voice/handle-input', timeout=3)
+    speak(gather, msg)
+    return str(resp)
 
-    if user_speech:
-        reply_type = classify_short_reply(user_speech)
+def voice_answer_twiml(answer):
+    resp = VoiceResponse()
 
-        # Fast‑path for short affirmations / uncertainty on voice
-        scripts = conversation_config.get('responses', {})
-        
-        if reply_type == "affirmative":
-            gather = resp.gather(input='speech', action='/voice/handle-input', timeout=3)
-            msg = scripts.get('voice_affirmative_scheduling', "Great. What day and time generally work best for you, weekdays after school or weekends?")
-            gather.say(msg, voice='alice')
-            return str(resp)
-        elif reply_type == "uncertain":
-            gather = resp.gather(input='speech', action='/voice/handle-input', timeout=3)
-            msg = scripts.get('voice_uncertain_offer', "That’s okay. Would you like a quick overview of our programs, or do you prefer to talk about pricing first?")
-            gather.say(msg, voice='alice')
-            return str(resp)
+    # Check for HANGUP token
+    should_hangup = False
+    if '[HANGUP]' in answer:
+        should_hangup = True
+        answer = answer.replace('[HANGUP]', '').strip()
 
-        # Fallback to full AI flow
-        answer = find_answer(user_speech, None)
-        
-        # Check for HANGUP token
-        should_hangup = False
-        if '[HANGUP]' in answer:
-            should_hangup = True
-            answer = answer.replace('[HANGUP]', '').strip()
-
-        # Strip calendar embed from voice response
-        voice_answer = answer.replace('[CALENDAR_EMBED]', '').replace('calendar below', 'our website')
-        
-        gather = resp.gather(input='speech', action='/voice/handle-input', timeout=3)
-        gather.say(voice_answer, voice='alice')
-        
-        if should_hangup:
-             resp.hangup()
-        else:
-             resp.append(gather)
-
-        if not should_hangup and not "questions" in voice_answer.lower():
-             # resp.say("Do you have any other questions?", voice='alice')
-             pass
+    # Strip calendar embed from voice response
+    voice_answer = answer.replace('[CALENDAR_EMBED]', '').replace('calendar below', 'our website')
+    
+    gather = resp.gather(input='speech', action='/voice/handle-input', timeout=3)
+    speak(gather, voice_answer)
+    
+    if should_hangup:
+         resp.hangup()
     else:
-        resp.say("I didn't catch that.", voice='alice')
-        resp.redirect('/voice')
+         resp.append(gather)
+
+    if not should_hangup and not "questions" in voice_answer.lower():
+         # resp.say("Do you have any other questions?", voice='alice')
+         pass
+    return str(resp)
+
+def voice_no_input_twiml():
+    resp = VoiceResponse()
+    speak(resp, NO_INPUT_LINE)
+    resp.redirect('/voice')
+    return str(resp)
+
+# ----------------------------
+# Asynchronous voice answers
+# ----------------------------
+#
+# With [voice] async_answers on, /voice/handle-input answers at once with a
+# short filler and a <Redirect> to /voice/answer while the provider call runs
+# in the background. /voice/answer holds each poll for up to poll_wait
+# seconds and then either speaks the answer or pauses and redirects again,
+# so no webhook gets near Twilio's 15 second timeout however many providers
+# the turn falls through. Pending answers live in this process; with several
+# workers, route a call's webhooks to one worker (sticky on CallSid).
+
+VOICE_ASYNC = config.getboolean('voice', 'async_answers', fallback=False)
+VOICE_POLL_WAIT = config.getfloat('voice', 'poll_wait', fallback=2.0)
+VOICE_ANSWER_TIMEOUT = config.getfloat('voice', 'answer_timeout', fallback=25.0)
+
+pending_answers = {}    # CallSid -> (future, started, abandoned Event)
+pending_lock = threading.RLock()
+voice_executor = ThreadPoolExecutor(max_workers=config.getint('voice', 'workers', fallback=8),
+                                    thread_name_prefix='voice')
+
+def answer_in_background(user_speech, call_sid, abandoned):
+    if abandoned.is_set():
+        # The call ended while the answer was queued; don't open a session for it
+        return None
+    if conversations.get(call_sid) is None:
+        # Ended before this answer was registered: nothing will abandon it, so drop it here
+        with pending_lock:
+            entry = pending_answers.get(call_sid)
+            if entry is not None and entry[2] is abandoned:
+                drop_pending_answer(call_sid, entry)
+        return None
+    with telemetry.turn('voice_async'):
+        return find_answer(user_speech, call_sid, abandoned)
+
+def drop_pending_answer(call_sid, entry=None):
+    """Stop waiting for a call's background answer (only if it is still `entry`, when given)."""
+    with pending_lock:
+        current = pending_answers.get(call_sid)
+        if current is None or (entry is not None and current is not entry):
+            return
+        del pending_answers[call_sid]
+        current[2].set()
+
+def start_async_answer(user_speech, call_sid):
+    # One step under pending_lock, so end_call sees either the old entry or the new one
+    with pending_lock:
+        drop_pending_answer(call_sid)
+        abandoned = threading.Event()
+        # copy_context carries the caller's tenant into the worker thread
+        future = voice_executor.submit(copy_context().run, answer_in_background, user_speech, call_sid, abandoned)
+        pending_answers[call_sid] = (future, time.monotonic(), abandoned)
+    return future
+
+def collect_async_answer(call_sid, wait):
+    """('ready', answer), ('pending', None), ('timeout', None) or ('missing', None)."""
+    entry = pending_answers.get(call_sid)
+    if entry is None:
+        return 'missing', None
+    future, started, _ = entry
+    try:
+        answer = future.result(timeout=wait)
+    except FutureTimeout:
+        if time.monotonic() - started < VOICE_ANSWER_TIMEOUT:
+            return 'pending', None
+        drop_pending_answer(call_sid, entry)
+        return 'timeout', None
+    except Exception as e:
+        print(f"[WARN] Background voice answer failed: {type(e).__name__}: {e}")
+        drop_pending_answer(call_sid, entry)
+        return 'missing', None
+    drop_pending_answer(call_sid, entry)
+    return 'ready', answer
 
+def voice_filler_twiml():
+    resp = VoiceResponse()
+    speak(resp, voice_script('voice_filler'))
+    resp.redirect('/voice/answer', method='POST')
     return str(resp)
 
+def voice_poll_twiml(state, answer):
+    if state == 'ready':
+        return voice_answer_twiml(answer)
+    if state == 'pending':
+        resp = VoiceResponse()
+        resp.pause(length=1)
+        resp.redirect('/voice/answer', method='POST')
+        return str(resp)
+    if state == 'timeout':
+        return voice_prompt_twiml(SLOW_ANSWER_LINE)
+    return voice_prompt_twiml(REPEAT_LINE)
+
+@app.route('/voice', methods=['POST'])
+def voice():
+    start_call(request.values.get('CallSid'))
+    return voice_greeting_twiml()
+
+@app.route('/voice/handle-input', methods=['POST'])
+def voice_handle_input():
+    user_speech = request.values.get('SpeechResult', '').lower()
+    if not user_speech:
+        return voice_no_input_twiml()
+
+    with telemetry.turn('voice'):
+        call_sid, session = get_call_session(request.values.get('CallSid'))
+        fast_reply = voice_fast_path_reply(user_speech)
+        if fast_reply:
+            record_turn(session, user_speech, fast_reply)
+            with telemetry.span('twiml'):
+                return voice_prompt_twiml(fast_reply)
+
+        if VOICE_ASYNC and request.values.get('CallSid'):
+            start_async_answer(user_speech, call_sid)
+            with telemetry.span('twiml'):
+                return voice_filler_twiml()
+
+        # Fallback to full AI flow
+        answer = find_answer(user_speech, call_sid)
+        with telemetry.span('twiml'):
+            return voice_answer_twiml(answer)
+
+@app.route('/voice/answer', methods=['POST'])
+def voice_answer():
+    """Follow-up poll for an answer started by /voice/handle-input in async mode."""
+    state, answer = collect_async_answer(request.values.get('CallSid'), VOICE_POLL_WAIT)
+    return voice_poll_twiml(state, answer)
+
+@app.route('/voice/status', methods=['POST'])
+def voice_status():
+    """Twilio call status callback (set as the number's Status Callback URL)."""
+    end_call(request.values.get('CallSid'), request.values.get('CallStatus', ''))
+    return '', 204
+
 # ----------------------------
 # Helpers
 # ----------------------------
 
 def search_knowledge_base(message, kb):
-    """Simple keyword fallback"""
-    message = message.lower()
-    for entry in kb.get("questions", []):
-        if any(keyword.lower() in message for keyword in entry.get("keywords", [])):
-            return entry.get("answer", "")
-    return kb.get("default", "I'm not sure, but please call us!")
+    """Keyword fallback: best-scoring knowledge base entry for the message."""
+    bundle = current_bundle()
+    index = bundle.kb_index if kb is bundle.knowledge_base else KnowledgeBaseIndex(kb)
+    return index.best_answer(message)
+
+boot.ready(config.getfloat('warmup', 'import_budget_ms', fallback=1000))
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,254 @@
+"""ASGI serving mode.
+
+Run with any ASGI server, e.g.
+
+    uvicorn asgi:app --port 5000
+
+Routes and response formats match app.py, and sessions, validation and
+TwiML rendering are shared with it. Provider calls go through
+AsyncLLMManager, so a conversation waiting on an upstream model holds a
+suspended coroutine instead of a worker thread and one process can keep
+hundreds of calls in flight.
+"""
+import asyncio
+import os
+import time
+
+from quart import Quart, Response, jsonify, render_template, request, send_from_directory
+
+import app as core
+from async_llm_manager import AsyncLLMManager
+from llm_manager import STREAM_TRUNCATED
+from telemetry import telemetry
+from tenants import Tenant, TenantRegistry
+
+app = Quart(__name__)
+llm_manager = AsyncLLMManager(core.config, core.content.current.system_prompt)
+core.content.subscribe(lambda bundle: llm_manager.set_system_prompt(bundle.system_prompt))
+
+# Same tenants as app.py, but with async managers sharing this one's pools
+default_tenant = Tenant('', core.config, core.content, llm_manager)
+tenants = TenantRegistry(core.config, default_tenant, lambda cfg, prompt: AsyncLLMManager(
+    cfg, prompt, async_transports=llm_manager.async_transports, transports=llm_manager.transports,
+    executor=llm_manager.executor, health=llm_manager.health, rate_limits=llm_manager.rate_limits),
+    on_content=core.apply_tenant_content)
+tenants.start_watching(core.content.interval)
+
+
+@app.before_request
+async def select_tenant():
+    values = await request.values
+    core._tenant.set(tenants.resolve(values.get('To'), request.host))
+
+
+async def find_answer(message, session_id):
+    _, session = core.get_session(session_id)
+    ai_response = core.routed_answer(message, session) or core.cached_answer(message, session)
+    if ai_response is None:
+        history = core.model_history(message, session)
+        ai_response = await core.current_tenant().llm_manager.get_response(
+            message, history, channel=telemetry.current_channel())
+        core.remember_answer(message, session, ai_response)
+    return core.finish_turn(message, ai_response, session)
+
+
+# CallSid -> (task, started) for [voice] async_answers; see app.py
+pending_answers = {}
+
+
+async def answer_in_background(user_speech, call_sid):
+    with telemetry.turn('voice_async'):
+        return await find_answer(user_speech, call_sid)
+
+
+async def collect_async_answer(call_sid, wait):
+    entry = pending_answers.get(call_sid)
+    if entry is None:
+        return 'missing', None
+    task, started = entry
+    try:
+        answer = await asyncio.wait_for(asyncio.shield(task), wait)
+    except asyncio.TimeoutError:
+        if time.monotonic() - started < core.VOICE_ANSWER_TIMEOUT:
+            return 'pending', None
+        pending_answers.pop(call_sid, None)
+        task.cancel()
+        return 'timeout', None
+    except Exception as e:
+        print(f"[WARN] Background voice answer failed: {type(e).__name__}: {e}")
+        pending_answers.pop(call_sid, None)
+        return 'missing', None
+    pending_answers.pop(call_sid, None)
+    return 'ready', answer
+
+
+async def prime_async_pools():
+    for name in llm_manager.provider_chain():
+        try:
+            await llm_manager.prime(name)
+        except Exception as e:
+            print(f"[WARN] Warm-up of {name} (async pool) failed: {type(e).__name__}: {e}")
+
+
+@app.before_serving
+async def warm_transports():
+    # app.py's warm-up thread primes the blocking pools and keeps a local model
+    # loaded; this manager's httpx clients still need their own connections
+    if core.warmup.enabled:
+        asyncio.get_running_loop().create_task(prime_async_pools())
+
+
+@app.after_serving
+async def close_transports():
+    await llm_manager.aclose()
+
+
+@app.route('/')
+async def home():
+    return await render_template(
+        'index.html',
+        calendar_url=core.current_tenant().config.get('calendar', 'calendar_url', fallback=''),
+        contact_phone=core.current_tenant().config.get('contact', 'phone', fallback='1-800-EDUCATE'),
+        contact_email=core.current_tenant().config.get('contact', 'email', fallback='info@sylvanlearning.com')
+    )
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    data = await request.get_json()
+    user_message = data.get('message', '')
+    with telemetry.turn('web'):
+        session_id, _ = core.get_session(data.get('session_id'))
+        response_text = await find_answer(user_message, session_id)
+    return jsonify({'response': core.render_calendar_embed(response_text), 'session_id': session_id})
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    data = await request.get_json()
+    user_message = data.get('message', '')
+    session_id, session = core.get_session(data.get('session_id'))
+    tenant = core.current_tenant()
+
+    async def generate():
+        core._tenant.set(tenant)
+        with telemetry.turn('web_stream'):
+            yield core.sse_event('session', {'session_id': session_id})
+            parts = []
+            canned = (core.scripted_reply(user_message, session) or core.routed_answer(user_message, session)
+                      or core.cached_answer(user_message, session))
+            if canned:
+                parts.append(canned)
+                yield core.sse_event('token', {'text': canned})
+            else:
+                history = core.model_history(user_message, session)
+                truncated = False
+                async for chunk in tenant.llm_manager.stream_response(user_message, history,
+                                                                      channel=telemetry.current_channel()):
+                    if chunk is STREAM_TRUNCATED:
+                        truncated = True
+                        continue
+                    parts.append(chunk)
+                    yield core.sse_event('token', {'text': chunk})
+                if not truncated:
+                    core.remember_answer(user_message, session, ''.join(parts))
+
+            for event in core.finish_stream(user_message, parts, session, session_id):
+                yield event
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/internal/pool-stats')
+async def pool_stats():
+    return jsonify(llm_manager.pool_stats())
+
+
+@app.route('/internal/token-usage')
+async def token_usage():
+    return jsonify(core.current_tenant().llm_manager.token_stats())
+
+
+@app.route('/internal/session-stats')
+async def session_stats():
+    return jsonify(core.conversations.stats())
+
+
+@app.route('/internal/cache-stats')
+async def cache_stats():
+    return jsonify(core.response_cache.stats() if core.response_cache else {'enabled': False})
+
+
+@app.route('/internal/status')
+async def status():
+    return jsonify(core.status_report(core.current_tenant().llm_manager, tenants))
+
+
+@app.route('/audio/<name>')
+async def audio(name):
+    if core.audio_cache is None or not core.CLIP_NAME.match(name):
+        return '', 404
+    response = await send_from_directory(os.path.abspath(core.audio_cache.directory), name)
+    response.headers['Cache-Control'] = f'public, max-age={core.AUDIO_MAX_AGE}, immutable'
+    return response
+
+
+@app.route('/metrics')
+async def metrics():
+    return Response(telemetry.render(llm_manager.usage.snapshot()),
+                    content_type=core.PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/voice', methods=['POST'])
+async def voice():
+    values = await request.values
+    core.start_call(values.get('CallSid'))
+    return core.voice_greeting_twiml()
+
+
+@app.route('/voice/handle-input', methods=['POST'])
+async def voice_handle_input():
+    values = await request.values
+    user_speech = values.get('SpeechResult', '').lower()
+    if not user_speech:
+        return core.voice_no_input_twiml()
+
+    with telemetry.turn('voice'):
+        call_sid, session = core.get_call_session(values.get('CallSid'))
+        fast_reply = core.voice_fast_path_reply(user_speech)
+        if fast_reply:
+            core.record_turn(session, user_speech, fast_reply)
+            with telemetry.span('twiml'):
+                return core.voice_prompt_twiml(fast_reply)
+
+        if core.VOICE_ASYNC and values.get('CallSid'):
+            previous = pending_answers.pop(call_sid, None)
+            if previous is not None:
+                # Superseded by this utterance; its turn must not land after this one
+                previous[0].cancel()
+            task = asyncio.ensure_future(answer_in_background(user_speech, call_sid))
+            pending_answers[call_sid] = (task, time.monotonic())
+            with telemetry.span('twiml'):
+                return core.voice_filler_twiml()
+
+        answer = await find_answer(user_speech, call_sid)
+        with telemetry.span('twiml'):
+            return core.voice_answer_twiml(answer)
+
+
+@app.route('/voice/answer', methods=['POST'])
+async def voice_answer():
+    values = await request.values
+    state, answer = await collect_async_answer(values.get('CallSid'), core.VOICE_POLL_WAIT)
+    return core.voice_poll_twiml(state, answer)
+
+
+@app.route('/voice/status', methods=['POST'])
+async def voice_status():
+    values = await request.values
+    call_sid, call_status = values.get('CallSid'), values.get('CallStatus', '')
+    core.end_call(call_sid, call_status)
+    if call_status in core.ENDED_CALL_STATUSES and call_sid in pending_answers:
+        pending_answers.pop(call_sid)[0].cancel()
+    return '', 204
@@ -0,0 +1,381 @@
+import asyncio
+import time
+
+import httpx
+
+from http_pool import base_url_of
+from llm_manager import (LLMManager, StreamFailed, STREAM_DONE, STREAM_TRUNCATED, _truncated, chunk_content, gemini_truncated,
+                         is_valid_response, openai_truncated, parse_sse_chunk)
+from telemetry import telemetry
+from warmup import boot
+
+
+class AsyncTransportPool:
+    """One pooled, keep-alive httpx.AsyncClient per provider base URL.
+
+    Uses the same [http] settings as the blocking TransportPool. Clients are
+    created on first use so they bind to the serving event loop.
+    """
+
+    def __init__(self, config):
+        self.limits = httpx.Limits(
+            max_connections=config.getint('http', 'max_connections', fallback=200),
+            max_keepalive_connections=config.getint('http', 'pool_maxsize', fallback=10))
+        self.timeout = httpx.Timeout(
+            config.getfloat('http', 'read_timeout', fallback=60),
+            connect=config.getfloat('http', 'connect_timeout', fallback=3.05))
+        self._clients = {}
+        self.requests = {}
+
+    def for_url(self, url):
+        base = base_url_of(url)
+        client = self._clients.get(base)
+        if client is None:
+            client = httpx.AsyncClient(base_url=base, limits=self.limits, timeout=self.timeout)
+            self._clients[base] = client
+            self.requests[base] = 0
+        self.requests[base] += 1
+        return client
+
+    def stats(self):
+        return {base: {"base_url": base,
+                       "requests": self.requests.get(base, 0),
+                       "max_keepalive": self.limits.max_keepalive_connections}
+                for base in self._clients}
+
+    async def aclose(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+class AsyncSingleFlight:
+    """asyncio version of SingleFlight.
+
+    The shared call runs in its own task that every caller awaits through
+    asyncio.shield, so one caller being cancelled (a lost race, a deadline)
+    does not cancel it for the others; it is cancelled only once no caller
+    is left waiting.
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> [task, waiters]
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args):
+        entry = self._calls.get(key)
+        shared = entry is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            entry = self._calls[key] = [asyncio.ensure_future(fn(*args)), 0]
+            self.calls += 1
+
+            def release(task):
+                if self._calls.get(key) is entry:
+                    del self._calls[key]
+            entry[0].add_done_callback(release)
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0]), shared
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncLLMManager(LLMManager):
+    """Non-blocking twin of LLMManager for the ASGI serving mode.
+
+    Provider methods are coroutines, so a conversation waiting on an
+    upstream model holds a suspended task instead of a worker thread.
+    Provider chain, [llm] mode, hedge_delay and deadline behave exactly as
+    in LLMManager; losing racers are cancelled for real here.
+    """
+
+    def __init__(self, config, system_prompt, async_transports=None, **shared):
+        super().__init__(config, system_prompt, **shared)
+        self.async_transports = async_transports or AsyncTransportPool(config)
+
+    def _single_flight(self):
+        return AsyncSingleFlight()
+
+    def pool_stats(self):
+        return self.async_transports.stats()
+
+    async def aclose(self):
+        await self.async_transports.aclose()
+
+    async def prime(self, name):
+        """Warm this manager's async pools; Gemini's SDK call runs on a thread."""
+        if name == 'gemini':
+            return await asyncio.to_thread(super().prime, name)
+        if not self._keyed_endpoint(name):
+            return None
+        url, headers, payload = self._prime_payload(name)
+        response = await self.async_transports.for_url(url).post(url, headers=headers, json=payload)
+        return response.status_code == 200
+
+    async def _chat_completion(self, name, user_message, history):
+        failed = f"{name.upper()}_FAILED"
+        if self._openai_endpoint(name) is None:
+            return failed
+        try:
+            url, headers, payload = self._chat_payload(name, user_message, history)
+            response = await self.async_transports.for_url(url).post(url, headers=headers, json=payload)
+            self.rate_limits.learn(name, self._api_key(name), response.headers, response.status_code)
+            if response.status_code != 200:
+                print(f"[DEBUG] {name} Error: {response.text}")
+                return failed
+            result = response.json()
+            self.usage.record_openai(name, result)
+            _truncated.set(openai_truncated(result))
+            return result['choices'][0]['message']['content']
+        except Exception as e:
+            print(f"[DEBUG] {name} connectivity error: {type(e).__name__}: {e}")
+            return failed
+
+    async def _stream_chat_completion(self, name, user_message, history):
+        if self._openai_endpoint(name) is None:
+            raise StreamFailed(f"{name} not configured")
+        url, headers, payload = self._chat_payload(name, user_message, history, stream=True)
+        client = self.async_transports.for_url(url)
+        try:
+            async with client.stream("POST", url, headers=headers, json=payload) as response:
+                self.rate_limits.learn(name, self._api_key(name), response.headers, response.status_code)
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise StreamFailed(f"{name} Error: {body.decode(errors='replace')}")
+                async for line in response.aiter_lines():
+                    chunk = parse_sse_chunk(line)
+                    if chunk is STREAM_DONE:
+                        break
+                    if not chunk:
+                        continue
+                    if chunk.get('usage'):
+                        self.usage.record_openai(name, chunk)
+                    content = chunk_content(chunk)
+                    if content:
+                        yield content
+        except httpx.HTTPError as e:
+            raise StreamFailed(f"{name} connectivity error: {type(e).__name__}: {e}")
+
+    async def get_local_response(self, user_message, history):
+        url, _, model = self._openai_endpoint('local')
+        print(f"[DEBUG] Trying Local LLM: {url} with model {model}")
+        return await self._chat_completion('local', user_message, history)
+
+    async def get_openai_response(self, user_message, history):
+        return await self._chat_completion('openai', user_message, history)
+
+    async def get_openrouter_response(self, user_message, history):
+        print("[DEBUG] Trying OpenRouter fallback...")
+        return await self._chat_completion('openrouter', user_message, history)
+
+    async def get_gemini_response(self, user_message, history):
+        if not self.gemini_model:
+            return "GEMINI_NOT_CONFIGURED"
+        try:
+            chat, message = self._gemini_chat(history, user_message)
+            response = await chat.send_message_async(message,
+                                                     generation_config=self._gemini_generation_config())
+            self.usage.record_gemini(response)
+            _truncated.set(gemini_truncated(response))
+            return response.text
+        except Exception as e:
+            print(f"[DEBUG] Gemini API error: {e}")
+            self._rate_limited('gemini', e)
+            return "GEMINI_FAILED"
+
+    def stream_local_response(self, user_message, history):
+        return self._stream_chat_completion('local', user_message, history)
+
+    def stream_openai_response(self, user_message, history):
+        return self._stream_chat_completion('openai', user_message, history)
+
+    def stream_openrouter_response(self, user_message, history):
+        return self._stream_chat_completion('openrouter', user_message, history)
+
+    async def stream_gemini_response(self, user_message, history):
+        if not self.gemini_model:
+            raise StreamFailed("Gemini not configured")
+        try:
+            chat, message = self._gemini_chat(history, user_message)
+            response = await chat.send_message_async(message, stream=True,
+                                                     generation_config=self._gemini_generation_config())
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            self.usage.record_gemini(response)
+        except Exception as e:
+            self._rate_limited('gemini', e)
+            raise StreamFailed(f"Gemini API error: {e}")
+
+    async def stream_response(self, user_message, history, channel=None):
+        with self.profiles.use(channel) as profile:
+            async for chunk in self._stream(user_message, history, profile):
+                yield chunk
+
+    async def _stream(self, user_message, history, profile):
+        tokens = self._prompt_tokens(user_message, history)
+        for name in self.routed_chain(tokens):
+            if not await self._admit(name, tokens):
+                continue
+            started = False
+            start = time.monotonic()
+            cap = profile.sentence_cap(name) if profile else None
+            try:
+                stream = getattr(self, f"stream_{name}_response")(user_message, history)
+                async for chunk in stream:
+                    if not started:
+                        self.health.record(name, True, time.monotonic() - start)
+                        telemetry.record_span('provider_first_token', time.monotonic() - start, provider=name)
+                        boot.first_response(name)
+                    started = True
+                    if cap is not None:
+                        chunk = cap.feed(chunk)
+                        if cap.done:
+                            await stream.aclose()
+                            if chunk:
+                                yield chunk
+                            return
+                    yield chunk
+                return
+            except StreamFailed as e:
+                print(f"[DEBUG] {e}")
+                if started:
+                    yield STREAM_TRUNCATED
+                    return
+                self.health.record(name, False, time.monotonic() - start)
+                telemetry.count('sylvan_fallbacks_total', provider=name)
+                print(f"[WARN] {name} stream failed. Falling back to the next provider.")
+
+    async def call_provider(self, name, user_message, history):
+        if self.single_flight is None:
+            return await self._call_provider(name, user_message, history)
+        response, shared = await self.single_flight.do(self.coalesce_key(name, user_message, history),
+                                                       self._call_provider, name, user_message, history)
+        if shared:
+            telemetry.count('sylvan_coalesced_total', provider=name)
+        return response
+
+    async def _admit(self, name, tokens):
+        if await self.rate_limits.acquire_async(name, self._api_key(name), tokens, telemetry.current_channel()):
+            return self._breaker_allows(name)
+        telemetry.count('sylvan_provider_calls_total', provider=name, outcome='throttled')
+        print(f"[WARN] {name} is at its rate limit. Falling back to the next provider.")
+        return False
+
+    async def _call_provider(self, name, user_message, history):
+        if not await self._admit(name, self._prompt_tokens(user_message, history)):
+            return f"{name.upper()}_FAILED"
+        start = time.monotonic()
+        mark = _truncated.set(False)
+        try:
+            with telemetry.span('provider', provider=name):
+                response = await getattr(self, f"get_{name}_response")(user_message, history)
+            truncated = _truncated.get()
+        except asyncio.CancelledError:
+            # Lost a race or hit the deadline; says nothing about the provider's health
+            telemetry.count('sylvan_provider_calls_total', provider=name, outcome='cancelled')
+            raise
+        except Exception:
+            self.health.record(name, False, time.monotonic() - start)
+            telemetry.count('sylvan_provider_calls_total', provider=name, outcome='error')
+            raise
+        finally:
+            _truncated.reset(mark)
+        ok = is_valid_response(response)
+        self.health.record(name, ok, time.monotonic() - start)
+        telemetry.count('sylvan_provider_calls_total', provider=name, outcome='ok' if ok else 'failed')
+        if ok:
+            response = self._clip(name, response, truncated)
+            boot.first_response(name)
+        return response
+
+    async def get_response(self, user_message, history, channel=None):
+        chain = self.routed_chain(self._prompt_tokens(user_message, history))
+        mode = self.config.get('llm', 'mode', fallback='serial').lower()
+        deadline = self.config.getfloat('llm', 'deadline', fallback=0) or None
+
+        with self.profiles.use(channel):
+            if mode == 'race':
+                return await self._race(chain, user_message, history, 0, deadline)
+            if mode == 'hedged':
+                hedge_delay = self.config.getfloat('llm', 'hedge_delay', fallback=2.0)
+                return await self._race(chain, user_message, history, hedge_delay, deadline)
+            return await self._serial(chain, user_message, history, deadline)
+
+    async def _serial(self, chain, user_message, history, deadline):
+        start = time.monotonic()
+        for name in chain:
+            remaining = deadline - (time.monotonic() - start) if deadline else None
+            if remaining is not None and remaining <= 0:
+                print(f"[WARN] Turn deadline of {deadline}s spent before trying {name}.")
+                break
+            try:
+                response = await asyncio.wait_for(self.call_provider(name, user_message, history), remaining)
+            except asyncio.TimeoutError:
+                print(f"[WARN] Turn deadline of {deadline}s reached while waiting on {name}.")
+                break
+            if is_valid_response(response):
+                return response
+            telemetry.count('sylvan_fallbacks_total', provider=name)
+            print(f"[WARN] {name} failed. Falling back to the next provider.")
+        return None
+
+    async def _race(self, chain, user_message, history, hedge_delay, deadline):
+        if not chain:
+            return None
+        start = time.monotonic()
+        pending = {}
+        launched = 0
+        last_launch = start
+
+        def launch():
+            nonlocal launched, last_launch
+            task = asyncio.ensure_future(self.call_provider(chain[launched], user_message, history))
+            pending[task] = launched
+            launched += 1
+            last_launch = time.monotonic()
+
+        launch()
+        while hedge_delay == 0 and launched < len(chain):
+            launch()
+
+        try:
+            while pending:
+                now = time.monotonic()
+                waits = []
+                if launched < len(chain):
+                    waits.append(max(last_launch + hedge_delay - now, 0))
+                if deadline:
+                    waits.append(max(start + deadline - now, 0))
+                done, _ = await asyncio.wait(list(pending), timeout=min(waits) if waits else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for task in sorted(done, key=lambda t: pending[t]):
+                    index = pending.pop(task)
+                    if task.exception() is not None:
+                        print(f"[DEBUG] {chain[index]} raised {task.exception()!r}")
+                        continue
+                    if is_valid_response(task.result()):
+                        return task.result()
+                    telemetry.count('sylvan_fallbacks_total', provider=chain[index])
+                    print(f"[WARN] {chain[index]} failed during hedged race.")
+
+                now = time.monotonic()
+                if deadline and now - start >= deadline:
+                    print(f"[WARN] Turn deadline of {deadline}s reached; cancelling {len(pending)} provider call(s).")
+                    return None
+                if launched < len(chain) and (not pending or now - last_launch >= hedge_delay):
+                    launch()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,198 @@
+import hashlib
+import io
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from response_cache import PERSONAL_DATA
+
+CLIP_NAME = re.compile(r'^[0-9a-f]{32}\.(wav|mp3)$')
+
+
+class CommandEngine:
+    """Any local TTS binary, e.g. [audio] command = espeak-ng -v en-us -w {output} {text}."""
+
+    extension = 'wav'
+
+    def __init__(self, command, extension='wav', timeout=30):
+        self.command = command
+        self.extension = extension
+        self.timeout = timeout
+        self.name = f"command:{command}"
+
+    def synthesize(self, text):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, f"clip.{self.extension}")
+            args = [part.format(output=output, text=text) for part in shlex.split(self.command)]
+            subprocess.run(args, check=True, timeout=self.timeout, capture_output=True)
+            with open(output, 'rb') as f:
+                return f.read()
+
+
+class SilenceEngine:
+    """Writes silent 8 kHz WAV clips sized to the text; for tests and load benchmarks."""
+
+    extension = 'wav'
+    name = 'silence'
+
+    def synthesize(self, text):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as clip:
+            clip.setnchannels(1)
+            clip.setsampwidth(1)
+            clip.setframerate(8000)
+            # Roughly speaking pace: 15 characters a second
+            clip.writeframes(b'\x80' * (8000 * max(1, len(text)) // 15))
+        return buffer.getvalue()
+
+
+ENGINES = {
+    'command': lambda config: CommandEngine(config.get('audio', 'command'),
+                                            config.get('audio', 'extension', fallback='wav')),
+    'silence': lambda config: SilenceEngine(),
+}
+
+
+class AudioCache:
+    """Content-addressed clips of spoken lines, so Twilio can <Play> instead of <Say>.
+
+    A clip's file name is a hash of the engine, voice and exact text, so
+    editing a script in the content files simply produces a new clip and
+    the old one ages out. Scripted lines are rendered up front with
+    prerender(); any other line becomes a clip once it has been spoken
+    [audio] frequent_after times (lines with phone numbers, emails or
+    other digits never are). Rendering happens on one background thread,
+    never on a webhook. The directory is kept under [audio] max_mb by
+    evicting the least recently played clips.
+    """
+
+    def __init__(self, directory, engine, max_bytes=200 * 1024 * 1024, voice='alice', frequent_after=3,
+                 max_tracked=5000):
+        self.directory = directory
+        self.engine = engine
+        self.max_bytes = max_bytes
+        self.voice = voice
+        self.frequent_after = frequent_after
+        self.max_tracked = max_tracked
+        self._clips = OrderedDict()     # file name -> size, least recently played first
+        self._counts = OrderedDict()    # text -> times spoken without a clip
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tts')
+        self.hits = 0
+        self.misses = 0
+        self.rendered = 0
+        self.evictions = 0
+        self.failures = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for name in os.listdir(directory):
+            if CLIP_NAME.match(name):
+                stat = os.stat(os.path.join(directory, name))
+                existing.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self._clips[name] = size
+
+    @classmethod
+    def from_config(cls, config):
+        """AudioCache for [audio] engine, or None when no engine is configured."""
+        engine = config.get('audio', 'engine', fallback='').lower()
+        if not engine:
+            return None
+        if engine not in ENGINES:
+            print(f"[WARN] Unknown [audio] engine '{engine}'; voice lines will use <Say>.")
+            return None
+        return cls(config.get('audio', 'directory', fallback='audio_cache'), ENGINES[engine](config),
+                   max_bytes=int(config.getfloat('audio', 'max_mb', fallback=200) * 1024 * 1024),
+                   voice=config.get('audio', 'voice', fallback='alice'),
+                   frequent_after=config.getint('audio', 'frequent_after', fallback=3))
+
+    def clip_name(self, text):
+        digest = hashlib.sha256(f"{self.engine.name}\0{self.voice}\0{text}".encode()).hexdigest()[:32]
+        return f"{digest}.{self.engine.extension}"
+
+    def lookup(self, text):
+        """File name of the clip for text, or None. Counts the line towards being rendered."""
+        name = self.clip_name(text)
+        with self._lock:
+            if name in self._clips:
+                self._clips.move_to_end(name)
+                self.hits += 1
+                return name
+            self.misses += 1
+            if PERSONAL_DATA.search(text):
+                return None
+            count = self._counts.pop(text, 0) + 1
+            self._counts[text] = count
+            if len(self._counts) > self.max_tracked:
+                self._counts.popitem(last=False)
+        if count >= self.frequent_after:
+            self.render_later(text)
+        return None
+
+    def render_later(self, text):
+        name = self.clip_name(text)
+        with self._lock:
+            if name in self._clips or name in self._pending:
+                return
+            self._pending.add(name)
+        self._executor.submit(self._render_logged, text, name)
+
+    def prerender(self, texts):
+        """Queue clips for lines every call will hear (greeting, scripts)."""
+        for text in texts:
+            if text:
+                self.render_later(text)
+
+    def _render_logged(self, text, name):
+        try:
+            self.render(text, name)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            print(f"[WARN] TTS failed for {text[:40]!r}: {type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    def render(self, text, name=None):
+        """Synthesize text now and store the clip; returns its file name."""
+        name = name or self.clip_name(text)
+        data = self.engine.synthesize(text)
+        path = os.path.join(self.directory, name)
+        # Write then rename, so a clip is never served half-written
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._clips[name] = len(data)
+            self._clips.move_to_end(name)
+            self._counts.pop(text, None)
+            self.rendered += 1
+            self._evict()
+        return name
+
+    def _evict(self):
+        total = sum(self._clips.values())
+        while total > self.max_bytes and len(self._clips) > 1:
+            name, size = self._clips.popitem(last=False)
+            total -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"clips": len(self._clips), "bytes": sum(self._clips.values()), "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "rendered": self.rendered,
+                    "pending": len(self._pending), "evictions": self.evictions, "failures": self.failures,
+                    "engine": self.engine.name}
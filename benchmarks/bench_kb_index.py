@@ -0,0 +1,85 @@
+"""Micro-benchmark: indexed KB matcher vs the original linear substring scan.
+
+    python benchmarks/bench_kb_index.py [--locations 1 10 50 200]
+
+Each "location" adds a copy of knowledge_base.json whose keywords carry a
+location-specific suffix, so the KB grows the way a multi-location
+deployment would; entry order is shuffled so the legacy scan cannot rely
+on the stock entries sitting at the front.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kb_index import KnowledgeBaseIndex  # noqa: E402
+
+QUERIES = [
+    "how much does tutoring cost",
+    "what are your hours on saturday",
+    "this is great thanks",
+    "do you help with algebra homework",
+    "I want to book an assessment for next week",
+    "where is the ballwin center",
+    "can I talk to a real person please",
+    "my son needs SAT prep before spring",
+    "do you have parking nearby",
+    "ok thank you bye",
+]
+
+
+def legacy_search(message, kb):
+    """The original search_knowledge_base: first substring hit wins."""
+    message = message.lower()
+    for entry in kb.get("questions", []):
+        if any(keyword.lower() in message for keyword in entry.get("keywords", [])):
+            return entry.get("answer", "")
+    return kb.get("default", "I'm not sure, but please call us!")
+
+
+def grow_kb(base, locations):
+    questions = []
+    for loc in range(locations):
+        for entry in base["questions"]:
+            keywords = [f"{k}{loc}" for k in entry["keywords"]] if loc else list(entry["keywords"])
+            questions.append({"keywords": keywords, "answer": entry["answer"]})
+    random.Random(7).shuffle(questions)
+    return {"questions": questions, "default": base.get("default")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "knowledge_base.json"), encoding="utf-8") as f:
+        base = json.load(f)
+
+    print(f"{'entries':>8} {'legacy us/q':>12} {'index us/q':>11} {'speedup':>8} {'build ms':>9}")
+    for locations in args.locations:
+        kb = grow_kb(base, locations)
+        build = timeit.timeit(lambda: KnowledgeBaseIndex(kb), number=1) * 1000
+        index = KnowledgeBaseIndex(kb)
+        legacy = timeit.timeit(lambda: [legacy_search(q, kb) for q in QUERIES], number=args.repeat)
+        indexed = timeit.timeit(lambda: [index.best_answer(q) for q in QUERIES], number=args.repeat)
+        per_query = 1e6 / (args.repeat * len(QUERIES))
+        print(f"{len(kb['questions']):>8} {legacy * per_query:>12.2f} {indexed * per_query:>11.2f} "
+              f"{legacy / indexed:>7.1f}x {build:>9.1f}")
+
+    kb = base
+    index = KnowledgeBaseIndex(kb)
+    print("\nAnswers that differ on the stock knowledge base:")
+    for query in QUERIES:
+        old, new = legacy_search(query, kb), index.best_answer(query)
+        if old != new:
+            print(f"  {query!r}\n    legacy: {old[:70]}\n    index:  {new[:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-turn classification cost: compiled KeywordRules vs per-list substring scans.
+
+    python benchmarks/bench_keyword_rules.py [--keywords 100 1000 10000]
+
+Pads the categories from conversation_config.json with synthetic keywords
+and times one classification pass (all categories) over typical turns.
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_rules import KeywordRules  # noqa: E402
+
+TURNS = [
+    "yes please",
+    "hmm not sure",
+    "how much does the sat prep cost for a junior",
+    "Would you like to schedule a free checkup this week?",
+    "My daughter is in 4th grade and struggling with reading comprehension after school",
+]
+
+
+def legacy_match(categories, text):
+    text = text.lower()
+    return {name for name, keywords in categories.items() if any(k in text for k in keywords)}
+
+
+def padded_categories(base, total):
+    rng = random.Random(11)
+    categories = {name: list(keywords) for name, keywords in base.items()}
+    names = list(categories)
+    count = sum(len(k) for k in categories.values())
+    while count < total:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12)))
+        categories[rng.choice(names)].append(word)
+        count += 1
+    return categories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keywords", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "conversation_config.json"), encoding="utf-8") as f:
+        base = KeywordRules.from_config(json.load(f)).categories
+
+    print(f"{'keywords':>9} {'legacy us/turn':>15} {'compiled us/turn':>17} {'speedup':>8} {'build ms':>9}")
+    for total in args.keywords:
+        categories = padded_categories(base, total)
+        build = timeit.timeit(lambda: KeywordRules(categories), number=1) * 1000
+        rules = KeywordRules(categories)
+        for turn in TURNS:
+            assert rules.match(turn) == legacy_match(categories, turn), turn
+        legacy = timeit.timeit(lambda: [legacy_match(categories, t) for t in TURNS], number=args.repeat)
+        compiled = timeit.timeit(lambda: [rules.match(t) for t in TURNS], number=args.repeat)
+        per_turn = 1e6 / (args.repeat * len(TURNS))
+        print(f"{len(rules):>9} {legacy * per_turn:>15.2f} {compiled * per_turn:>17.2f} "
+              f"{legacy / compiled:>7.1f}x {build:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
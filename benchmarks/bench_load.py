@@ -0,0 +1,301 @@
+"""Load benchmark: scripted chat and voice conversations against mock providers.
+
+    python benchmarks/bench_load.py [--server flask|asgi] [--profile typical]
+                                    [--concurrency 20] [--conversations 100]
+                                    [--reply-sentences 6] [--no-channel-profiles]
+
+Starts benchmarks/mock_providers.py in-process, points every provider in a
+throwaway config at it (via SYLVAN_CONFIG), starts the app as a
+subprocess and replays multi-turn web chat (JSON and SSE) and Twilio
+voice conversations at the given concurrency. Reports requests/s,
+p50/p95/p99 latency per request kind, time to first token for streamed
+chat, server memory per live session, and the model output tokens per
+turn for each channel profile (compare --no-channel-profiles to see what
+the voice budget saves). The response cache is off so every turn reaches
+a provider.
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_providers import PROFILES, start_mock_server  # noqa: E402
+from provider_health import percentile  # noqa: E402
+
+CHAT_SCRIPT = [
+    "Hi, my son is in 4th grade and struggling with reading.",
+    "How much does tutoring cost?",
+    "Do you have weekend availability?",
+    "My number is 636-555-0142, can someone call me back?",
+    "Thanks, that's all for now.",
+]
+
+VOICE_SCRIPT = [
+    "hi i'm calling about math tutoring for my daughter",
+    "she is in seventh grade and has trouble with algebra",
+    "what are your hours on saturday",
+    "how much is the assessment",
+    "ok thank you goodbye",
+]
+
+_call_ids = itertools.count(1)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_config(mock_url, provider, channel_profiles=True):
+    config = f"""[llm]
+provider = {provider}
+channel_profiles = {str(channel_profiles).lower()}
+
+[local]
+base_url = {mock_url}/v1
+model = mock-local
+
+[openai]
+api_key = mock-key
+base_url = {mock_url}/v1
+
+[openrouter]
+api_key = mock-key
+base_url = {mock_url}/v1
+
+[gemini]
+api_key = mock-key
+model = gemini-1.5-flash
+api_endpoint = {mock_url}
+transport = rest
+
+[cache]
+enabled = false
+
+[telemetry]
+sample_rate = 0
+trace_path =
+"""
+    fd, path = tempfile.mkstemp(prefix='bench_', suffix='.ini')
+    with os.fdopen(fd, 'w') as f:
+        f.write(config)
+    return path
+
+
+def start_app(server, port, config_path):
+    env = dict(os.environ, SYLVAN_CONFIG=config_path)
+    if server == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, '-c', f"import app; app.app.run(port={port}, threaded=True)"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{server} server exited with code {proc.returncode}")
+        try:
+            requests.get(base + '/internal/session-stats', timeout=1)
+            return proc, base
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{server} server did not start within 30s")
+
+
+def rss_kb(pid):
+    """Resident set size of a process in kB (Linux), or None."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}     # kind -> [seconds]
+        self.ttft = []
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds, ok=True, ttft=None):
+        with self._lock:
+            self.latencies.setdefault(kind, []).append(seconds)
+            if not ok:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+            if ttft is not None:
+                self.ttft.append(ttft)
+
+
+def chat_conversation(base, recorder, stream):
+    http = requests.Session()
+    session_id = None
+    for message in CHAT_SCRIPT:
+        start = time.monotonic()
+        if not stream:
+            try:
+                resp = http.post(base + '/api/chat', json={'message': message, 'session_id': session_id}, timeout=60)
+                session_id = resp.json().get('session_id', session_id)
+                recorder.add('chat', time.monotonic() - start, resp.status_code == 200)
+            except (requests.RequestException, ValueError):
+                recorder.add('chat', time.monotonic() - start, False)
+            continue
+        ttft, ok = None, False
+        try:
+            with http.post(base + '/api/chat/stream', json={'message': message, 'session_id': session_id},
+                           stream=True, timeout=60) as resp:
+                event = None
+                for line in resp.iter_lines(decode_unicode=True):
+                    if line.startswith('event: '):
+                        event = line[7:]
+                    elif line.startswith('data: ') and event == 'session':
+                        session_id = json.loads(line[6:])['session_id']
+                    elif line.startswith('data: ') and event == 'token' and ttft is None:
+                        ttft = time.monotonic() - start
+                    elif event == 'done':
+                        ok = resp.status_code == 200
+        except (requests.RequestException, ValueError):
+            ok = False
+        recorder.add('stream', time.monotonic() - start, ok, ttft)
+
+
+def voice_conversation(base, recorder):
+    http = requests.Session()
+    call_sid = f"CAbench{next(_call_ids):08d}"
+    start = time.monotonic()
+    try:
+        resp = http.post(base + '/voice', data={'CallSid': call_sid}, timeout=60)
+        recorder.add('voice', time.monotonic() - start, resp.status_code == 200)
+    except requests.RequestException:
+        recorder.add('voice', time.monotonic() - start, False)
+    for speech in VOICE_SCRIPT:
+        start = time.monotonic()
+        try:
+            resp = http.post(base + '/voice/handle-input', data={'CallSid': call_sid, 'SpeechResult': speech},
+                             timeout=60)
+            recorder.add('voice', time.monotonic() - start, resp.status_code == 200 and '<Response>' in resp.text)
+        except requests.RequestException:
+            recorder.add('voice', time.monotonic() - start, False)
+    return call_sid
+
+
+def output_tokens(base):
+    """{channel: model output tokens per answer} from the app's /metrics."""
+    tokens, answers = {}, {}
+    for line in requests.get(base + '/metrics', timeout=5).text.splitlines():
+        for name, totals in (('sylvan_output_tokens_total{', tokens), ('sylvan_output_answers_total{', answers)):
+            if line.startswith(name):
+                channel = line.split('channel="', 1)[1].split('"', 1)[0]
+                totals[channel] = totals.get(channel, 0) + float(line.rsplit(' ', 1)[1])
+    return {channel: tokens.get(channel, 0) / count for channel, count in answers.items() if count}
+
+
+def ms(value):
+    return f"{value * 1000:8.1f}" if value is not None else "     n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=['flask', 'asgi'], default='flask')
+    parser.add_argument("--provider", default='local', help="[llm] provider the app is configured with")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default='typical')
+    parser.add_argument("--latency", type=float)
+    parser.add_argument("--jitter", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--token-delay", type=float)
+    parser.add_argument("--reply-sentences", type=int, default=2, help="length of the mock providers' replies")
+    parser.add_argument("--no-channel-profiles", action='store_true',
+                        help="turn off the per-channel output budgets ([llm] channel_profiles)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--mix", default='chat:2,stream:1,voice:2',
+                        help="relative weight of each conversation kind")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    mock, mock_url = start_mock_server(0, args.profile, args.reply_sentences, latency=args.latency,
+                                       jitter=args.jitter, error_rate=args.error_rate, token_delay=args.token_delay)
+    config_path = write_config(mock_url, args.provider, not args.no_channel_profiles)
+    proc, base = start_app(args.server, free_port(), config_path)
+
+    kinds = []
+    for part in args.mix.split(','):
+        kind, weight = part.split(':')
+        kinds.extend([kind] * int(weight))
+    recorder = Recorder()
+    call_sids = []
+
+    def run(i):
+        kind = kinds[i % len(kinds)]
+        if kind == 'voice':
+            call_sids.append(voice_conversation(base, recorder))
+        else:
+            chat_conversation(base, recorder, stream=(kind == 'stream'))
+
+    try:
+        rss_before = rss_kb(proc.pid)
+        sessions_before = requests.get(base + '/internal/session-stats').json().get('sessions', 0)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(run, range(args.conversations)))
+        elapsed = time.monotonic() - start
+        rss_after = rss_kb(proc.pid)
+        sessions = requests.get(base + '/internal/session-stats').json().get('sessions', 0) - sessions_before
+        tokens_per_answer = output_tokens(base)
+        for call_sid in call_sids:
+            requests.post(base + '/voice/status', data={'CallSid': call_sid, 'CallStatus': 'completed'})
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        mock.shutdown()
+        os.remove(config_path)
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    results = {"server": args.server, "profile": args.profile, "concurrency": args.concurrency,
+               "requests": total, "seconds": round(elapsed, 3), "rps": round(total / elapsed, 1), "kinds": {}}
+    print(f"{args.server} / {args.profile} profile / concurrency {args.concurrency}: "
+          f"{total} requests in {elapsed:.2f}s = {total / elapsed:.1f} req/s")
+    print(f"{'kind':<8}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for kind, values in sorted(recorder.latencies.items()):
+        p50, p95, p99 = (percentile(values, p) for p in (50, 95, 99))
+        errors = recorder.errors.get(kind, 0)
+        results["kinds"][kind] = {"count": len(values), "errors": errors,
+                                  "p50_ms": p50 * 1000, "p95_ms": p95 * 1000, "p99_ms": p99 * 1000}
+        print(f"{kind:<8}{len(values):>7}{errors:>8} {ms(p50)} {ms(p95)} {ms(p99)}")
+    if recorder.ttft:
+        p50, p95 = percentile(recorder.ttft, 50), percentile(recorder.ttft, 95)
+        results["ttft_ms"] = {"p50": p50 * 1000, "p95": p95 * 1000}
+        print(f"time to first token: p50 {ms(p50).strip()} ms, p95 {ms(p95).strip()} ms")
+    if rss_before and rss_after and sessions > 0:
+        per_session = (rss_after - rss_before) / sessions
+        results["kb_per_session"] = round(per_session, 2)
+        print(f"server memory: {rss_before / 1024:.1f} -> {rss_after / 1024:.1f} MB, "
+              f"{per_session:.2f} kB per session ({sessions} sessions)")
+    if tokens_per_answer:
+        results["output_tokens_per_answer"] = {c: round(v, 1) for c, v in tokens_per_answer.items()}
+        print("output tokens per answer: " + ", ".join(f"{c} {v:.1f}" for c, v in sorted(tokens_per_answer.items())))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Accuracy and absorption of the intent router against labelled transcripts.
+
+    python benchmarks/eval_intent_router.py [transcripts.jsonl ...]
+
+Each line is {"message": ..., "intent": <expected intent or null>} and may
+carry "first_turn": false for mid-conversation turns (defaults to true).
+`null` means the turn should reach the LLM. Reports the share of turns the
+router absorbs, how many of those it answered with the right intent, the
+confident intents it missed, and the routing cost per message.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent_router import IntentRouter  # noqa: E402
+from kb_index import KnowledgeBaseIndex  # noqa: E402
+
+
+def load_samples(paths):
+    samples = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            samples.extend(json.loads(line) for line in f if line.strip())
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("transcripts", nargs="*",
+                        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_samples.jsonl")])
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.ini"))
+    args = parser.parse_args()
+
+    config = ConfigParser()
+    config.read(args.config)
+    with open(os.path.join(ROOT, "knowledge_base.json"), encoding='utf-8') as f:
+        kb = json.load(f)
+    with open(os.path.join(ROOT, "conversation_config.json"), encoding='utf-8') as f:
+        conversation_config = json.load(f)
+    router = IntentRouter.from_config(config, KnowledgeBaseIndex(kb), conversation_config)
+
+    samples = load_samples(args.transcripts)
+    absorbed = correct = missed = 0
+    mistakes = []
+    for sample in samples:
+        match = router.classify(sample["message"], sample.get("first_turn", True))
+        predicted = match[0] if match else None
+        expected = sample.get("intent")
+        if predicted:
+            absorbed += 1
+            if predicted == expected:
+                correct += 1
+            else:
+                mistakes.append((sample["message"], expected, predicted))
+        elif expected:
+            missed += 1
+            mistakes.append((sample["message"], expected, None))
+
+    messages = [s["message"] for s in samples]
+    seconds = timeit.timeit(lambda: [router.classify(m) for m in messages], number=200) / (200 * len(messages))
+
+    expected_total = sum(1 for s in samples if s.get("intent"))
+    print(f"{len(samples)} turns, {expected_total} labelled with a fast-path intent")
+    print(f"absorbed:  {absorbed} ({absorbed / len(samples):.1%} of traffic)")
+    print(f"precision: {correct}/{absorbed} = {correct / absorbed:.1%}" if absorbed else "precision: n/a")
+    print(f"recall:    {correct}/{expected_total} = {correct / expected_total:.1%}" if expected_total else "recall: n/a")
+    print(f"routing cost: {seconds * 1e6:.1f} us per message")
+    for message, expected, predicted in mistakes:
+        print(f"  {message!r}: expected {expected}, routed {predicted}")
+
+
+if __name__ == "__main__":
+    main()
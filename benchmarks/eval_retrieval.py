@@ -0,0 +1,104 @@
+"""Recall of the per-turn FAQ retriever and prompt size as the knowledge base grows.
+
+    python benchmarks/eval_retrieval.py [samples.jsonl ...] [--grow 100 1000 5000]
+
+Each sample is {"message": ..., "chunks": [expected chunk ids], "history":
+[earlier user messages]}. Reports recall@1 and recall@top_k over the
+labelled turns, then pads the knowledge base with synthetic entries and
+compares the per-turn prompt (static prefix + retrieved note) against the
+old prompt that inlined the whole FAQ, with the retrieval cost per turn.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from configparser import ConfigParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from content_bundle import build_faq_context, build_system_prompt  # noqa: E402
+from history_window import estimate_tokens  # noqa: E402
+from retrieval import Retriever, build_chunks  # noqa: E402
+
+FILLER = ("robotics chess coding spanish french piano violin art drama debate geography history biology "
+          "chemistry physics economics latin typing handwriting phonics vocabulary essays research").split()
+
+
+def load_samples(paths):
+    samples = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            samples.extend(json.loads(line) for line in f if line.strip())
+    return samples
+
+
+def grown_kb(kb, extra, rng):
+    """The knowledge base plus `extra` synthetic programme entries."""
+    questions = list(kb.get('questions', []))
+    for i in range(extra):
+        words = rng.sample(FILLER, 3)
+        questions.append({"keywords": [f"{w} {i}" for w in words],
+                          "answer": f"Our {' and '.join(words)} programme number {i} runs twice a week."})
+    return dict(kb, questions=questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("samples", nargs="*",
+                        default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_samples.jsonl")])
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.ini"))
+    parser.add_argument("--grow", type=int, nargs="+", default=[0, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    config = ConfigParser()
+    config.read(args.config)
+    with open(os.path.join(ROOT, "knowledge_base.json"), encoding='utf-8') as f:
+        kb = json.load(f)
+    with open(os.path.join(ROOT, "system_context.json"), encoding='utf-8') as f:
+        system_config = json.load(f)
+    with open(os.path.join(ROOT, "website_context.txt"), encoding='utf-8') as f:
+        website_text = f.read()
+
+    retriever = Retriever.from_config(config, kb, website_text)
+    samples = load_samples(args.samples)
+    hits_at_1 = hits_at_k = expected_total = 0
+    misses = []
+    for sample in samples:
+        history = [{"role": "user", "content": m} for m in sample.get("history", [])]
+        ranked = [retriever.chunks[idx]["id"]
+                  for _, idx in retriever.search(retriever.query_for(sample["message"], history))]
+        expected = sample["chunks"]
+        expected_total += len(expected)
+        hits_at_k += sum(1 for c in expected if c in ranked)
+        hits_at_1 += 1 if ranked and ranked[0] in expected else 0
+        missing = [c for c in expected if c not in ranked]
+        if missing:
+            misses.append((sample["message"], missing, ranked))
+
+    print(f"{len(samples)} turns, {len(retriever.chunks)} chunks, top_k {retriever.top_k}")
+    print(f"recall@1:  {hits_at_1}/{len(samples)} = {hits_at_1 / len(samples):.1%} (top chunk is an expected one)")
+    print(f"recall@{retriever.top_k}:  {hits_at_k}/{expected_total} = {hits_at_k / expected_total:.1%}")
+    for message, missing, ranked in misses:
+        print(f"  {message!r}: missed {missing}, got {ranked}")
+
+    static = estimate_tokens(build_system_prompt(system_config))
+    messages = [s["message"] for s in samples]
+    rng = random.Random(7)
+    print(f"\n{'KB entries':>10}{'full FAQ prompt':>17}{'retrieved prompt':>18}{'retrieval us':>14}")
+    for extra in args.grow:
+        big = grown_kb(kb, extra, rng)
+        full = static + estimate_tokens(build_faq_context(big))
+        big_retriever = Retriever(build_chunks(big, website_text), retriever.top_k, retriever.max_tokens,
+                                  retriever.history_turns)
+        notes = [big_retriever.context_note(m) for m in messages]
+        per_turn = static + sum(estimate_tokens(n["content"]) for n in notes if n) / len(messages)
+        seconds = timeit.timeit(lambda: [big_retriever.context_note(m) for m in messages], number=20) \
+            / (20 * len(messages))
+        print(f"{len(big['questions']):>10}{full:>17}{per_turn:>18.0f}{seconds * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Mock LLM providers for offline load tests.
+
+    python benchmarks/mock_providers.py --profile typical --port 8901
+
+Serves an OpenAI-compatible /v1/chat/completions (plain and SSE
+streaming) and the Gemini REST generateContent / streamGenerateContent
+endpoints that google-generativeai calls with transport = rest. Every
+response waits `latency` +/- `jitter` seconds, fails with a 500 at
+`error_rate`, and generates one word per `token_delay` seconds (streamed
+or not), so longer replies take longer. A reply is `reply_sentences`
+sentences, cut short at the request's max_tokens / max_output_tokens and
+at its first stop sequence, as a real model would.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROFILES = {
+    'fast': {'latency': 0.05, 'jitter': 0.02, 'error_rate': 0.0, 'token_delay': 0.005},
+    'typical': {'latency': 0.4, 'jitter': 0.2, 'error_rate': 0.01, 'token_delay': 0.02},
+    'slow': {'latency': 1.5, 'jitter': 0.5, 'error_rate': 0.0, 'token_delay': 0.05},
+    'flaky': {'latency': 0.4, 'jitter': 0.3, 'error_rate': 0.2, 'token_delay': 0.02},
+}
+
+REPLY = ("Sylvan offers personalized tutoring in math, reading and writing. "
+         "Would you like to schedule an assessment for your child?")
+
+# Extra sentences for --reply-sentences beyond the two in REPLY
+MORE_SENTENCES = [
+    "Our tutors are certified teachers who tailor each session to your child's needs.",
+    "We also offer test prep for the SAT, ACT and state assessments.",
+    "Sessions are available after school on weekdays and on Saturday mornings.",
+    "Most families see progress within the first few months.",
+    "The assessment takes about an hour and shows exactly where your child stands.",
+    "After that, we build a learning plan and review it with you.",
+]
+
+
+def long_reply(sentences):
+    """REPLY padded to `sentences` sentences, keeping its closing question last."""
+    first, question = REPLY.split(". ", 1)
+    extra = (MORE_SENTENCES * (sentences // len(MORE_SENTENCES) + 1))[:max(0, sentences - 2)]
+    return " ".join([first + "."] + extra + [question])
+
+
+def generated(reply, max_tokens=None, stops=()):
+    """(text, cut by max_tokens) a model would send back under a max_tokens limit and stop sequences."""
+    for stop in stops or ():
+        if stop in reply:
+            reply = reply[:reply.index(stop)]
+    truncated = False
+    if max_tokens:
+        words, used = [], 0
+        for word in reply.split(' '):
+            used += len(word) // 4 + 1
+            if used > max_tokens:
+                truncated = True
+                break
+            words.append(word)
+        reply = ' '.join(words)
+    return reply, truncated
+
+
+def usage_for(messages, reply):
+    prompt = sum(len(str(m.get('content', ''))) for m in messages) // 4 + 1
+    return prompt, len(reply) // 4 + 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    profile = PROFILES['fast']
+    reply = REPLY
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # Clients drop the connection once they have seen [DONE], or when a pool closes
+            pass
+
+    def _delay(self):
+        profile = self.profile
+        time.sleep(max(0.0, profile['latency'] + random.uniform(-profile['jitter'], profile['jitter'])))
+        return random.random() >= profile['error_rate']
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        self._send_json(200, {'status': 'ok'})
+
+    def do_POST(self):
+        body = self._read_json()
+        if not self._delay():
+            self._send_json(500, {'error': {'code': 500, 'message': 'mock provider error', 'status': 'INTERNAL'}})
+            return
+        path = self.path.split('?', 1)[0]
+        if path.endswith('/chat/completions'):
+            self._openai(body)
+        elif path.endswith(':streamGenerateContent'):
+            self._gemini(body, stream=True)
+        elif path.endswith(':generateContent'):
+            self._gemini(body, stream=False)
+        elif path.endswith(':countTokens'):
+            self._send_json(200, {'totalTokens': len(json.dumps(body)) // 4 + 1})
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': f'no mock for {path}'}})
+
+    def _generate(self, reply):
+        """Wait as long as generating reply word by word would take."""
+        time.sleep(self.profile['token_delay'] * len(reply.split(' ')))
+
+    def _openai(self, body):
+        stop = body.get('stop')
+        reply, truncated = generated(self.reply, body.get('max_tokens'), [stop] if isinstance(stop, str) else stop)
+        prompt, completion = usage_for(body.get('messages', []), reply)
+        usage = {'prompt_tokens': prompt, 'completion_tokens': completion,
+                 'total_tokens': prompt + completion, 'prompt_tokens_details': {'cached_tokens': 0}}
+        if not body.get('stream'):
+            self._generate(reply)
+            self._send_json(200, {'id': 'mock', 'object': 'chat.completion', 'model': body.get('model'),
+                                  'choices': [{'index': 0, 'finish_reason': 'length' if truncated else 'stop',
+                                               'message': {'role': 'assistant', 'content': reply}}],
+                                  'usage': usage})
+            return
+        self._start_chunked('text/event-stream')
+        for word in reply.split(' '):
+            chunk = {'choices': [{'index': 0, 'delta': {'content': word + ' '}}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(self.profile['token_delay'])
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self._chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _gemini(self, body, stream):
+        messages = [{'content': part.get('text', '')}
+                    for content in body.get('contents', []) for part in content.get('parts', [])]
+        options = body.get('generationConfig') or {}
+        reply, truncated = generated(self.reply, options.get('maxOutputTokens'), options.get('stopSequences'))
+        prompt, completion = usage_for(messages, reply)
+
+        def response(text, final):
+            candidate = {'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}
+            result = {'candidates': [candidate]}
+            if final:
+                candidate['finishReason'] = 'MAX_TOKENS' if truncated else 'STOP'
+                result['usageMetadata'] = {'promptTokenCount': prompt, 'candidatesTokenCount': completion,
+                                           'totalTokenCount': prompt + completion}
+            return result
+
+        if not stream:
+            self._generate(reply)
+            self._send_json(200, response(reply, True))
+            return
+        # The REST transport reads a streamed JSON array of responses
+        words = reply.split(' ')
+        self._start_chunked('application/json')
+        self._chunk('[')
+        for i, word in enumerate(words):
+            final = i == len(words) - 1
+            self._chunk(json.dumps(response(word + ('' if final else ' '), final)) + ('' if final else ','))
+            time.sleep(self.profile['token_delay'])
+        self._chunk(']')
+        self._end_chunked()
+
+
+def start_mock_server(port=0, profile='fast', reply_sentences=2, **overrides):
+    """Start a mock provider in a background thread; returns (server, base_url)."""
+    settings = dict(PROFILES[profile], **{k: v for k, v in overrides.items() if v is not None})
+    handler = type('ProfiledMockHandler', (MockHandler,), {'profile': settings, 'reply': long_reply(reply_sentences)})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default='typical')
+    parser.add_argument("--latency", type=float)
+    parser.add_argument("--jitter", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--token-delay", type=float)
+    parser.add_argument("--reply-sentences", type=int, default=2)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(args.port, args.profile, args.reply_sentences, latency=args.latency,
+                                    jitter=args.jitter, error_rate=args.error_rate, token_delay=args.token_delay)
+    print(f"Mock OpenAI / Gemini provider ({args.profile}) on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
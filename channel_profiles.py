@@ -0,0 +1,161 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Built-in budgets. A caller listens to two or three sentences at most; a web
+# reply can carry a list. [profile:<name>] overrides any key for all
+# providers, and <provider>_<key> (e.g. local_max_tokens) for one of them.
+DEFAULT_PROFILES = {
+    'voice': {'max_tokens': 80, 'max_sentences': 3, 'stop': '\\n\\n|Caller:|User:'},
+    'web': {'max_tokens': 500, 'max_sentences': 0, 'stop': 'User:'},
+}
+
+# Telemetry turn channels that share a profile
+CHANNEL_ALIASES = {'voice_async': 'voice', 'web_stream': 'web'}
+
+PROFILE_KEYS = ('max_tokens', 'max_sentences', 'stop')
+
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'st', 'vs', 'e.g', 'i.e', 'a.m', 'p.m', 'approx'}
+
+# ...and words that abbreviate only before a number: "No. 5" but not "No. We're closed."
+NUMBER_ABBREVIATIONS = {'no'}
+
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*(?=\s|$)')
+
+_active = ContextVar('channel_profile', default=None)
+
+
+def parse_stops(value):
+    """'\\n\\n|Caller:' -> ['\\n\\n', 'Caller:']; \\n in the config means a newline."""
+    return [part.replace('\\n', '\n') for part in value.split('|') if part]
+
+
+def sentence_ends(text):
+    """Offsets just past each sentence-ending punctuation mark in text."""
+    ends = []
+    for match in SENTENCE_END.finditer(text):
+        word = text[:match.start()].rsplit(None, 1)[-1].lower() if text[:match.start()].strip() else ''
+        if match.group().startswith('.') and word in ABBREVIATIONS:
+            continue
+        if match.group() == '.' and word in NUMBER_ABBREVIATIONS and text[match.end():].lstrip()[:1].isdigit():
+            continue
+        ends.append(match.end())
+    return ends
+
+
+def active_profile():
+    """Profile of the get_response / stream_response call in progress, or None."""
+    return _active.get()
+
+
+class ChannelProfile:
+    """Output budget for one channel: max_tokens, stop sequences and a sentence cap.
+
+    max_tokens and stop go into the provider request, so generation stops
+    early instead of being thrown away. clip() and SentenceCap then cut the
+    text at the max_sentences-th sentence boundary; when the provider reports
+    that it ran out of max_tokens, clip() also drops the unfinished last
+    sentence. 0 disables a limit.
+    """
+
+    def __init__(self, name, max_tokens=0, max_sentences=0, stop=(), overrides=None):
+        self.name = name
+        self.max_tokens = max_tokens
+        self.max_sentences = max_sentences
+        self.stop = list(stop)
+        self.overrides = overrides or {}    # provider -> {key: value}
+
+    @classmethod
+    def from_config(cls, config, name):
+        settings = dict(DEFAULT_PROFILES.get(name, {}))
+        overrides = {}
+        section = f'profile:{name}'
+        if config.has_section(section):
+            for key, value in config.items(section):
+                provider, _, setting = key.partition('_')
+                if key in PROFILE_KEYS:
+                    settings[key] = value
+                elif setting in PROFILE_KEYS:
+                    overrides.setdefault(provider, {})[setting] = cls._parse(setting, value)
+        return cls(name, int(settings.get('max_tokens', 0)), int(settings.get('max_sentences', 0)),
+                   parse_stops(settings.get('stop', '')), overrides)
+
+    @staticmethod
+    def _parse(key, value):
+        return parse_stops(value) if key == 'stop' else int(value)
+
+    def setting(self, provider, key):
+        return self.overrides.get(provider, {}).get(key, getattr(self, key))
+
+    def clip(self, text, provider=None, truncated=False):
+        """Text cut to the sentence cap; truncated is the provider's "hit max_tokens" flag."""
+        max_sentences = self.setting(provider, 'max_sentences')
+        if not max_sentences or not text:
+            return text
+        ends = sentence_ends(text)
+        if len(ends) > max_sentences:
+            return text[:ends[max_sentences - 1]]
+        # A reply cut off by max_tokens ends mid-sentence; stop at the last full one. A
+        # reply that finished normally keeps its unpunctuated tail ("reach us at 555 0142")
+        if truncated and ends and ends[-1] < len(text.rstrip()):
+            return text[:ends[-1]]
+        return text
+
+    def sentence_cap(self, provider=None):
+        return SentenceCap(self.setting(provider, 'max_sentences'))
+
+
+class SentenceCap:
+    """Streaming counterpart of ChannelProfile.clip: passes chunks through up to the sentence cap."""
+
+    def __init__(self, max_sentences):
+        self.max_sentences = max_sentences
+        self.text = ''
+        self.done = False
+
+    def feed(self, chunk):
+        """The part of chunk within the cap; sets done once the cap is reached."""
+        if self.done:
+            return ''
+        if not self.max_sentences:
+            return chunk
+        start = len(self.text)
+        self.text += chunk
+        ends = sentence_ends(self.text)
+        if len(ends) < self.max_sentences:
+            return chunk
+        self.done = True
+        return self.text[start:max(start, ends[self.max_sentences - 1])]
+
+
+class ChannelProfiles:
+    """Profiles by channel name, read from [profile:<name>]; [llm] channel_profiles turns them off."""
+
+    def __init__(self, config):
+        self.config = config
+        self.enabled = config.getboolean('llm', 'channel_profiles', fallback=True)
+        self._profiles = {}
+
+    def get(self, channel):
+        """Profile for a channel ('voice', 'voice_async', 'web', ...), or None."""
+        if not self.enabled or not channel:
+            return None
+        name = CHANNEL_ALIASES.get(channel, channel)
+        profile = self._profiles.get(name)
+        if profile is None:
+            profile = self._profiles[name] = ChannelProfile.from_config(self.config, name)
+        return profile
+
+    @contextmanager
+    def use(self, channel):
+        """Make channel's profile the active one for provider calls made inside the block."""
+        token = _active.set(self.get(channel))
+        try:
+            yield _active.get()
+        finally:
+            try:
+                _active.reset(token)
+            except ValueError:
+                # A stream abandoned by its caller is finalized in another context
+                pass
@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+
+from intent_router import IntentRouter
+from kb_index import KnowledgeBaseIndex
+from keyword_rules import KeywordRules
+from response_cache import MessageNormalizer, build_synonyms
+from retrieval import Retriever
+
+CONTENT_FILES = ('knowledge_base.json', 'system_context.json', 'conversation_config.json', 'website_context.txt')
+
+
+def read_json(path, strict=False):
+    """Parsed JSON file; {} on error unless strict (reloads keep the old content instead)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error loading {os.path.basename(path)}: {e}")
+        return {}
+
+
+def read_text(path, strict=False):
+    """File contents; '' when missing (optional content) or unreadable unless strict."""
+    if not os.path.exists(path):
+        return ''
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error loading {os.path.basename(path)}: {e}")
+        return ''
+
+
+def content_path(name, base_dir, fallback_dir=None):
+    """base_dir's copy of a content file, or fallback_dir's when base_dir has none (tenant overrides)."""
+    path = os.path.join(base_dir, name)
+    if fallback_dir is not None and not os.path.exists(path):
+        return os.path.join(fallback_dir, name)
+    return path
+
+
+def build_system_prompt(config):
+    if not config:
+        return "You are a helpful AI assistant."
+
+    biz = config.get('business_profile', {})
+    persona = config.get('agent_persona', {})
+
+    prompt = f"""You are a {persona.get('role', 'Helpful Assistant')} for {biz.get('name', 'this business')}. {biz.get('description', '')}
+
+**Your Personality:**
+"""
+    for trait in persona.get('tone', []):
+        prompt += f"- {trait}\n"
+
+    prompt += f"""
+**Key Information:**
+- **Location:** {biz.get('location', '')}
+- **Phone:** {biz.get('contact', {}).get('phone', '')}
+- **Services:** {', '.join(config.get('services', []))}
+"""
+
+    if config.get('key_selling_points'):
+         prompt += "- **Why Choose Us:** " + " ".join(config.get('key_selling_points', [])) + "\n"
+
+    if config.get('special_offers'):
+        prompt += "\n**Current Special Offers:**\n"
+        for offer in config.get('special_offers', []):
+            prompt += f"- {offer}\n"
+
+    prompt += "\n**Response Guidelines:**\n"
+    for idx, rule in enumerate(persona.get('instructions', []), 1):
+        prompt += f"{idx}. {rule}\n"
+
+    if config.get('conversation_examples'):
+        prompt += "\n**Conversation Flow Examples:**\n"
+        for ex in config.get('conversation_examples', []):
+            prompt += f"\n*User: \"{ex['user_input']}\"*\n*Receptionist: \"{ex['model_response']}\"*\n"
+
+    return prompt
+
+
+def build_faq_context(kb):
+    """Knowledge-base FAQ appended to the system prompt."""
+    if not kb:
+        return ""
+    context_str = "\n\n**Frequently Asked Questions:**\n"
+    for q in kb.get('questions', []):
+        context_str += f"- Q: {', '.join(q['keywords'])}\n  A: {q['answer']}\n"
+    return context_str
+
+
+class ContentBundle:
+    """Everything derived from the content files, built in one go and never mutated.
+
+    Readers take `store.current` once and use that bundle for the whole
+    operation, so a reload can never hand them a mix of old and new content.
+    """
+
+    def __init__(self, config, base_dir='.', strict=False, fallback_dir=None):
+        start = time.perf_counter()
+        path = lambda name: content_path(name, base_dir, fallback_dir)  # noqa: E731
+        self.mtimes = {path(name): _mtime(path(name)) for name in CONTENT_FILES}
+        self.knowledge_base = read_json(path('knowledge_base.json'), strict)
+        self.system_config = read_json(path('system_context.json'), strict)
+        self.conversation_config = read_json(path('conversation_config.json'), strict)
+        self.website_context = read_text(path('website_context.txt'), strict)
+        # Per-turn FAQ / website chunks; without it the whole FAQ rides in the system prompt
+        self.retriever = None
+        if config.getboolean('retrieval', 'enabled', fallback=True):
+            self.retriever = Retriever.from_config(config, self.knowledge_base, self.website_context)
+        # The static, cacheable prefix of every provider request
+        self.system_prompt = build_system_prompt(self.system_config)
+        if self.retriever is None:
+            self.system_prompt += build_faq_context(self.knowledge_base)
+        # All keyword lists compiled into one automaton
+        self.keyword_rules = KeywordRules.from_config(self.conversation_config)
+        # Keyword index for the KB fallback
+        self.kb_index = KnowledgeBaseIndex(self.knowledge_base)
+        # Folds paraphrases of one KB question together (speculative answer matching)
+        self.normalizer = MessageNormalizer(build_synonyms(self.knowledge_base))
+        # Canned answers for confident greeting / pricing / hours / location turns
+        self.intent_router = None
+        if config.getboolean('router', 'enabled', fallback=True):
+            self.intent_router = IntentRouter.from_config(config, self.kb_index, self.conversation_config)
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ContentStore:
+    """Current ContentBundle plus mtime-polling hot reload.
+
+    reload() builds a complete new bundle off the request path and swaps it
+    in with a single reference assignment, then tells subscribers (the LLM
+    managers, the response cache) about it. A file that fails to parse, for
+    example half-way through an editor's save, leaves the old bundle in
+    place; the next poll retries. [reload] interval sets the polling period
+    in seconds (0 disables the watcher).
+    """
+
+    def __init__(self, config, base_dir='.', fallback_dir=None):
+        self.config = config
+        self.base_dir = base_dir
+        self.fallback_dir = fallback_dir
+        self.interval = config.getfloat('reload', 'interval', fallback=2.0)
+        self.current = ContentBundle(config, base_dir, fallback_dir=fallback_dir)
+        self.reloads = 0
+        self.failures = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """callback(bundle) after every successful reload."""
+        self._subscribers.append(callback)
+
+    def changed(self):
+        paths = [content_path(name, self.base_dir, self.fallback_dir) for name in CONTENT_FILES]
+        return paths != list(self.current.mtimes) or any(
+            _mtime(path) != mtime for path, mtime in self.current.mtimes.items())
+
+    def reload(self, force=False):
+        """Rebuild and swap if a content file changed (or force). Returns True if swapped."""
+        with self._lock:
+            if not force and not self.changed():
+                return False
+            try:
+                bundle = ContentBundle(self.config, self.base_dir, strict=True, fallback_dir=self.fallback_dir)
+            except Exception as e:
+                self.failures += 1
+                print(f"[WARN] Content reload failed, keeping the current content: {type(e).__name__}: {e}")
+                return False
+            start = time.perf_counter()
+            self.current = bundle
+            for callback in self._subscribers:
+                try:
+                    callback(bundle)
+                except Exception as e:
+                    print(f"[WARN] Content reload subscriber failed: {type(e).__name__}: {e}")
+            self.reloads += 1
+            print(f"[RELOAD] Content rebuilt in {bundle.build_ms:.1f} ms, subscribers updated in "
+                  f"{(time.perf_counter() - start) * 1000:.1f} ms ({len(bundle.keyword_rules)} keywords, "
+                  f"{len(bundle.kb_index.entries)} KB entries, prompt {len(bundle.system_prompt)} chars)")
+            return True
+
+    def start_watching(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name='content-reload', daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"[WARN] Content watcher error: {e}")
+
+    def stats(self):
+        bundle = self.current
+        return {"reloads": self.reloads, "failures": self.failures, "build_ms": round(bundle.build_ms, 2),
+                "interval": self.interval, "watching": self._thread is not None}
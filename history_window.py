@@ -0,0 +1,120 @@
+import re
+
+# Rough English average; close enough to size a budget without shipping a tokenizer
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD = 4    # role and separators per chat message
+
+SLOT_PATTERNS = {
+    'phone': re.compile(r'(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}'),
+    'email': re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+'),
+    'name': re.compile(r"\bmy name is ([A-Za-z][A-Za-z'-]+)", re.IGNORECASE),
+    'grade': re.compile(r'\b(kindergarten|\d{1,2}(?:st|nd|rd|th) grade|grade \d{1,2})\b', re.IGNORECASE),
+    'age': re.compile(r'\b(\d{1,2})[- ]years?[- ]old\b', re.IGNORECASE),
+    'subject': re.compile(r'\b(math|reading|writing|science|english|sat|act|algebra|geometry|chemistry|physics)\b',
+                          re.IGNORECASE),
+}
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def extract_slots(text):
+    """Lead details mentioned in one user message, e.g. {'phone': '555-123-4567', 'grade': '3rd grade'}."""
+    slots = {}
+    for name, pattern in SLOT_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            slots[name] = (match.group(1) if pattern.groups else match.group(0)).strip()
+    return slots
+
+
+def summarize_message(message, max_chars=80):
+    """First sentence of a user message, clipped; receptionist replies are not kept."""
+    if message["role"] != "user":
+        return None
+    text = " ".join(message["content"].split())
+    sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars - 3].rstrip() + "..."
+    return sentence or None
+
+
+class HistoryWindow:
+    """Token-budgeted conversation history.
+
+    fold() keeps a session's history under [history] max_tokens and
+    max_messages. Evicted turns are not lost outright: lead details
+    (phone, email, name, grade, age, subject) go into
+    session.context['slots'] and the caller's older questions into a short
+    running summary in session.context['summary']. prompt_history() puts
+    both in front of the recent turns as one system note, and fit() trims
+    that to each provider's own budget ([history] <provider>_max_tokens).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.max_tokens = config.getint('history', 'max_tokens', fallback=1500)
+        self.max_messages = config.getint('history', 'max_messages', fallback=20)
+        self.summary_lines = config.getint('history', 'summary_lines', fallback=6)
+
+    def budget(self, provider=None):
+        if provider:
+            return self.config.getint('history', f'{provider}_max_tokens', fallback=self.max_tokens)
+        return self.max_tokens
+
+    def fold(self, session):
+        """Evict the oldest turns over budget into the session's slots and summary."""
+        history = session.history
+        total = sum(message_tokens(msg) for msg in history)
+        evict = 0
+        # Always keep the latest exchange, however long it is
+        while len(history) - evict > 2 and (len(history) - evict > self.max_messages or total > self.max_tokens):
+            total -= message_tokens(history[evict])
+            evict += 1
+        if not evict:
+            return 0
+
+        slots = session.context.setdefault('slots', {})
+        summary = session.context.setdefault('summary', [])
+        for msg in history[:evict]:
+            if msg["role"] == "user":
+                slots.update(extract_slots(msg["content"]))
+            line = summarize_message(msg)
+            if line:
+                summary.append(line)
+        del summary[:-self.summary_lines]
+        session.history = history[evict:]
+        return evict
+
+    def context_note(self, session):
+        slots = session.context.get('slots') or {}
+        summary = session.context.get('summary') or []
+        if not slots and not summary:
+            return None
+        parts = []
+        if summary:
+            parts.append("Earlier the caller asked: " + " | ".join(summary))
+        if slots:
+            parts.append("Known details: " + ", ".join(f"{k}={v}" for k, v in sorted(slots.items())))
+        return {"role": "system", "content": "\n".join(parts)}
+
+    def prompt_history(self, session):
+        """History to send to a model: the context note (if any) followed by the recent turns."""
+        note = self.context_note(session)
+        return ([note] if note else []) + list(session.history)
+
+    def fit(self, history, provider=None):
+        """Newest turns that fit the provider's budget; system notes are always kept."""
+        notes = [msg for msg in history if msg["role"] == "system"]
+        turns = [msg for msg in history if msg["role"] != "system"]
+        remaining = self.budget(provider) - sum(message_tokens(msg) for msg in notes)
+        start = len(turns)
+        while start > 0 and message_tokens(turns[start - 1]) <= remaining:
+            start -= 1
+            remaining -= message_tokens(turns[start])
+        return notes + turns[start:]
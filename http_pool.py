@@ -0,0 +1,103 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def base_url_of(url):
+    """Reduce a full endpoint URL to the scheme://host:port it connects to."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class PooledTransport:
+    """A keep-alive requests.Session bound to a single provider base URL.
+
+    Connections are kept open between turns so a phone reply does not pay a
+    fresh TCP+TLS handshake every time. The pool is capped at pool_maxsize
+    connections; with pool_block=False any burst beyond that still goes
+    through but the extra connections are closed instead of being pooled.
+    """
+
+    def __init__(self, base_url, pool_maxsize=10, connect_timeout=3.05,
+                 read_timeout=60, pool_block=False):
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(pool_connections=1,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block)
+        self.session = requests.Session()
+        self.session.mount(base_url + "/", self.adapter)
+        self.pool_maxsize = pool_maxsize
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        """Connection counters summed over the urllib3 pools of this session."""
+        created = 0
+        sent = 0
+        idle = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            created += pool.num_connections
+            sent += pool.num_requests
+            for conn in list(pool.pool.queue) if pool.pool else []:
+                if conn is not None and getattr(conn, 'sock', None) is not None:
+                    idle += 1
+        return {
+            "base_url": self.base_url,
+            "requests": sent,
+            "connections_created": created,
+            "reused": max(sent - created, 0),
+            "open_idle": idle,
+            "pool_maxsize": self.pool_maxsize,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class TransportPool:
+    """Lazily creates and hands out one PooledTransport per base URL."""
+
+    def __init__(self, config):
+        self.pool_maxsize = config.getint('http', 'pool_maxsize', fallback=10)
+        self.connect_timeout = config.getfloat('http', 'connect_timeout', fallback=3.05)
+        self.read_timeout = config.getfloat('http', 'read_timeout', fallback=60)
+        self.pool_block = config.getboolean('http', 'pool_block', fallback=False)
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        base = base_url_of(url)
+        transport = self._transports.get(base)
+        if transport is None:
+            with self._lock:
+                transport = self._transports.get(base)
+                if transport is None:
+                    transport = PooledTransport(base,
+                                                pool_maxsize=self.pool_maxsize,
+                                                connect_timeout=self.connect_timeout,
+                                                read_timeout=self.read_timeout,
+                                                pool_block=self.pool_block)
+                    self._transports[base] = transport
+        return transport
+
+    def stats(self):
+        return {base: t.stats() for base, t in list(self._transports.items())}
+
+    def close(self):
+        with self._lock:
+            for transport in self._transports.values():
+                transport.close()
+            self._transports.clear()
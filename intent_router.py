@@ -0,0 +1,95 @@
+import threading
+
+from kb_index import tokenize
+from response_cache import STOPWORDS
+
+# Used when conversation_config.json has no "intents" section
+DEFAULT_INTENTS = {
+    'greeting': {'keyword': 'hello', 'first_turn_only': True},
+    'pricing': {'keyword': 'price'},
+    'hours': {'keyword': 'hours'},
+    'location': {'keyword': 'location'},
+}
+
+
+class IntentRouter:
+    """Answers high-confidence, high-volume intents without calling a model.
+
+    Each intent names a knowledge-base entry (by one of its keywords); its
+    answer, or the intent's own "response" override, is fixed when the
+    router is built. A message is routed only when the KB index's best
+    match is one of those entries, the message is short (max_words), the
+    entry's keywords cover at least min_coverage of the message's content
+    words, and the runner-up scores at most (1 - min_margin) of the winner.
+    Anything less certain returns None and goes to the LLM as before.
+    """
+
+    def __init__(self, kb_index, intents, max_words=12, min_coverage=0.5, min_margin=0.3):
+        self.kb_index = kb_index
+        self.max_words = max_words
+        self.min_coverage = min_coverage
+        self.min_margin = min_margin
+        self.routes = {}    # KB entry index -> (intent name, answer, first_turn_only)
+        self._vocab = {}    # KB entry index -> set of keyword tokens
+        for name, spec in intents.items():
+            idx = self._entry_for(spec.get('keyword', name))
+            if idx is None:
+                print(f"[WARN] Intent '{name}': no knowledge base entry has keyword '{spec.get('keyword', name)}'")
+                continue
+            entry = kb_index.entries[idx]
+            answer = spec.get('response') or entry.get('answer', '')
+            self.routes[idx] = (name, answer, bool(spec.get('first_turn_only')))
+            self._vocab[idx] = {t for k in entry.get('keywords', []) for t in tokenize(k)}
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.absorbed = {}
+
+    @classmethod
+    def from_config(cls, config, kb_index, conversation_config):
+        return cls(kb_index, conversation_config.get('intents', DEFAULT_INTENTS),
+                   max_words=config.getint('router', 'max_words', fallback=12),
+                   min_coverage=config.getfloat('router', 'min_coverage', fallback=0.5),
+                   min_margin=config.getfloat('router', 'min_margin', fallback=0.3))
+
+    def _entry_for(self, keyword):
+        keyword = keyword.lower()
+        for idx, entry in enumerate(self.kb_index.entries):
+            if keyword in (k.lower() for k in entry.get('keywords', [])):
+                return idx
+        return None
+
+    def classify(self, message, first_turn=True):
+        """(intent, answer) for a confident match, else None. Does not touch the stats."""
+        tokens = tokenize(message)
+        if not tokens or len(tokens) > self.max_words:
+            return None
+        results = self.kb_index.search(message, top_k=2)
+        if not results:
+            return None
+        score, idx = results[0]
+        route = self.routes.get(idx)
+        if route is None or (route[2] and not first_turn):
+            return None
+        if len(results) > 1 and results[1][0] > score * (1 - self.min_margin):
+            return None
+        content = [t for t in tokens if t not in STOPWORDS]
+        if content and sum(t in self._vocab[idx] for t in content) / len(content) < self.min_coverage:
+            return None
+        return route[0], route[1]
+
+    def route(self, message, session=None):
+        """Precomputed answer for the message, or None to fall through to the LLM."""
+        first_turn = session is None or not any(m["role"] == "user" for m in session.history)
+        match = self.classify(message, first_turn)
+        with self._lock:
+            self.turns += 1
+            if match:
+                self.absorbed[match[0]] = self.absorbed.get(match[0], 0) + 1
+        return match[1] if match else None
+
+    def stats(self):
+        with self._lock:
+            absorbed = sum(self.absorbed.values())
+            return {"turns": self.turns, "absorbed": absorbed,
+                    "absorbed_ratio": round(absorbed / self.turns, 4) if self.turns else 0.0,
+                    "by_intent": dict(self.absorbed)}
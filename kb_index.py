@@ -0,0 +1,76 @@
+import math
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9$]+")
+
+
+def normalize_token(token):
+    # Light plural folding so "prices" finds "price" and "hours" finds "hour"
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [normalize_token(t) for t in TOKEN_RE.findall(text.lower().replace("'", ""))]
+
+
+class KnowledgeBaseIndex:
+    """Inverted index over knowledge-base keywords, built once at load.
+
+    Keywords (single words or phrases) only match on whole-token
+    boundaries, so "hi" no longer fires inside "this". Every entry with a
+    matching keyword is scored BM25-style (rarer keywords and multi-word
+    phrases weigh more) and the best one wins; ties keep the knowledge
+    base order. A lookup does one dict probe per message position and
+    phrase length, so its cost does not grow with the number of entries.
+    """
+
+    def __init__(self, kb, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.entries = kb.get('questions', [])
+        self.default = kb.get('default', "I'm not sure, but please call us!")
+        self._postings = {}     # phrase tokens -> [entry idx]
+        self._doc_len = []
+
+        for idx, entry in enumerate(self.entries):
+            phrases = {tuple(tokenize(k)) for k in entry.get('keywords', [])}
+            phrases.discard(())
+            self._doc_len.append(sum(len(p) for p in phrases) or 1)
+            for phrase in phrases:
+                self._postings.setdefault(phrase, []).append(idx)
+
+        n = len(self.entries) or 1
+        self._avg_len = sum(self._doc_len) / n if self._doc_len else 1
+        self._lengths = sorted({len(phrase) for phrase in self._postings})
+        self._idf = {phrase: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+                     for phrase, ids in self._postings.items()}
+
+    def search(self, message, top_k=1):
+        """[(score, entry index)] for the best matching entries, best first."""
+        tokens = tokenize(message)
+        hits = {}   # entry idx -> {phrase: term frequency}
+        for i in range(len(tokens)):
+            for length in self._lengths:
+                if i + length > len(tokens):
+                    break
+                phrase = tuple(tokens[i:i + length])
+                for idx in self._postings.get(phrase, ()):
+                    counts = hits.setdefault(idx, {})
+                    counts[phrase] = counts.get(phrase, 0) + 1
+
+        scored = []
+        for idx, counts in hits.items():
+            norm = self.k1 * (1 - self.b + self.b * self._doc_len[idx] / self._avg_len)
+            score = sum(self._idf[phrase] * len(phrase) * tf * (self.k1 + 1) / (tf + norm)
+                        for phrase, tf in counts.items())
+            scored.append((score, idx))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored[:top_k]
+
+    def best_answer(self, message):
+        results = self.search(message)
+        if not results:
+            return self.default
+        return self.entries[results[0][1]].get("answer", "")
@@ -0,0 +1,83 @@
+from collections import deque
+
+# Used for any category conversation_config.json does not define
+DEFAULT_RULES = {
+    'scheduling_offer': ['schedule', 'book', 'assessment', 'checkup', 'appointment', 'time', 'availability'],
+    'pricing_offer': ['price', 'cost'],
+    'affirmative_followup': ['yes', 'sure', 'ok', 'okay', 'please', 'i would', 'id like that', 'go ahead'],
+    'calendar_offer': ['schedule', 'book', 'assessment', 'checkup', 'time'],
+    'scheduling_request': ['schedule', 'book', 'appointment', 'visit', 'cost', 'price', 'checkup', 'assessment',
+                           'weekdays', 'weekends', 'morning', 'afternoon', 'evening'],
+}
+
+
+class KeywordRules:
+    """Keyword categories compiled into a single Aho-Corasick automaton.
+
+    match() walks the text once, whatever the number of keywords, and
+    returns every category with at least one keyword occurring in it.
+    Matching is case-insensitive substring matching, the same as the
+    `any(k in text for k in ...)` checks it replaces.
+
+    Instances are immutable; to pick up new keywords build a new one and
+    swap the reference.
+    """
+
+    def __init__(self, categories):
+        self.categories = {name: tuple(k.lower() for k in keywords if k)
+                           for name, keywords in categories.items()}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+
+        outputs = [set()]
+        for name, keywords in self.categories.items():
+            for keyword in keywords:
+                node = 0
+                for ch in keyword:
+                    nxt = self._goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[node][ch] = nxt
+                        self._goto.append({})
+                        self._fail.append(0)
+                        outputs.append(set())
+                    node = nxt
+                outputs[node].add(name)
+
+        # Breadth-first pass to set failure links and inherit their outputs
+        queue = deque(self._goto[0].values())   # depth-1 nodes fail to the root
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                outputs[nxt] |= outputs[self._fail[nxt]]
+        self._out = [frozenset(o) for o in outputs]
+
+    @classmethod
+    def from_config(cls, conversation_config):
+        """Rules from the `keywords` and `rules` sections of conversation_config.json."""
+        categories = dict(DEFAULT_RULES)
+        categories.update(conversation_config.get('keywords', {}))
+        categories.update(conversation_config.get('rules', {}))
+        return cls(categories)
+
+    def match(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        found = set()
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+    def __len__(self):
+        return sum(len(k) for k in self.categories.values())
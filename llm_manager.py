@@ -1,11 +1,215 @@
+import contextvars
+import datetime
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
+
 import requests
-import google.generativeai as genai
+
+from channel_profiles import ChannelProfiles, active_profile
+from http_pool import TransportPool
+from provider_health import HealthTracker
+from history_window import HistoryWindow, estimate_tokens, message_tokens
+from rate_limits import RateLimiter
+from telemetry import telemetry
+from warmup import boot
+
+FAILED_RESPONSES = {"OPENROUTER_FAILED", "LOCAL_FAILED", "OPENAI_FAILED", "GEMINI_FAILED", "GEMINI_NOT_CONFIGURED"}
+
+# Fallback order for each configured primary provider
+PROVIDER_CHAINS = {
+    'local': ('local', 'openai', 'gemini', 'openrouter'),
+    'openai': ('openai', 'gemini', 'openrouter'),
+    'openrouter': ('openrouter', 'gemini'),
+    'gemini': ('gemini', 'openrouter'),
+}
+
+class StreamFailed(Exception):
+    """A provider could not produce (or finish) a streamed completion."""
+
+STREAM_DONE = object()
+
+# Last item of a stream_response() that broke off after text was sent
+STREAM_TRUNCATED = object()
+
+# Set by a provider call when the model stopped at max_tokens rather than finishing
+_truncated = contextvars.ContextVar('truncated', default=False)
+
+
+def openai_truncated(result):
+    """Whether an OpenAI-style completion was cut off by max_tokens."""
+    return (result.get('choices') or [{}])[0].get('finish_reason') == 'length'
+
+
+def gemini_truncated(response):
+    """Whether a Gemini response was cut off by max_output_tokens."""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(reason, 'name', reason) in ('MAX_TOKENS', 2)
+
+def parse_sse_chunk(line):
+    """Decoded chunk from one OpenAI-style SSE line, STREAM_DONE at the end, else None."""
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return STREAM_DONE
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+def chunk_content(chunk):
+    try:
+        return chunk['choices'][0].get('delta', {}).get('content')
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+class TokenUsage:
+    """Per-provider prompt / cached-prompt / completion token counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, provider, prompt=0, cached=0, completion=0):
+        with self._lock:
+            totals = self._totals.setdefault(provider, {
+                "turns": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0})
+            totals["turns"] += 1
+            totals["prompt_tokens"] += prompt
+            totals["cached_tokens"] += cached
+            totals["completion_tokens"] += completion
+            totals["last_turn"] = {"prompt_tokens": prompt, "cached_tokens": cached,
+                                   "completion_tokens": completion}
+        print(f"[DEBUG] {provider} tokens: prompt={prompt} cached={cached} completion={completion}")
+
+    def record_openai(self, provider, result):
+        """Record the `usage` block of an OpenAI-compatible response or final stream chunk."""
+        usage = result.get('usage') or {}
+        details = usage.get('prompt_tokens_details') or {}
+        # llama.cpp reports prompt-cache reuse in its timings block instead
+        cached = details.get('cached_tokens') or (result.get('timings') or {}).get('cache_n') or 0
+        if usage:
+            self.record(provider, usage.get('prompt_tokens') or 0, cached, usage.get('completion_tokens') or 0)
+
+    def record_gemini(self, response):
+        meta = getattr(response, 'usage_metadata', None)
+        if meta:
+            self.record('gemini', meta.prompt_token_count or 0,
+                        getattr(meta, 'cached_content_token_count', 0) or 0,
+                        meta.candidates_token_count or 0)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for provider, totals in self._totals.items():
+                prompt = totals["prompt_tokens"]
+                snapshot[provider] = dict(totals, cached_ratio=round(totals["cached_tokens"] / prompt, 4) if prompt else 0.0)
+            return snapshot
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result.
+
+    do() returns (result, shared). The key is released as soon as the call
+    finishes, so only callers that overlap it are coalesced and nothing is
+    cached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        self._release(key)
+        future.set_result(result)
+        return result, False
+
+    def _release(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+def load_genai():
+    """google.generativeai, imported on first use: it takes longer to import than the rest of the app."""
+    import google.generativeai as genai
+    return genai
+
+# gemini_model before its first use
+_UNSET = object()
+
+def is_valid_response(response):
+    return bool(response) and response not in FAILED_RESPONSES
 
 class LLMManager:
-    def __init__(self, config, system_prompt):
+    def __init__(self, config, system_prompt, transports=None, executor=None, health=None, rate_limits=None):
+        """transports / executor / health / rate_limits may be shared with another manager (one per tenant)."""
         self.config = config
         self.system_prompt = system_prompt
-        self.gemini_model = self._init_gemini()
+        # The system prompt is the static, cacheable prefix of every request
+        self.prefix_hash = hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+        self.usage = TokenUsage()
+        # Rolling latency / error rate and circuit breaker per provider
+        self.health = health or HealthTracker(config)
+        # Client-side RPM / TPM buckets per provider key, with a voice-first queue
+        self.rate_limits = rate_limits or RateLimiter(config)
+        # Per-provider history budgets ([history] <provider>_max_tokens)
+        self.history_window = HistoryWindow(config)
+        # Output budgets per channel ([profile:voice], [profile:web])
+        self.profiles = ChannelProfiles(config)
+        self.gemini_cache = None
+        self._gemini_lock = threading.Lock()
+        # One keep-alive connection pool per provider base URL
+        self.transports = transports or TransportPool(config)
+        # Worker threads for hedged / raced provider calls
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=config.getint('llm', 'max_workers', fallback=16),
+            thread_name_prefix='llm')
+        # Identical concurrent prompts share one upstream call ([llm] coalesce)
+        self.single_flight = self._single_flight() if config.getboolean('llm', 'coalesce', fallback=True) else None
+        self._gemini_model = _UNSET
+
+    def _single_flight(self):
+        return SingleFlight()
+
+    @property
+    def gemini_model(self):
+        """The Gemini model, configured on first use so a deployment that never reaches Gemini never loads the SDK."""
+        if self._gemini_model is _UNSET:
+            with self._gemini_lock:
+                if self._gemini_model is _UNSET:
+                    self._gemini_model = self._init_gemini()
+        return self._gemini_model
+
+    @gemini_model.setter
+    def gemini_model(self, model):
+        self._gemini_model = model
 
     def _init_gemini(self):
         project_id = self.config.get('gemini', 'project_id', fallback='')
@@ -16,169 +220,568 @@ class LLMManager:
         # We'll stick to the original implementation logic.
         api_key = self.config.get('gemini', 'api_key', fallback='')
         if api_key and api_key != 'YOUR_GEMINI_API_KEY_HERE':
-            genai.configure(api_key=api_key)
+            options = {}
+            # Alternate endpoint (a regional endpoint, a proxy, or the benchmark mock server)
+            api_endpoint = self.config.get('gemini', 'api_endpoint', fallback='')
+            if api_endpoint:
+                options['client_options'] = {'api_endpoint': api_endpoint}
+            transport = self.config.get('gemini', 'transport', fallback='')
+            if transport:
+                options['transport'] = transport
+            load_genai().configure(api_key=api_key, **options)
             model_name = self.config.get('gemini', 'model', fallback='gemini-pro')
-            return genai.GenerativeModel(model_name)
+            return self._gemini_model_with_prefix(model_name)
         return None
 
-    def get_local_response(self, user_message, history):
-        """Support for local OpenAI-compatible endpoints (Ollama, LM Studio)."""
-        base_url = self.config.get('local', 'base_url', fallback='http://localhost:11434/v1')
-        model = self.config.get('local', 'model', fallback='llama3.2')
-        api_key = self.config.get('local', 'api_key', fallback='lm-studio')
-        
-        if not base_url.endswith('/chat/completions'):
-            url = f"{base_url.rstrip('/')}/chat/completions"
-        else:
-            url = base_url
+    def _gemini_model_with_prefix(self, model_name):
+        """Model carrying the system prompt as its system instruction.
 
-        print(f"[DEBUG] Trying Local LLM: {url} with model {model}")
+        With [gemini] cache_ttl_minutes set, the instruction is uploaded once
+        as cached content so each turn only pays for history and the new
+        message. Falls back to a plain system instruction if the model or
+        prompt size does not qualify for caching.
+        """
+        genai = load_genai()
+        ttl = self.config.getint('gemini', 'cache_ttl_minutes', fallback=0)
+        if ttl:
+            try:
+                self.gemini_cache = genai.caching.CachedContent.create(
+                    model=model_name,
+                    system_instruction=self.system_prompt,
+                    ttl=datetime.timedelta(minutes=ttl))
+                self._gemini_cache_renew_at = time.time() + ttl * 60 * 0.8
+                return genai.GenerativeModel.from_cached_content(self.gemini_cache)
+            except Exception as e:
+                print(f"[WARN] Gemini cached content unavailable, using system instruction: {e}")
+                self.gemini_cache = None
+        return genai.GenerativeModel(model_name, system_instruction=self.system_prompt)
+
+    def set_system_prompt(self, system_prompt):
+        """Swap in a new static prefix after a content reload."""
+        if system_prompt == self.system_prompt:
+            return
+        with self._gemini_lock:
+            self.system_prompt = system_prompt
+            self.prefix_hash = hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+            # Not built yet (or not configured): the first use picks up the new prompt
+            if self._gemini_model is not None and self._gemini_model is not _UNSET:
+                model_name = self.config.get('gemini', 'model', fallback='gemini-pro')
+                self.gemini_model = self._gemini_model_with_prefix(model_name)
+
+    def _gemini_chat(self, history, user_message):
+        """(chat session, message to send) for a Gemini turn."""
+        if self.gemini_cache is not None and time.time() >= self._gemini_cache_renew_at:
+            with self._gemini_lock:
+                if time.time() >= self._gemini_cache_renew_at:
+                    model_name = self.config.get('gemini', 'model', fallback='gemini-pro')
+                    self.gemini_model = self._gemini_model_with_prefix(model_name)
+        # Gemini has no system turns and wants user / model turns to alternate, so the
+        # context notes ride along at the top of the message being sent
+        notes, contents = [], []
+        for msg in self.history_window.fit(history, 'gemini'):
+            if msg["role"] == "system":
+                notes.append(msg["content"])
+                continue
+            role = "model" if msg["role"] == "assistant" else "user"
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"][0] += "\n\n" + msg["content"]
+            else:
+                contents.append({"role": role, "parts": [msg["content"]]})
+        # Gemini wants the conversation to open with a user turn (voice calls open with the greeting)
+        while contents and contents[0]["role"] == "model":
+            contents.pop(0)
+        # ... and end with a model turn, since the message sent next is the user's
+        if contents and contents[-1]["role"] == "user":
+            notes.append(contents.pop()["parts"][0])
+        return self.gemini_model.start_chat(history=contents), "\n\n".join(notes + [user_message])
+
+    def _gemini_generation_config(self):
+        """max_output_tokens / stop_sequences from the active channel profile, or None."""
+        profile = active_profile()
+        if profile is None:
+            return None
+        options = {}
+        if profile.setting('gemini', 'max_tokens'):
+            options['max_output_tokens'] = profile.setting('gemini', 'max_tokens')
+        if profile.setting('gemini', 'stop'):
+            options['stop_sequences'] = profile.setting('gemini', 'stop')[:5]
+        return options or None
+
+    def _openai_endpoint(self, name):
+        """(url, api_key, model) for an OpenAI-compatible provider, or None if unconfigured."""
+        if name == 'local':
+            base_url = self.config.get('local', 'base_url', fallback='http://localhost:11434/v1')
+            model = self.config.get('local', 'model', fallback='llama3.2')
+            api_key = self.config.get('local', 'api_key', fallback='lm-studio')
+            if not base_url.endswith('/chat/completions'):
+                url = f"{base_url.rstrip('/')}/chat/completions"
+            else:
+                url = base_url
+            return url, api_key, model
+        if name == 'openai':
+            api_key = self.config.get('openai', 'api_key', fallback='')
+            model = self.config.get('openai', 'model', fallback='gpt-4o-mini')
+            if not api_key or api_key == 'YOUR_OPENAI_API_KEY':
+                return None
+            base_url = self.config.get('openai', 'base_url', fallback='https://api.openai.com/v1')
+            return f"{base_url.rstrip('/')}/chat/completions", api_key, model
+        if name == 'openrouter':
+            api_key = self.config.get('openrouter', 'api_key', fallback='')
+            model = self.config.get('openrouter', 'model', fallback='meta-llama/llama-3.2-3b-instruct:free')
+            base_url = self.config.get('openrouter', 'base_url', fallback='https://openrouter.ai/api/v1')
+            return f"{base_url.rstrip('/')}/chat/completions", api_key, model
+        return None
+
+    def _api_key(self, name):
+        if name == 'gemini':
+            return self.config.get('gemini', 'api_key', fallback='')
+        endpoint = self._openai_endpoint(name)
+        return endpoint[1] if endpoint else ''
+
+    def _prompt_tokens(self, user_message, history):
+        """Rough prompt size of a turn, for the TPM buckets."""
+        return (estimate_tokens(self.system_prompt) + estimate_tokens(user_message)
+                + sum(message_tokens(m) for m in history))
+
+    def _rate_limited(self, name, e):
+        """Hold a provider back after a quota error the SDK raised instead of returning a 429."""
+        if type(e).__name__ in ('ResourceExhausted', 'TooManyRequests') or '429' in str(e):
+            self.rate_limits.throttle(name, self._api_key(name))
+
+    def _build_messages(self, user_message, history, name=None):
+        messages = [{"role": "system", "content": self.system_prompt}]
+        messages.extend(self.history_window.fit(history, name))
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def _chat_payload(self, name, user_message, history, stream=False):
+        """(url, headers, payload) for a chat completion on an OpenAI-compatible provider."""
+        url, api_key, model = self._openai_endpoint(name)
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        messages = self._build_messages(user_message, history, name)
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.7
+        }
+        profile = active_profile()
+        if profile is not None:
+            if profile.setting(name, 'max_tokens'):
+                payload["max_tokens"] = profile.setting(name, 'max_tokens')
+            if profile.setting(name, 'stop'):
+                payload["stop"] = profile.setting(name, 'stop')[:4]     # OpenAI accepts at most 4
+        # Keep the system prompt prefix byte-identical and tell each backend it may reuse it
+        if name == 'local':
+            if self.config.getboolean('local', 'cache_prompt', fallback=True):
+                payload["cache_prompt"] = True      # llama.cpp server KV-cache reuse
+            keep_alive = self.config.get('local', 'keep_alive', fallback='30m')
+            if keep_alive:
+                payload["keep_alive"] = keep_alive  # Ollama: keep the model (and its cache) loaded
+        elif name == 'openai':
+            payload["prompt_cache_key"] = self.config.get('openai', 'prompt_cache_key', fallback=self.prefix_hash)
+        elif name == 'openrouter' and self.config.getboolean('openrouter', 'cache_control', fallback=False):
+            # Explicit breakpoint for providers behind OpenRouter that need one (Anthropic, Gemini)
+            messages[0] = {"role": "system", "content": [
+                {"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}}]}
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return url, headers, payload
+
+    def _chat_request(self, name, user_message, history, stream=False):
+        """Send a chat completion to an OpenAI-compatible provider and return the raw response."""
+        url, headers, payload = self._chat_payload(name, user_message, history, stream)
+        return self.transports.for_url(url).post(url, headers=headers, json=payload, stream=stream)
+
+    def _keyed_endpoint(self, name):
+        """Whether an OpenAI-compatible provider is configured with a key (a local server needs none)."""
+        endpoint = self._openai_endpoint(name)
+        return endpoint is not None and (name == 'local' or bool(endpoint[1]))
+
+    def _prime_payload(self, name):
+        """Smallest chat request that still carries the system prompt, so the provider caches the prefix."""
+        url, headers, payload = self._chat_payload(name, "Hi", [])
+        payload["max_tokens"] = 1
+        return url, headers, payload
+
+    def prime(self, name):
+        """Warm a provider before the first caller: connection, prompt cache, model load.
+
+        Returns None when the provider is not configured, else whether it answered.
+        """
+        if name == 'gemini':
+            if self.gemini_model is None:
+                return None
+            self.gemini_model.count_tokens("Hi")
+            return True
+        if not self._keyed_endpoint(name):
+            return None
+        url, headers, payload = self._prime_payload(name)
+        response = self.transports.for_url(url).post(url, headers=headers, json=payload)
+        # Read the body so the connection goes back to the pool
+        response.content
+        return response.status_code == 200
+
+    def _chat_completion(self, name, user_message, history):
+        failed = f"{name.upper()}_FAILED"
+        if self._openai_endpoint(name) is None:
+            return failed
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            messages = [{"role": "system", "content": self.system_prompt}]
-            messages.extend(history)
-            messages.append({"role": "user", "content": user_message})
-            
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
+            response = self._chat_request(name, user_message, history)
+            self.rate_limits.learn(name, self._api_key(name), response.headers, response.status_code)
             if response.status_code != 200:
-                print(f"[DEBUG] Local LLM Error: {response.text}")
-                return "LOCAL_FAILED"
-                
+                print(f"[DEBUG] {name} Error: {response.text}")
+                return failed
             result = response.json()
+            self.usage.record_openai(name, result)
+            _truncated.set(openai_truncated(result))
             return result['choices'][0]['message']['content']
         except Exception as e:
-            print(f"[DEBUG] Local LLM connectivity error: {e}")
-            return "LOCAL_FAILED"
-
-    def get_openai_response(self, user_message, history):
-        """Direct OpenAI API support."""
-        api_key = self.config.get('openai', 'api_key', fallback='')
-        model = self.config.get('openai', 'model', fallback='gpt-4o-mini')
-        
-        if not api_key or api_key == 'YOUR_OPENAI_API_KEY':
-            return "OPENAI_FAILED"
+            print(f"[DEBUG] {name} connectivity error: {type(e).__name__}: {e}")
+            return failed
 
+    def _stream_chat_completion(self, name, user_message, history):
+        """Yield content deltas from an OpenAI-compatible server-sent event stream."""
+        if self._openai_endpoint(name) is None:
+            raise StreamFailed(f"{name} not configured")
         try:
-            url = "https://api.openai.com/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            messages = [{"role": "system", "content": self.system_prompt}]
-            messages.extend(history)
-            messages.append({"role": "user", "content": user_message})
-            
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            if response.status_code != 200:
-                print(f"[DEBUG] OpenAI Error: {response.text}")
-                return "OPENAI_FAILED"
-                
-            result = response.json()
-            return result['choices'][0]['message']['content']
+            response = self._chat_request(name, user_message, history, stream=True)
         except Exception as e:
-            print(f"[DEBUG] OpenAI connectivity error: {e}")
-            return "OPENAI_FAILED"
+            raise StreamFailed(f"{name} connectivity error: {type(e).__name__}: {e}")
+        with response:
+            self.rate_limits.learn(name, self._api_key(name), response.headers, response.status_code)
+            try:
+                if response.status_code != 200:
+                    raise StreamFailed(f"{name} Error: {response.text}")
+                for line in response.iter_lines(decode_unicode=True):
+                    chunk = parse_sse_chunk(line)
+                    if chunk is STREAM_DONE:
+                        break
+                    if not chunk:
+                        continue
+                    if chunk.get('usage'):
+                        self.usage.record_openai(name, chunk)
+                    content = chunk_content(chunk)
+                    if content:
+                        yield content
+            except requests.RequestException as e:
+                # A connection dropped mid-stream ends the stream like any other provider failure
+                raise StreamFailed(f"{name} connectivity error: {type(e).__name__}: {e}") from e
+
+    def get_local_response(self, user_message, history):
+        """Support for local OpenAI-compatible endpoints (Ollama, LM Studio)."""
+        url, _, model = self._openai_endpoint('local')
+        print(f"[DEBUG] Trying Local LLM: {url} with model {model}")
+        return self._chat_completion('local', user_message, history)
+
+    def get_openai_response(self, user_message, history):
+        """Direct OpenAI API support."""
+        return self._chat_completion('openai', user_message, history)
 
     def get_openrouter_response(self, user_message, history):
         """Fallback to OpenRouter API."""
         print("[DEBUG] Trying OpenRouter fallback...")
-        api_key = self.config.get('openrouter', 'api_key', fallback='')
-        model = self.config.get('openrouter', 'model', fallback='meta-llama/llama-3.2-3b-instruct:free')
-        try:
-            url = "https://openrouter.ai/api/v1/chat/completions"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
-            messages = [{"role": "system", "content": self.system_prompt}]
-            messages.extend(history)
-            messages.append({"role": "user", "content": user_message})
-            payload = {
-                "model": model,
-                "messages": messages,
-                "temperature": 0.7
-            }
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            if response.status_code != 200:
-                print(f"[DEBUG] OpenRouter Error: {response.text}")
-                return "OPENROUTER_FAILED"
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        except Exception as e:
-            print(f"[DEBUG] OpenRouter error: {type(e).__name__}: {e}")
-            return "OPENROUTER_FAILED"
+        return self._chat_completion('openrouter', user_message, history)
 
     def get_gemini_response(self, user_message, history):
         """Try Gemini."""
         if not self.gemini_model:
             return "GEMINI_NOT_CONFIGURED"
         try:
-            # Construct chat with history manually for Gemini
-            # Note: Gemini history format is different, but for simplicity we rely on string concatenation here 
-            # or we could map standard messages to Gemini content objects.
-            # Sticking to the previous simpler prompt concatenation strategy for stability.
-            
-            history_str = ""
-            for msg in history:
-                role_name = "User" if msg["role"] == "user" else "Receptionist"
-                history_str += f"{role_name}: {msg['content']}\n"
-
-            full_prompt = f"{self.system_prompt}\n\nConversation History:\n{history_str}\nUser: {user_message}\nReceptionist:"
-            
-            chat = self.gemini_model.start_chat(history=[])
-            response = chat.send_message(full_prompt)
+            chat, message = self._gemini_chat(history, user_message)
+            response = chat.send_message(message, generation_config=self._gemini_generation_config())
+            self.usage.record_gemini(response)
+            _truncated.set(gemini_truncated(response))
             return response.text
         except Exception as e:
             print(f"[DEBUG] Gemini API error: {e}")
+            self._rate_limited('gemini', e)
             return "GEMINI_FAILED"
 
-    def get_response(self, user_message, history):
-        """Dispatch to the configured LLM provider with fallback."""
+    def stream_local_response(self, user_message, history):
+        return self._stream_chat_completion('local', user_message, history)
+
+    def stream_openai_response(self, user_message, history):
+        return self._stream_chat_completion('openai', user_message, history)
+
+    def stream_openrouter_response(self, user_message, history):
+        return self._stream_chat_completion('openrouter', user_message, history)
+
+    def stream_gemini_response(self, user_message, history):
+        if not self.gemini_model:
+            raise StreamFailed("Gemini not configured")
+        try:
+            chat, message = self._gemini_chat(history, user_message)
+            response = chat.send_message(message, stream=True,
+                                         generation_config=self._gemini_generation_config())
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            self.usage.record_gemini(response)
+        except Exception as e:
+            self._rate_limited('gemini', e)
+            raise StreamFailed(f"Gemini API error: {e}")
+
+    def stream_response(self, user_message, history, channel=None):
+        """Yield text chunks from the first provider in the chain that starts streaming.
+
+        A provider that fails before its first chunk falls through to the next
+        one; a failure after text has been sent ends the stream early, since
+        the caller has already shown that text, and yields STREAM_TRUNCATED
+        last so the partial answer is not mistaken for a whole one (e.g. by
+        the response cache). channel picks the output
+        budget (see channel_profiles.py); the stream is closed, and the
+        provider stops generating, once its sentence cap is reached.
+        """
+        with self.profiles.use(channel) as profile:
+            yield from self._stream(user_message, history, profile)
+
+    def _stream(self, user_message, history, profile):
+        tokens = self._prompt_tokens(user_message, history)
+        for name in self.routed_chain(tokens):
+            if not self._admit(name, tokens):
+                continue
+            started = False
+            start = time.monotonic()
+            cap = profile.sentence_cap(name) if profile else None
+            try:
+                stream = getattr(self, f"stream_{name}_response")(user_message, history)
+                for chunk in stream:
+                    if not started:
+                        # Time to first token is the latency that matters for a stream
+                        self.health.record(name, True, time.monotonic() - start)
+                        telemetry.record_span('provider_first_token', time.monotonic() - start, provider=name)
+                        boot.first_response(name)
+                    started = True
+                    if cap is not None:
+                        chunk = cap.feed(chunk)
+                        if cap.done:
+                            stream.close()
+                            if chunk:
+                                yield chunk
+                            return
+                    yield chunk
+                return
+            except StreamFailed as e:
+                print(f"[DEBUG] {e}")
+                if started:
+                    yield STREAM_TRUNCATED
+                    return
+                self.health.record(name, False, time.monotonic() - start)
+                telemetry.count('sylvan_fallbacks_total', provider=name)
+                print(f"[WARN] {name} stream failed. Falling back to the next provider.")
+
+    def pool_stats(self):
+        """Reuse / open-connection counters for each provider base URL."""
+        return self.transports.stats()
+
+    def token_stats(self):
+        """Prompt vs cached-prompt tokens per provider, plus the size of the shared prefix."""
+        return {"prefix_hash": self.prefix_hash,
+                "prefix_chars": len(self.system_prompt),
+                "gemini_cached_content": getattr(self.gemini_cache, 'name', None),
+                "providers": self.usage.snapshot()}
+
+    def provider_chain(self):
+        """Providers to try for a turn, in priority order, from [llm] provider."""
         provider = self.config.get('llm', 'provider', fallback='gemini').lower()
-        
-        response = None
-        
-        # Primary Provider
-        if provider == 'local':
-            response = self.get_local_response(user_message, history)
-            if response != "LOCAL_FAILED": return response
-            print("[WARN] Local LLM failed. Falling back to OpenAI (if configured).")
-            
-            # Fallback 1: OpenAI
-            response = self.get_openai_response(user_message, history)
-            if response != "OPENAI_FAILED": return response
-            print("[WARN] OpenAI fallback failed. Falling back to Gemini.")
-
-        elif provider == 'openai':
-             response = self.get_openai_response(user_message, history)
-             if response != "OPENAI_FAILED": return response
-             print("[WARN] OpenAI failed. Falling back to Gemini.")
-
-        elif provider == 'openrouter':
-            response = self.get_openrouter_response(user_message, history)
-            if response != "OPENROUTER_FAILED": return response
-
-        # Default / Ultimate Fallback: Gemini
-        response = self.get_gemini_response(user_message, history)
-        if response not in ["GEMINI_FAILED", "GEMINI_NOT_CONFIGURED"]: return response
-        
-        # If Gemini fails, try OpenRouter as last resort if not already tried
-        if provider != 'openrouter':
-             return self.get_openrouter_response(user_message, history)
-             
+        return list(PROVIDER_CHAINS.get(provider, PROVIDER_CHAINS['gemini']))
+
+    def routed_chain(self, tokens=1):
+        """provider_chain() minus open circuits, reordered by p95 when [llm] adaptive_routing is on.
+
+        Providers whose rate-limit buckets have room for `tokens` more prompt
+        tokens go ahead of those that would have to queue.
+        """
+        chain = self.health.route(self.provider_chain())
+        return self.rate_limits.route(chain, {name: self._api_key(name) for name in chain}, tokens)
+
+    def _admit(self, name, tokens):
+        """Take a request from the provider's buckets (queueing briefly) and its breaker; False to skip the provider."""
+        if self.rate_limits.acquire(name, self._api_key(name), tokens, telemetry.current_channel()):
+            return self._breaker_allows(name)
+        telemetry.count('sylvan_provider_calls_total', provider=name, outcome='throttled')
+        print(f"[WARN] {name} is at its rate limit. Falling back to the next provider.")
+        return False
+
+    def _breaker_allows(self, name):
+        """Reserve the provider's half-open probe just before the request goes out; False if another has it."""
+        if self.health.get(name).allow():
+            return True
+        telemetry.count('sylvan_provider_calls_total', provider=name, outcome='circuit_open')
+        print(f"[HEALTH] {name} circuit is not closed and its probe is taken. Falling back to the next provider.")
+        return False
+
+    def coalesce_key(self, name, user_message, history):
+        """Everything that determines a provider's answer: provider, model, prefix, profile, history, message."""
+        if name == 'gemini':
+            model = self.config.get('gemini', 'model', fallback='gemini-pro')
+        else:
+            endpoint = self._openai_endpoint(name)
+            model = endpoint[2] if endpoint else None
+        profile = active_profile()
+        return (name, model, self.prefix_hash, profile.name if profile else None,
+                json.dumps(history, sort_keys=True, default=str), user_message)
+
+    def call_provider(self, name, user_message, history):
+        """One provider attempt; joins an identical attempt already in flight instead of starting another."""
+        if self.single_flight is None:
+            return self._call_provider(name, user_message, history)
+        response, shared = self.single_flight.do(self.coalesce_key(name, user_message, history),
+                                                 self._call_provider, name, user_message, history)
+        if shared:
+            telemetry.count('sylvan_coalesced_total', provider=name)
+        return response
+
+    def _call_provider(self, name, user_message, history):
+        if not self._admit(name, self._prompt_tokens(user_message, history)):
+            return f"{name.upper()}_FAILED"
+        start = time.monotonic()
+        mark = _truncated.set(False)
+        try:
+            with telemetry.span('provider', provider=name):
+                response = getattr(self, f"get_{name}_response")(user_message, history)
+            truncated = _truncated.get()
+        except Exception:
+            self.health.record(name, False, time.monotonic() - start)
+            telemetry.count('sylvan_provider_calls_total', provider=name, outcome='error')
+            raise
+        finally:
+            _truncated.reset(mark)
+        ok = is_valid_response(response)
+        self.health.record(name, ok, time.monotonic() - start)
+        telemetry.count('sylvan_provider_calls_total', provider=name, outcome='ok' if ok else 'failed')
+        if ok:
+            response = self._clip(name, response, truncated)
+            boot.first_response(name)
+        return response
+
+    def _clip(self, name, response, truncated=False):
+        """Cut an answer to the active profile's sentence cap and count the output tokens per channel."""
+        profile = active_profile()
+        channel = profile.name if profile else 'none'
+        clipped = profile.clip(response, name, truncated) if profile else response
+        telemetry.count('sylvan_output_answers_total', channel=channel, provider=name)
+        telemetry.count('sylvan_output_tokens_total', estimate_tokens(response), channel=channel, provider=name)
+        if len(clipped) < len(response):
+            telemetry.count('sylvan_clipped_tokens_total', estimate_tokens(response) - estimate_tokens(clipped),
+                            channel=channel, provider=name)
+        return clipped
+
+    def health_stats(self):
+        return self.health.snapshot()
+
+    def rate_limit_stats(self):
+        return self.rate_limits.stats()
+
+    def coalesce_stats(self):
+        return self.single_flight.stats() if self.single_flight else {"enabled": False}
+
+    def get_response(self, user_message, history, channel=None):
+        """Dispatch to the configured LLM provider with fallback.
+
+        [llm] mode selects how the chain is walked:
+          serial - one provider after another (default)
+          hedged - start the primary, fire the next provider every hedge_delay
+                   seconds until one answers
+          race   - fire every provider at once
+        In all modes the first valid answer wins, earlier providers in the
+        chain win ties, and no new provider is started after [llm] deadline.
+        channel ('voice', 'web', or a telemetry turn channel) selects the
+        output budget: max_tokens, stop sequences and sentence cap.
+        """
+        chain = self.routed_chain(self._prompt_tokens(user_message, history))
+        mode = self.config.get('llm', 'mode', fallback='serial').lower()
+        deadline = self.config.getfloat('llm', 'deadline', fallback=0) or None
+
+        with self.profiles.use(channel):
+            if mode == 'race':
+                return self._race(chain, user_message, history, 0, deadline)
+            if mode == 'hedged':
+                hedge_delay = self.config.getfloat('llm', 'hedge_delay', fallback=2.0)
+                return self._race(chain, user_message, history, hedge_delay, deadline)
+            return self._serial(chain, user_message, history, deadline)
+
+    def _serial(self, chain, user_message, history, deadline):
+        start = time.monotonic()
+        for name in chain:
+            remaining = deadline - (time.monotonic() - start) if deadline else None
+            if remaining is not None and remaining <= 0:
+                print(f"[WARN] Turn deadline of {deadline}s spent before trying {name}.")
+                break
+            if remaining is None:
+                response = self.call_provider(name, user_message, history)
+            else:
+                # Wait on the executor so a slow in-flight call can't outlive the deadline
+                future = self.executor.submit(contextvars.copy_context().run,
+                                              self.call_provider, name, user_message, history)
+                try:
+                    response = future.result(timeout=remaining)
+                except FutureTimeout:
+                    future.cancel()
+                    print(f"[WARN] Turn deadline of {deadline}s reached while waiting on {name}.")
+                    break
+            if is_valid_response(response):
+                return response
+            telemetry.count('sylvan_fallbacks_total', provider=name)
+            print(f"[WARN] {name} failed. Falling back to the next provider.")
+        return None
+
+    def _race(self, chain, user_message, history, hedge_delay, deadline):
+        if not chain:
+            return None
+        start = time.monotonic()
+        pending = {}
+        launched = 0
+        last_launch = start
+
+        def launch():
+            nonlocal launched, last_launch
+            name = chain[launched]
+            # Run in a copy of this context so the attempt's span joins the turn's trace
+            future = self.executor.submit(contextvars.copy_context().run,
+                                          self.call_provider, name, user_message, history)
+            pending[future] = launched
+            launched += 1
+            last_launch = time.monotonic()
+
+        launch()
+        while hedge_delay == 0 and launched < len(chain):
+            launch()
+
+        while pending:
+            now = time.monotonic()
+            waits = []
+            if launched < len(chain):
+                waits.append(max(last_launch + hedge_delay - now, 0))
+            if deadline:
+                waits.append(max(start + deadline - now, 0))
+            done, _ = wait(list(pending), timeout=min(waits) if waits else None,
+                           return_when=FIRST_COMPLETED)
+
+            for future in sorted(done, key=lambda f: pending[f]):
+                index = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    print(f"[DEBUG] {chain[index]} raised {type(e).__name__}: {e}")
+                    continue
+                if is_valid_response(response):
+                    for other in pending:
+                        other.cancel()
+                    return response
+                telemetry.count('sylvan_fallbacks_total', provider=chain[index])
+                print(f"[WARN] {chain[index]} failed during hedged race.")
+
+            now = time.monotonic()
+            if deadline and now - start >= deadline:
+                print(f"[WARN] Turn deadline of {deadline}s reached; abandoning {len(pending)} provider call(s).")
+                for other in pending:
+                    other.cancel()
+                return None
+            if launched < len(chain) and (not pending or now - last_launch >= hedge_delay):
+                launch()
         return None
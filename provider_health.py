@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ProviderHealth:
+    """Rolling latency / error window and circuit breaker for one provider.
+
+    After failure_threshold consecutive failures the breaker opens and the
+    provider is skipped. Once cooldown seconds have passed a single
+    half-open probe is let through: success closes the breaker, failure
+    opens it for another cooldown.
+    """
+
+    def __init__(self, name, window=50, failure_threshold=3, cooldown=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.samples = deque(maxlen=window)   # (ok, latency seconds)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started = None
+        self.total_calls = 0
+        self.total_failures = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        """Whether allow() would let a call through; reserves nothing, so status pages and routing can ask."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN:
+                return now - self.opened_at >= self.cooldown
+            return self.probe_started is None or now - self.probe_started >= self.cooldown
+
+    def allow(self):
+        """Let a call through; for a half-open breaker this reserves the single probe.
+
+        Call it right before the request is sent, not while planning a chain.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                print(f"[HEALTH] {self.name} circuit half-open; sending a probe.")
+            if self.state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is retried after a cooldown
+                if self.probe_started is None or now - self.probe_started >= self.cooldown:
+                    self.probe_started = now
+                    return True
+            return False
+
+    def record(self, ok, latency):
+        with self._lock:
+            self.samples.append((ok, latency))
+            self.total_calls += 1
+            if ok:
+                self.consecutive_failures = 0
+                if self.state != CLOSED:
+                    print(f"[HEALTH] {self.name} recovered; circuit closed.")
+                self.state = CLOSED
+                self.probe_started = None
+                return
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"[HEALTH] {self.name} circuit opened after {self.consecutive_failures} failure(s).")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probe_started = None
+
+    def p95(self):
+        return percentile([latency for ok, latency in self.samples if ok], 95)
+
+    def error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    def snapshot(self):
+        with self._lock:
+            p95 = self.p95()
+            p50 = percentile([latency for ok, latency in self.samples if ok], 50)
+            return {
+                "state": self.state,
+                "window": len(self.samples),
+                "error_rate": round(self.error_rate(), 4),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "consecutive_failures": self.consecutive_failures,
+                "total_calls": self.total_calls,
+                "total_failures": self.total_failures,
+            }
+
+
+class HealthTracker:
+    """ProviderHealth for every provider, plus health-aware chain ordering."""
+
+    def __init__(self, config):
+        self.window = config.getint('health', 'window', fallback=50)
+        self.failure_threshold = config.getint('health', 'failure_threshold', fallback=3)
+        self.cooldown = config.getfloat('health', 'cooldown', fallback=30)
+        self.min_samples = config.getint('health', 'min_samples', fallback=5)
+        self.adaptive = config.getboolean('llm', 'adaptive_routing', fallback=False)
+        self._providers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        health = self._providers.get(name)
+        if health is None:
+            with self._lock:
+                health = self._providers.setdefault(name, ProviderHealth(
+                    name, self.window, self.failure_threshold, self.cooldown))
+        return health
+
+    def record(self, name, ok, latency):
+        self.get(name).record(ok, latency)
+
+    def route(self, chain):
+        """Drop providers whose breaker is open; with adaptive routing, fastest p95 first.
+
+        Read-only: a half-open provider stays in the chain and its probe is
+        reserved by allow() only when the call is actually made.
+
+        Providers without min_samples successful calls keep their chain
+        order behind the measured ones, so the configured priority still
+        decides until there is data to beat it.
+        """
+        allowed = [name for name in chain if self.get(name).available()]
+        if not self.adaptive:
+            return allowed
+        measured, unmeasured = [], []
+        for name in allowed:
+            health = self.get(name)
+            ok_samples = sum(1 for ok, _ in health.samples if ok)
+            (measured if ok_samples >= self.min_samples else unmeasured).append(name)
+        measured.sort(key=lambda name: self.get(name).p95())
+        return measured + unmeasured
+
+    def snapshot(self):
+        return {name: health.snapshot() for name, health in list(self._providers.items())}
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+
+from telemetry import telemetry
+
+# Lower runs first: a caller on the phone is waiting in silence, a web visitor sees a typing indicator,
+# and a speculative answer (speculation.py) has nobody waiting on it yet
+CHANNEL_PRIORITY = {'voice': 0, 'voice_async': 0, 'speculative': 2}
+DEFAULT_PRIORITY = 1
+
+# Longest single sleep while queued, so a freed slot is noticed quickly
+POLL_INTERVAL = 0.05
+
+
+def priority_for(channel):
+    return CHANNEL_PRIORITY.get(channel, DEFAULT_PRIORITY)
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """Refills `per_minute` units a minute up to one minute's worth; None means unlimited."""
+
+    def __init__(self, per_minute=None):
+        self.per_minute = per_minute
+        self.level = per_minute or 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (0 if it can be now)."""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        # A request bigger than the whole bucket only needs a full bucket
+        amount = min(amount, self.per_minute)
+        return max(0.0, (amount - self.level) * 60 / self.per_minute)
+
+    def take(self, amount):
+        if self.per_minute:
+            self.level -= min(amount, self.per_minute)
+
+    def learn(self, limit, remaining, now):
+        """Adopt the limit / remaining figures a provider reported."""
+        if limit:
+            self.per_minute = limit
+        if remaining is not None and self.per_minute:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+
+class ProviderQuota:
+    """Request and token buckets for one provider key, with a priority queue in front.
+
+    Callers queue by (priority, arrival); only the head of the queue may
+    take from the buckets, so a voice turn that arrives behind a backlog of
+    web chat still goes first. A 429 empties the buckets until its
+    Retry-After (or the configured cooldown) has passed.
+    """
+
+    def __init__(self, name, rpm=None, tpm=None):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.waiters = []       # heap of (priority, seq)
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def wait_time(self, tokens, now=None):
+        now = time.monotonic() if now is None else now
+        return max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def has_capacity(self, tokens):
+        with self._lock:
+            return not self.waiters and self.wait_time(tokens) == 0
+
+    def enqueue(self, ticket):
+        with self._lock:
+            heapq.heappush(self.waiters, ticket)
+            return len(self.waiters)
+
+    def poll(self, ticket, tokens):
+        """0 if the ticket was granted, else seconds to wait before polling again."""
+        with self._lock:
+            if self.waiters[0] != ticket:
+                return POLL_INTERVAL
+            wait = self.wait_time(tokens)
+            if wait > 0:
+                return wait
+            heapq.heappop(self.waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.granted += 1
+            return 0.0
+
+    def leave(self, ticket):
+        self.withdraw(ticket)
+        with self._lock:
+            self.rejected += 1
+
+    def withdraw(self, ticket):
+        """Drop a ticket whose caller gave up (e.g. a cancelled task) without counting a rejection."""
+        with self._lock:
+            if ticket in self.waiters:
+                self.waiters.remove(ticket)
+                heapq.heapify(self.waiters)
+
+    def learn(self, headers, status_code, cooldown):
+        """Update the buckets from a response's rate-limit headers (OpenAI and OpenRouter styles)."""
+        now = time.monotonic()
+        with self._lock:
+            self.requests.learn(_header_number(headers, 'x-ratelimit-limit-requests', 'x-ratelimit-limit'),
+                                _header_number(headers, 'x-ratelimit-remaining-requests', 'x-ratelimit-remaining'),
+                                now)
+            self.tokens.learn(_header_number(headers, 'x-ratelimit-limit-tokens'),
+                              _header_number(headers, 'x-ratelimit-remaining-tokens'), now)
+            if status_code == 429:
+                retry_after = _header_number(headers, 'retry-after')
+                self._block(retry_after if retry_after is not None else cooldown, now)
+
+    def throttle(self, seconds):
+        with self._lock:
+            self._block(seconds, time.monotonic())
+
+    def _block(self, seconds, now):
+        self.throttled += 1
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        print(f"[WARN] {self.name} rate limited; holding new requests for {seconds:.1f}s.")
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {"rpm": self.requests.per_minute, "tpm": self.tokens.per_minute,
+                    "requests_left": round(self.requests.level, 1) if self.requests.per_minute else None,
+                    "tokens_left": round(self.tokens.level) if self.tokens.per_minute else None,
+                    "blocked_for": round(max(0.0, self.blocked_until - now), 2),
+                    "queued": len(self.waiters), "granted": self.granted,
+                    "rejected": self.rejected, "throttled": self.throttled}
+
+
+class RateLimiter:
+    """Client-side quota for every (provider, API key), shared by all managers in the process.
+
+    Limits come from [rate_limits] <provider>_rpm / <provider>_tpm and are
+    replaced by whatever the provider's rate-limit headers report. A turn
+    that would exceed a quota waits in that key's priority queue for at
+    most queue_timeout seconds (max_queue waiters) and otherwise skips the
+    provider, so the chain moves on before the provider answers 429.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.enabled = config.getboolean('rate_limits', 'enabled', fallback=True)
+        self.queue_timeout = config.getfloat('rate_limits', 'queue_timeout', fallback=1.0)
+        self.max_queue = config.getint('rate_limits', 'max_queue', fallback=20)
+        self.cooldown = config.getfloat('rate_limits', 'cooldown', fallback=10.0)
+        self._quotas = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def quota(self, name, api_key=''):
+        key = (name, hashlib.sha256((api_key or '').encode()).hexdigest()[:8])
+        quota = self._quotas.get(key)
+        if quota is None:
+            with self._lock:
+                quota = self._quotas.get(key)
+                if quota is None:
+                    quota = self._quotas[key] = ProviderQuota(
+                        name, self.config.getfloat('rate_limits', f'{name}_rpm', fallback=0) or None,
+                        self.config.getfloat('rate_limits', f'{name}_tpm', fallback=0) or None)
+        return quota
+
+    def route(self, chain, keys, tokens):
+        """Chain with providers that have spare capacity first, otherwise in the given order."""
+        if not self.enabled:
+            return chain
+        return sorted(chain, key=lambda name: not self.quota(name, keys.get(name)).has_capacity(tokens))
+
+    def _enter(self, quota, channel):
+        ticket = (priority_for(channel), next(self._seq))
+        depth = quota.enqueue(ticket)
+        telemetry.gauge('sylvan_ratelimit_queue_depth', depth, provider=quota.name)
+        if depth > self.max_queue:
+            self._reject(quota, ticket, 'queue_full')
+            return None
+        return ticket
+
+    def _reject(self, quota, ticket, reason):
+        quota.leave(ticket)
+        telemetry.count('sylvan_ratelimit_rejections_total', provider=quota.name, reason=reason)
+        telemetry.gauge('sylvan_ratelimit_queue_depth', len(quota.waiters), provider=quota.name)
+
+    def _granted(self, quota, channel, waited):
+        telemetry.observe('sylvan_ratelimit_wait_seconds', waited, provider=quota.name, channel=channel or '')
+        telemetry.gauge('sylvan_ratelimit_queue_depth', len(quota.waiters), provider=quota.name)
+        return True
+
+    def acquire(self, name, api_key, tokens, channel=None):
+        """Block until the key has room for one request of `tokens`; False if it will not in time."""
+        if not self.enabled:
+            return True
+        quota = self.quota(name, api_key)
+        ticket = self._enter(quota, channel)
+        if ticket is None:
+            return False
+        start = time.monotonic()
+        while True:
+            wait = quota.poll(ticket, tokens)
+            waited = time.monotonic() - start
+            if wait == 0:
+                return self._granted(quota, channel, waited)
+            if waited + wait > self.queue_timeout:
+                self._reject(quota, ticket, 'timeout')
+                return False
+            time.sleep(min(wait, POLL_INTERVAL))
+
+    async def acquire_async(self, name, api_key, tokens, channel=None):
+        """acquire() for the event loop."""
+        if not self.enabled:
+            return True
+        quota = self.quota(name, api_key)
+        ticket = self._enter(quota, channel)
+        if ticket is None:
+            return False
+        start = time.monotonic()
+        try:
+            while True:
+                wait = quota.poll(ticket, tokens)
+                waited = time.monotonic() - start
+                if wait == 0:
+                    return self._granted(quota, channel, waited)
+                if waited + wait > self.queue_timeout:
+                    self._reject(quota, ticket, 'timeout')
+                    return False
+                await asyncio.sleep(min(wait, POLL_INTERVAL))
+        except asyncio.CancelledError:
+            quota.withdraw(ticket)
+            telemetry.gauge('sylvan_ratelimit_queue_depth', len(quota.waiters), provider=quota.name)
+            raise
+
+    def learn(self, name, api_key, headers, status_code):
+        if self.enabled:
+            self.quota(name, api_key).learn(headers, status_code, self.cooldown)
+
+    def throttle(self, name, api_key, seconds=None):
+        if self.enabled:
+            self.quota(name, api_key).throttle(self.cooldown if seconds is None else seconds)
+
+    def stats(self):
+        if not self.enabled:
+            return {"enabled": False}
+        return {f"{name}:{key}": quota.snapshot() for (name, key), quota in list(self._quotas.items())}
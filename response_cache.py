@@ -0,0 +1,213 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Words that carry no intent and only stop near-duplicate questions from matching
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'am', 'do', 'does', 'did', 'it', 'its', 'you', 'your',
+    'yours', 'we', 'our', 'i', 'me', 'my', 'what', 'whats', 'can', 'could', 'would', 'please',
+    'to', 'for', 'of', 'on', 'in', 'at', 'and', 'or', 'so', 'just', 'there', 'this', 'that',
+    'be', 'about', 'tell', 'know', 'like', 'hey', 'um', 'uh',
+}
+
+# Anything that looks like personal contact data is never cached
+PERSONAL_DATA = re.compile(r'\d{3,}|@')
+
+
+def build_synonyms(kb):
+    """Map every knowledge-base keyword to a shared concept token per entry.
+
+    "how much does it cost" and "what are your prices" both normalize to
+    the pricing entry's concept, so they can share a cached answer.
+    """
+    synonyms = {}
+    for idx, entry in enumerate(kb.get('questions', [])):
+        for keyword in entry.get('keywords', []):
+            synonyms.setdefault(keyword.lower(), f"kb{idx}")
+    return synonyms
+
+
+class MessageNormalizer:
+    """Canonical form of a user message: KB keywords folded to concepts, stopwords and plurals dropped."""
+
+    def __init__(self, synonyms=None):
+        synonyms = synonyms or {}
+        phrases = sorted(synonyms, key=len, reverse=True)
+        self.synonyms = dict(synonyms)
+        self._phrase_re = re.compile(r'\b(' + '|'.join(map(re.escape, phrases)) + r')s?\b') if phrases else None
+
+    def normalize(self, message):
+        text = re.sub(r"[^a-z0-9@\s]", " ", message.lower().replace("'", ""))
+        if self._phrase_re:
+            text = self._phrase_re.sub(lambda m: " " + self.synonyms[m.group(1)] + " ", text)
+        tokens = [t[:-1] if len(t) > 3 and t.endswith('s') else t
+                  for t in text.split() if t not in STOPWORDS]
+        return " ".join(sorted(set(tokens)))
+
+    def tokens(self, message):
+        return set(self.normalize(message).split())
+
+
+def similarity(tokens, other):
+    """Jaccard overlap of two normalized token sets."""
+    return len(tokens & other) / len(tokens | other) if tokens or other else 0.0
+
+
+class ResponseCache:
+    """LRU + TTL cache of raw provider answers in front of LLMManager.
+
+    Entries are keyed by the normalized user message plus a fingerprint of
+    the last assistant turn, so the same question in a different spot of
+    the conversation is a different entry. Lookups try the exact key first
+    and then a token-set (Jaccard) match within the same fingerprint.
+
+    Only provider answers are stored; callers still run validate_response
+    on whatever comes back. Content reloads call invalidate() (see the
+    ContentStore subscribers in app.py), for one tenant's namespace or all.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=2_000_000, ttl=3600,
+                 fuzzy_threshold=0.75, synonyms=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = OrderedDict()   # key -> (answer, tokens, expires_at, size)
+        self._token_index = {}          # (fingerprint, token) -> set(keys)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.set_synonyms(synonyms or {})
+        self.counters = {"hits_exact": 0, "hits_fuzzy": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "expired": 0, "invalidations": 0}
+
+    @classmethod
+    def from_config(cls, config, kb):
+        return cls(max_entries=config.getint('cache', 'max_entries', fallback=1000),
+                   max_bytes=config.getint('cache', 'max_bytes', fallback=2_000_000),
+                   ttl=config.getfloat('cache', 'ttl', fallback=3600),
+                   fuzzy_threshold=config.getfloat('cache', 'fuzzy_threshold', fallback=0.75),
+                   synonyms=build_synonyms(kb))
+
+    def set_synonyms(self, synonyms):
+        self._normalizer = MessageNormalizer(synonyms)
+
+    # ----------------------------
+    # Keys
+    # ----------------------------
+
+    def normalize(self, message):
+        return self._normalizer.normalize(message)
+
+    def fingerprint(self, history, namespace=''):
+        """Hash of the last assistant turn, which is what shapes the next answer."""
+        prefix = f"{namespace}:" if namespace else ""
+        for msg in reversed(history or []):
+            if msg['role'] == 'assistant':
+                return prefix + hashlib.sha1(msg['content'].strip().lower().encode()).hexdigest()[:16]
+        return prefix + "start"
+
+    def cacheable(self, message):
+        return bool(message.strip()) and not PERSONAL_DATA.search(message)
+
+    # ----------------------------
+    # Lookup / store
+    # ----------------------------
+
+    def get(self, message, history, namespace=''):
+        """Cached answer or None; namespace keeps tenants' answers apart (see tenants.py)."""
+        if not self.cacheable(message):
+            return None
+        fingerprint = self.fingerprint(history, namespace)
+        normalized = self.normalize(message)
+        key = (fingerprint, normalized)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.counters["hits_exact"] += 1
+                return entry[0]
+            if entry:
+                self._remove(key)
+                self.counters["expired"] += 1
+
+            match = self._fuzzy_match(fingerprint, set(normalized.split()), now)
+            if match:
+                self._entries.move_to_end(match)
+                self.counters["hits_fuzzy"] += 1
+                return self._entries[match][0]
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, message, history, answer, namespace=''):
+        if not answer or not self.cacheable(message):
+            return
+        fingerprint = self.fingerprint(history, namespace)
+        normalized = self.normalize(message)
+        key = (fingerprint, normalized)
+        tokens = frozenset(normalized.split())
+        size = len(answer.encode()) + len(normalized) + 64
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, tokens, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            for token in tokens:
+                self._token_index.setdefault((fingerprint, token), set()).add(key)
+            self.counters["stores"] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+
+    def invalidate(self, namespace=None):
+        """Drop every entry, or those of one namespace and the ones under it ('a' covers 'a:voice')."""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                self._token_index.clear()
+                self._bytes = 0
+            else:
+                prefix = f"{namespace}:"
+                for key in [key for key in self._entries if key[0].startswith(prefix)]:
+                    self._remove(key)
+            self.counters["invalidations"] += 1
+
+    def stats(self):
+        hits = self.counters["hits_exact"] + self.counters["hits_fuzzy"]
+        lookups = hits + self.counters["misses"]
+        return dict(self.counters,
+                    entries=len(self._entries),
+                    bytes=self._bytes,
+                    hit_rate=round(hits / lookups, 4) if lookups else 0.0)
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+
+    def _fuzzy_match(self, fingerprint, tokens, now):
+        if not tokens or self.fuzzy_threshold >= 1:
+            return None
+        candidates = set()
+        for token in tokens:
+            candidates |= self._token_index.get((fingerprint, token), set())
+        best, best_score = None, self.fuzzy_threshold
+        for key in candidates:
+            _, other, expires_at, _ = self._entries[key]
+            if expires_at <= now:
+                continue
+            score = similarity(tokens, other)
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+
+    def _remove(self, key):
+        answer, tokens, _, size = self._entries.pop(key)
+        self._bytes -= size
+        for token in tokens:
+            keys = self._token_index.get((key[0], token))
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._token_index[(key[0], token)]
@@ -0,0 +1,120 @@
+import math
+import re
+
+from history_window import estimate_tokens
+from kb_index import tokenize
+from response_cache import STOPWORDS
+
+# Keywords are what the KB author chose to describe an entry; weigh them above the answer's wording
+KEYWORD_WEIGHT = 2
+
+
+def content_tokens(text):
+    return [t for t in tokenize(text) if t not in STOPWORDS]
+
+
+def build_chunks(knowledge_base, website_text=''):
+    """Retrievable chunks: one per KB question and objection, one per website section.
+
+    Each chunk is {"id", "text", "keywords"}; "text" is what goes into the
+    prompt, in the same Q / A shape the full FAQ used.
+    """
+    chunks = []
+    for q in knowledge_base.get('questions', []):
+        keywords = q.get('keywords', [])
+        chunks.append({"id": f"kb:{keywords[0] if keywords else len(chunks)}",
+                       "text": f"Q: {', '.join(keywords)}\nA: {q.get('answer', '')}",
+                       "keywords": " ".join(keywords)})
+    for name, answer in (knowledge_base.get('objections') or {}).items():
+        chunks.append({"id": f"objection:{name}",
+                       "text": f"If the parent says {name.replace('_', ' ')}: {answer}",
+                       "keywords": name.replace('_', ' ')})
+    for i, block in enumerate(re.split(r'\n\s*\n', website_text or '')):
+        block = block.strip()
+        # Skip the page title and other fragments too short to answer anything
+        if len(content_tokens(block)) < 6:
+            continue
+        heading = re.match(r'\*\*(.+?):?\*\*', block)
+        title = heading.group(1).lower() if heading else str(i)
+        chunks.append({"id": f"web:{title}", "text": block, "keywords": heading.group(1) if heading else ""})
+    return chunks
+
+
+class Retriever:
+    """BM25 over KB and website chunks; picks the few that matter for a turn.
+
+    The system prompt keeps only the static persona and business profile,
+    so its size (and the provider's prompt cache) no longer depends on the
+    knowledge base. Each turn gets the top_k chunks for the message plus
+    the caller's last history_turns messages, capped at max_tokens, as one
+    system note after the static prefix. Search cost follows the query's
+    postings, not the number of chunks.
+    """
+
+    def __init__(self, chunks, top_k=4, max_tokens=400, history_turns=1, k1=1.2, b=0.75):
+        self.chunks = chunks
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.history_turns = history_turns
+        self.k1 = k1
+        self.b = b
+        self._postings = {}     # token -> {chunk idx: weighted term frequency}
+        self._doc_len = []
+        for idx, chunk in enumerate(chunks):
+            counts = {}
+            for token in content_tokens(chunk["text"]):
+                counts[token] = counts.get(token, 0) + 1
+            for token in content_tokens(chunk["keywords"]):
+                counts[token] = counts.get(token, 0) + KEYWORD_WEIGHT
+            self._doc_len.append(sum(counts.values()) or 1)
+            for token, tf in counts.items():
+                self._postings.setdefault(token, {})[idx] = tf
+        n = len(chunks) or 1
+        self._avg_len = sum(self._doc_len) / n if self._doc_len else 1
+        self._idf = {token: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+                     for token, ids in self._postings.items()}
+
+    @classmethod
+    def from_config(cls, config, knowledge_base, website_text=''):
+        return cls(build_chunks(knowledge_base, website_text),
+                   top_k=config.getint('retrieval', 'top_k', fallback=4),
+                   max_tokens=config.getint('retrieval', 'max_tokens', fallback=400),
+                   history_turns=config.getint('retrieval', 'history_turns', fallback=1))
+
+    def search(self, query, top_k=None):
+        """[(score, chunk index)] best first."""
+        scores = {}
+        for token in set(content_tokens(query)):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            for idx, tf in self._postings[token].items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_len[idx] / self._avg_len)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(((score, idx) for idx, score in scores.items()), key=lambda pair: (-pair[0], pair[1]))
+        return ranked[:top_k or self.top_k]
+
+    def query_for(self, message, history):
+        recent = [m["content"] for m in history if m["role"] == "user"][-self.history_turns:] \
+            if self.history_turns else []
+        return " ".join(recent + [message])
+
+    def select(self, message, history=()):
+        """Chunks for this turn, best first, within max_tokens."""
+        selected, used = [], 0
+        for _, idx in self.search(self.query_for(message, history)):
+            chunk = self.chunks[idx]
+            cost = estimate_tokens(chunk["text"])
+            if used + cost > self.max_tokens:
+                continue
+            selected.append(chunk)
+            used += cost
+        return selected
+
+    def context_note(self, message, history=()):
+        """System note with the relevant facts, or None when nothing matches."""
+        chunks = self.select(message, history)
+        if not chunks:
+            return None
+        return {"role": "system",
+                "content": "Relevant information:\n" + "\n".join(f"- {c['text']}" for c in chunks)}
@@ -0,0 +1,205 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ConversationSession:
+    def __init__(self, session_id=None):
+        self.id = session_id
+        self.history = []
+        self.last_active = time.time()
+        self.context = {}
+
+    def add_message(self, role, content):
+        self.history.append({"role": role, "content": content})
+        self.last_active = time.time()
+        # Windowing (token budget, summary of older turns) is HistoryWindow.fold()
+
+    def get_history_string(self):
+        history_str = ""
+        for msg in self.history:
+            role_name = "User" if msg["role"] == "user" else "Receptionist"
+            history_str += f"{role_name}: {msg['content']}\n"
+        return history_str
+
+    def to_json(self):
+        """Compact form for shared stores: roles shortened to one letter, no whitespace."""
+        return json.dumps({
+            "h": [[msg["role"][0], msg["content"]] for msg in self.history],
+            "t": self.last_active,
+            "c": self.context,
+        }, separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, session_id, data):
+        raw = json.loads(data)
+        session = cls(session_id)
+        session.history = [{"role": "user" if role == "u" else "assistant", "content": content}
+                           for role, content in raw.get("h", [])]
+        session.last_active = raw.get("t", session.last_active)
+        session.context = raw.get("c", {})
+        return session
+
+
+class MemorySessionStore:
+    """Process-local sessions with a TTL and an LRU cap.
+
+    Sessions are kept in the order they were last saved (which is when
+    last_active moves), so the least recently active one is always at the
+    head: expiry pops from the head until it finds a live session, and the
+    max_sessions cap evicts from the same end. Both are O(1) per session
+    removed instead of a scan of every session on every request.
+    """
+
+    def __init__(self, ttl=1800, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_active > self.ttl:
+                return None
+            return session
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self, now):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def stats(self):
+        return {"backend": "memory", "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions, "evicted": self.evicted, "expired": self.expired}
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id):
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Sessions shared between worker processes through a WAL-mode SQLite file.
+
+    Survives restarts and lets several gunicorn workers continue the same
+    conversation. Expired rows and rows over max_sessions (oldest first)
+    are swept at most once every sweep_interval seconds via the
+    last_active index.
+    """
+
+    def __init__(self, path='sessions.db', ttl=1800, max_sessions=10000, sweep_interval=30):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._next_sweep = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                     "id TEXT PRIMARY KEY, data TEXT NOT NULL, last_active REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        self._maybe_sweep()
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE id = ? AND last_active > ?",
+            (session_id, time.time() - self.ttl)).fetchone()
+        return ConversationSession.from_json(session_id, row[0]) if row else None
+
+    def save(self, session):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO sessions (id, data, last_active) VALUES (?, ?, ?)",
+                     (session.id, session.to_json(), session.last_active))
+        conn.commit()
+
+    def delete(self, session_id):
+        conn = self._conn()
+        deleted = conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+        conn.commit()
+        return deleted > 0
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE last_active <= ?", (now - self.ttl,))
+        conn.execute("DELETE FROM sessions WHERE id IN (SELECT id FROM sessions "
+                     "ORDER BY last_active DESC LIMIT -1 OFFSET ?)", (self.max_sessions,))
+        conn.commit()
+
+    def stats(self):
+        count = self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "sessions": count, "max_sessions": self.max_sessions}
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions")
+        conn.commit()
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id):
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __len__(self):
+        return self.stats()["sessions"]
+
+
+def create_session_store(config):
+    """Session store from the [sessions] section (backend = memory | sqlite)."""
+    backend = config.get('sessions', 'backend', fallback='memory').lower()
+    ttl = config.getfloat('sessions', 'ttl', fallback=30 * 60)
+    max_sessions = config.getint('sessions', 'max_sessions', fallback=10000)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(config.get('sessions', 'path', fallback='sessions.db'),
+                                  ttl=ttl, max_sessions=max_sessions)
+    return MemorySessionStore(ttl=ttl, max_sessions=max_sessions)
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from rate_limits import TokenBucket
+from response_cache import similarity
+from telemetry import telemetry
+
+# Likely next user messages, by keyword_rules category of the bot turn they follow
+# (conversation_config.json "predictions" replaces these). Short yes / maybe replies
+# are scripted already, so only the model-bound follow-ups are worth predicting.
+DEFAULT_PREDICTIONS = {
+    'scheduling_offer': ["do you have times on weekday afternoons", "do you have times on weekends",
+                         "how much does it cost"],
+    'pricing_offer': ["how much does it cost", "what does the assessment include"],
+}
+
+
+class Speculator:
+    """Answers the likely next message of a conversation before it arrives.
+
+    After an assistant turn, speculate() starts a provider call for each of
+    up to top_n predicted messages and parks the futures in the session's
+    slot, tagged with the turn they follow. lookup() serves the next message
+    from the slot when its normalized tokens overlap a prediction by at
+    least match_threshold (Jaccard). A call still running is joined rather
+    than repeated: it is the provider call the turn would otherwise start,
+    only started earlier, and the provider timeouts and [llm] deadline bound
+    it the same way. A slot is used once and lapses after ttl seconds or when
+    the conversation moves on.
+
+    Speculative calls are capped by max_concurrent calls in flight and by
+    tokens_per_minute of estimated prompt tokens; a prediction over either
+    budget is dropped, never queued.
+    """
+
+    def __init__(self, top_n=2, ttl=120, max_concurrent=4, tokens_per_minute=30000, match_threshold=0.5,
+                 max_sessions=2000):
+        self.top_n = top_n
+        self.ttl = ttl
+        self.max_concurrent = max_concurrent
+        self.match_threshold = match_threshold
+        self.max_sessions = max_sessions
+        self.budget = TokenBucket(tokens_per_minute or None)
+        self._slots = OrderedDict()     # session id -> (turn key, expires_at, [(tokens, message, future)])
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='speculate')
+        self._in_flight = 0
+        self.counters = {"started": 0, "dropped_concurrency": 0, "dropped_budget": 0,
+                         "lookups": 0, "hits": 0, "joined": 0, "misses": 0, "failed": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """Speculator for [speculation], or None unless enabled (it spends provider calls)."""
+        if not config.getboolean('speculation', 'enabled', fallback=False):
+            return None
+        return cls(top_n=config.getint('speculation', 'top_n', fallback=2),
+                   ttl=config.getfloat('speculation', 'ttl', fallback=120),
+                   max_concurrent=config.getint('speculation', 'max_concurrent', fallback=4),
+                   tokens_per_minute=config.getint('speculation', 'tokens_per_minute', fallback=30000),
+                   match_threshold=config.getfloat('speculation', 'match_threshold', fallback=0.5),
+                   max_sessions=config.getint('speculation', 'max_sessions', fallback=2000))
+
+    def _count(self, name):
+        """Bump a counter; call with the lock held."""
+        self.counters[name] += 1
+        telemetry.count('sylvan_speculation_total', result=name)
+
+    def speculate(self, session_id, turn_key, candidates, generate):
+        """Start generate(message, history) for the first top_n (message, tokens, history, cost) candidates."""
+        entries = []
+        for message, tokens, history, cost in candidates[:self.top_n]:
+            with self._lock:
+                if self._in_flight >= self.max_concurrent:
+                    self._count('dropped_concurrency')
+                    continue
+                if self.budget.wait_time(cost, time.monotonic()) > 0:
+                    self._count('dropped_budget')
+                    continue
+                self.budget.take(cost)
+                self._in_flight += 1
+                self._count('started')
+            # copy_context carries the caller's tenant into the worker
+            future = self._executor.submit(copy_context().run, self._run, generate, message, history)
+            entries.append((tokens, message, future))
+        with self._lock:
+            # Whatever was parked for the previous turn can no longer match
+            self._slots.pop(session_id, None)
+            if entries:
+                self._slots[session_id] = (turn_key, time.monotonic() + self.ttl, entries)
+                while len(self._slots) > self.max_sessions:
+                    self._slots.popitem(last=False)
+
+    def _run(self, generate, message, history):
+        try:
+            return generate(message, history)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def lookup(self, session_id, turn_key, tokens):
+        """Speculative answer for a message (as normalized tokens) following turn_key, or None.
+
+        Blocks until a matching call still in flight finishes; None means the
+        caller has to ask a provider itself.
+        """
+        with self._lock:
+            slot = self._slots.pop(session_id, None)
+            if slot is None or slot[0] != turn_key or slot[1] <= time.monotonic():
+                return None
+            self._count('lookups')
+            best, best_score = None, self.match_threshold
+            for predicted, _, future in slot[2]:
+                score = similarity(tokens, predicted)
+                if score >= best_score:
+                    best, best_score = future, score
+            if best is None:
+                self._count('misses')
+                return None
+        if not best.done():
+            with self._lock:
+                self._count('joined')
+        try:
+            answer = best.result()
+            result = 'hits' if answer is not None else 'failed'
+        except Exception as e:
+            print(f"[WARN] Speculative answer failed: {type(e).__name__}: {e}")
+            answer, result = None, 'failed'
+        with self._lock:
+            self._count(result)
+        return answer
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["lookups"]
+            return dict(self.counters, slots=len(self._slots), in_flight=self._in_flight,
+                        hit_rate=round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                        budget_tokens_per_minute=self.budget.per_minute)
@@ -0,0 +1,172 @@
+import configparser
+import contextvars
+import json
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Spans of the turn being served; a contextvar so it follows threads started
+# with copy_context() and asyncio tasks alike
+_current_trace = contextvars.ContextVar('sylvan_trace', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Telemetry:
+    """Per-turn spans, latency histograms and counters, exported Prometheus-style.
+
+    turn() opens a trace for one user turn; span() times a stage inside it
+    (session fetch, each provider attempt, KB fallback, validation, TwiML).
+    Every span feeds the sylvan_span_seconds histogram. A sample of turns
+    ([telemetry] sample_rate), plus every turn slower than slow_turn_ms, is
+    written to [telemetry] trace_path as one JSON line per turn.
+    """
+
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._histograms = {}   # name -> {label key: Histogram}
+        self._counters = {}     # name -> {label key: value}
+        self._gauges = {}       # name -> {label key: value}
+        self.configure(config)
+
+    def configure(self, config):
+        if config is None:
+            config = configparser.ConfigParser()
+        self.sample_rate = config.getfloat('telemetry', 'sample_rate', fallback=0.01)
+        self.slow_turn = config.getfloat('telemetry', 'slow_turn_ms', fallback=3000) / 1000
+        self.trace_path = config.get('telemetry', 'trace_path', fallback='traces.jsonl')
+
+    def count(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        """Set a value that goes up and down (e.g. a queue depth)."""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def current_channel(self):
+        """Channel of the turn being served ('web', 'voice', ...), or None outside a turn."""
+        trace = _current_trace.get()
+        return trace['channel'] if trace is not None else None
+
+    def observe(self, name, seconds, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def record_span(self, name, seconds, **labels):
+        """Account for a stage that was timed elsewhere (e.g. time to a stream's first token)."""
+        self.observe('sylvan_span_seconds', seconds, span=name, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            offset = time.monotonic() - seconds - trace['_start']
+            trace['spans'].append(dict(labels, span=name, start_ms=round(offset * 1000, 1),
+                                       ms=round(seconds * 1000, 1)))
+
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_span(name, time.monotonic() - start, **labels)
+
+    @contextmanager
+    def turn(self, channel):
+        previous = _current_trace.get()
+        trace = {'trace_id': uuid.uuid4().hex, 'channel': channel, 'ts': time.time(),
+                 '_start': time.monotonic(), 'spans': []}
+        _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.set(previous)
+            elapsed = time.monotonic() - trace.pop('_start')
+            self.observe('sylvan_turn_seconds', elapsed, channel=channel)
+            self.count('sylvan_turns_total', channel=channel)
+            if elapsed >= self.slow_turn or random.random() < self.sample_rate:
+                trace['ms'] = round(elapsed * 1000, 1)
+                self._write_trace(trace)
+
+    def _write_trace(self, trace):
+        if not self.trace_path:
+            return
+        try:
+            line = json.dumps(trace, separators=(',', ':'), default=str)
+            with self._write_lock, open(self.trace_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except Exception as e:
+            print(f"[WARN] Could not write trace: {e}")
+
+    def render(self, token_stats=None):
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f'# TYPE {name} gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(key, [("le", str(bound))])} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+        if token_stats:
+            lines.append('# TYPE sylvan_tokens_total counter')
+            for provider, totals in sorted(token_stats.items()):
+                for kind in ('prompt', 'cached', 'completion'):
+                    key = _label_key({'provider': provider, 'kind': kind})
+                    lines.append(f'sylvan_tokens_total{_format_labels(key)} {totals[kind + "_tokens"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide instance, configured from config.ini by app.py
+telemetry = Telemetry()
@@ -0,0 +1,182 @@
+import configparser
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from content_bundle import ContentStore
+from llm_manager import SingleFlight
+
+# genai.configure() is process-global, so these can't differ between tenants
+GLOBAL_GEMINI_KEYS = ('api_key', 'api_endpoint', 'transport')
+
+
+def normalize_number(number):
+    """Digits only, without a leading US country code: '+1 (636) 552-4351' -> '6365524351'."""
+    digits = re.sub(r'\D', '', number or '')
+    if len(digits) == 11 and digits.startswith('1'):
+        digits = digits[1:]
+    return digits
+
+
+def normalize_host(host):
+    return (host or '').split(':', 1)[0].strip().lower()
+
+
+class Tenant:
+    """One location: its layered config, content store and LLM manager."""
+
+    def __init__(self, tenant_id, config, content, llm_manager):
+        self.id = tenant_id
+        self.config = config
+        self.content = content
+        self.llm_manager = llm_manager
+        self.loaded_at = time.time()
+
+
+class TenantRegistry:
+    """Resolves a request to a tenant and keeps the busiest tenants compiled.
+
+    Each tenant is a directory under [tenants] directory holding a
+    tenant.ini and any content files it overrides; files it does not have
+    come from the base directory. tenant.ini's [tenant] section lists the
+    Twilio numbers and host names that select it (comma separated), and
+    any other section overrides the base config.ini, e.g. [llm] provider.
+    The Gemini client is configured once per process, so [gemini] api_key,
+    api_endpoint and transport always come from config.ini; a tenant.ini
+    that sets them is ignored for those keys with a warning.
+
+    Only the directory scan happens up front. A tenant's bundle (prompt,
+    KB index, keyword rules, intent router) and LLM manager are built on
+    its first request and kept in an LRU of at most [tenants] max_loaded;
+    every manager shares the default tenant's connection pools, worker
+    threads and provider health, so memory stays flat as locations are
+    added. The default tenant (the base directory) is never evicted and
+    answers anything that matches no tenant.
+
+    on_content(tenant_id, bundle) runs when a tenant is loaded and after
+    each reload of its content, e.g. to drop the tenant's cached answers.
+    """
+
+    def __init__(self, config, default, manager_factory, base_dir='.', on_content=None):
+        self.config = config
+        self.default = default
+        self.manager_factory = manager_factory
+        self.on_content = on_content
+        self.base_dir = base_dir
+        self.directory = os.path.join(base_dir, config.get('tenants', 'directory', fallback='tenants'))
+        self.max_loaded = config.getint('tenants', 'max_loaded', fallback=32)
+        self.by_number = {}
+        self.by_host = {}
+        self.loaded = OrderedDict()     # tenant id -> Tenant, least recently used first
+        self.loads = 0
+        self.evictions = 0
+        self.last_load_ms = 0.0
+        self._lock = threading.Lock()
+        self._loading = SingleFlight()  # one build per cold tenant; requests for it wait on that build
+        self._thread = None
+        self.scan()
+
+    def scan(self):
+        """Re-read every tenant.ini's numbers and hosts."""
+        by_number, by_host = {}, {}
+        for tenant_id in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+            path = os.path.join(self.directory, tenant_id, 'tenant.ini')
+            if not os.path.isfile(path):
+                continue
+            ini = configparser.ConfigParser()
+            ini.read(path)
+            for number in ini.get('tenant', 'numbers', fallback='').split(','):
+                if normalize_number(number):
+                    by_number[normalize_number(number)] = tenant_id
+            for host in ini.get('tenant', 'hosts', fallback='').split(','):
+                if normalize_host(host):
+                    by_host[normalize_host(host)] = tenant_id
+        self.by_number, self.by_host = by_number, by_host
+
+    def resolve(self, to_number=None, host=None):
+        """Tenant for a Twilio `To` number or an HTTP Host header; the default tenant otherwise."""
+        tenant_id = self.by_number.get(normalize_number(to_number)) or self.by_host.get(normalize_host(host))
+        return self.get(tenant_id) if tenant_id else self.default
+
+    def get(self, tenant_id):
+        """Loaded tenant, building it first if it is cold.
+
+        The build (file reads, indexes, LLM manager) runs outside the
+        registry lock, so it stalls only the requests for that tenant.
+        """
+        with self._lock:
+            tenant = self.loaded.get(tenant_id)
+            if tenant is not None:
+                self.loaded.move_to_end(tenant_id)
+                return tenant
+        tenant, _ = self._loading.do(tenant_id, self._load_and_insert, tenant_id)
+        return tenant
+
+    def _load_and_insert(self, tenant_id):
+        with self._lock:
+            # Loaded by a build that finished after this caller's first look
+            tenant = self.loaded.get(tenant_id)
+        if tenant is None:
+            tenant = self._load(tenant_id)
+        with self._lock:
+            self.loaded[tenant_id] = tenant
+            self.loaded.move_to_end(tenant_id)
+            if len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+                self.evictions += 1
+        return tenant
+
+    def _load(self, tenant_id):
+        start = time.perf_counter()
+        tenant_dir = os.path.join(self.directory, tenant_id)
+        config = configparser.ConfigParser()
+        config.read_dict(self.config)
+        config.read(os.path.join(tenant_dir, 'tenant.ini'))
+        for key in GLOBAL_GEMINI_KEYS:
+            if config.get('gemini', key, fallback=None) != self.config.get('gemini', key, fallback=None):
+                print(f"[WARN] Tenant '{tenant_id}' sets [gemini] {key}; Gemini credentials are "
+                      f"process-wide, so config.ini's value is kept.")
+                if self.config.has_option('gemini', key):
+                    config.set('gemini', key, self.config.get('gemini', key))
+                else:
+                    config.remove_option('gemini', key)
+        content = ContentStore(config, tenant_dir, fallback_dir=self.base_dir)
+        llm_manager = self.manager_factory(config, content.current.system_prompt)
+        content.subscribe(lambda bundle: llm_manager.set_system_prompt(bundle.system_prompt))
+        if self.on_content is not None:
+            content.subscribe(lambda bundle: self.on_content(tenant_id, bundle))
+            # Its files may have changed while it was evicted
+            self.on_content(tenant_id, content.current)
+        load_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.loads += 1
+            self.last_load_ms = load_ms
+        print(f"[DEBUG] Tenant '{tenant_id}' loaded in {load_ms:.1f} ms")
+        return Tenant(tenant_id, config, content, llm_manager)
+
+    def start_watching(self, interval):
+        """One thread re-scans tenant.ini files and hot-reloads the loaded tenants' content."""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, args=(interval,), name='tenant-reload', daemon=True)
+        self._thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.scan()
+                with self._lock:
+                    tenants = list(self.loaded.values())
+                for tenant in tenants:
+                    tenant.content.reload()
+            except Exception as e:
+                print(f"[WARN] Tenant watcher error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {"known": len(set(self.by_number.values()) | set(self.by_host.values())),
+                    "loaded": list(self.loaded), "max_loaded": self.max_loaded, "loads": self.loads,
+                    "evictions": self.evictions, "last_load_ms": round(self.last_load_ms, 2)}
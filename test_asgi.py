@@ -0,0 +1,73 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+import asgi
+from app import conversations
+
+
+async def slow_answer(user_message, history, channel=None):
+    await asyncio.sleep(0.2)
+    return "We'd love to help with that."
+
+
+class TestAsgiApp(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        conversations.clear()
+        self.client = asgi.app.test_client()
+
+    async def test_chat_keeps_response_format(self):
+        with patch.object(asgi.llm_manager, 'get_response', side_effect=slow_answer):
+            response = await self.client.post('/api/chat', json={'message': 'Do you tutor math?'})
+            data = await response.get_json()
+        self.assertEqual(data['response'], "We'd love to help with that.")
+        self.assertIn(data['session_id'], conversations)
+
+    async def test_concurrent_chats_do_not_queue(self):
+        with patch.object(asgi.llm_manager, 'get_response', side_effect=slow_answer):
+            start = time.monotonic()
+            responses = await asyncio.gather(*[
+                self.client.post('/api/chat', json={'message': f'question {i}'}) for i in range(200)
+            ])
+            elapsed = time.monotonic() - start
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertLess(elapsed, 5)
+        self.assertEqual(len(conversations), 200)
+
+    async def test_voice_handle_input_returns_twiml(self):
+        with patch.object(asgi.llm_manager, 'get_response', side_effect=slow_answer):
+            response = await self.client.post('/voice/handle-input', form={'SpeechResult': 'Do you tutor math?'})
+            body = await response.get_data(as_text=True)
+        self.assertIn("<Say voice=\"alice\">We'd love to help with that.</Say>", body)
+
+    async def test_async_voice_answer_is_served_on_poll(self):
+        with patch.object(asgi.core, 'VOICE_ASYNC', True), patch.object(asgi.core, 'VOICE_POLL_WAIT', 1), \
+             patch.object(asgi.llm_manager, 'get_response', side_effect=slow_answer):
+            start = time.monotonic()
+            filler = await self.client.post('/voice/handle-input',
+                                            form={'CallSid': 'CA789', 'SpeechResult': 'Do you tutor math?'})
+            self.assertLess(time.monotonic() - start, 0.2)
+            self.assertIn('/voice/answer', await filler.get_data(as_text=True))
+            answer = await self.client.post('/voice/answer', form={'CallSid': 'CA789'})
+            body = await answer.get_data(as_text=True)
+        self.assertIn("We'd love to help with that.", body)
+        self.assertNotIn('CA789', asgi.pending_answers)
+
+    async def test_second_utterance_cancels_the_pending_answer(self):
+        with patch.object(asgi.core, 'VOICE_ASYNC', True), patch.object(asgi.core, 'VOICE_POLL_WAIT', 1), \
+             patch.object(asgi.llm_manager, 'get_response', side_effect=slow_answer):
+            await self.client.post('/voice/handle-input',
+                                   form={'CallSid': 'CA790', 'SpeechResult': 'Is there a chess club on Fridays?'})
+            first = asgi.pending_answers['CA790'][0]
+            await self.client.post('/voice/handle-input',
+                                   form={'CallSid': 'CA790', 'SpeechResult': 'Can siblings share one session?'})
+            await asyncio.wait([first], timeout=1)
+            self.assertTrue(first.cancelled())
+            await self.client.post('/voice/answer', form={'CallSid': 'CA790'})
+        user_turns = [m['content'] for m in conversations['CA790'].history if m['role'] == 'user']
+        self.assertEqual(user_turns, ['can siblings share one session?'])
+
+
+if __name__ == '__main__':
+    unittest.main()
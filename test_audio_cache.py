@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from audio_cache import AudioCache, SilenceEngine
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestAudioCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = AudioCache(self.dir, SilenceEngine(), frequent_after=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_clips_are_content_addressed(self):
+        name = self.cache.render("Welcome to Sylvan Learning.")
+        self.assertEqual(name, self.cache.clip_name("Welcome to Sylvan Learning."))
+        self.assertNotEqual(name, self.cache.clip_name("Welcome to Sylvan Learning!"))
+        self.assertEqual(self.cache.lookup("Welcome to Sylvan Learning."), name)
+        self.assertTrue(os.path.exists(os.path.join(self.dir, name)))
+
+    def test_frequent_lines_are_rendered_in_the_background(self):
+        line = "We cover it all, from elementary math up to Calculus."
+        self.assertIsNone(self.cache.lookup(line))
+        self.assertIsNone(self.cache.lookup(line))
+        self.assertTrue(wait_for(lambda: self.cache.lookup(line) is not None))
+
+    def test_lines_with_personal_data_are_never_rendered(self):
+        line = "Thanks! We'll call you back at 636-555-0142."
+        for _ in range(5):
+            self.assertIsNone(self.cache.lookup(line))
+        time.sleep(0.05)
+        self.assertEqual(self.cache.stats()["rendered"], 0)
+
+    def test_size_bound_evicts_least_recently_played(self):
+        clip_size = len(SilenceEngine().synthesize("x" * 30))
+        cache = AudioCache(self.dir, SilenceEngine(), max_bytes=clip_size * 2)
+        first = cache.render("a" * 30)
+        second = cache.render("b" * 30)
+        cache.lookup("a" * 30)
+        cache.render("c" * 30)
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted([first, cache.clip_name("c" * 30)]))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, second)))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_existing_clips_survive_a_restart(self):
+        name = self.cache.render("One moment while I check on that.")
+        restarted = AudioCache(self.dir, SilenceEngine())
+        self.assertEqual(restarted.lookup("One moment while I check on that."), name)
+
+
+class TestVoicePlayback(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app_module = app
+        self.client = app.app.test_client()
+        self.dir = tempfile.mkdtemp()
+        self.cache = AudioCache(self.dir, SilenceEngine())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_cached_lines_are_played_and_served_immutable(self):
+        name = self.cache.render(self.app_module.NO_INPUT_LINE)
+        with patch.object(self.app_module, 'audio_cache', self.cache):
+            twiml = self.client.post('/voice/handle-input', data={'CallSid': 'CAaudio'}).get_data(as_text=True)
+            self.assertIn(f"<Play>/audio/{name}</Play>", twiml)
+            self.assertNotIn("<Say", twiml)
+
+            response = self.client.get(f'/audio/{name}')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response.headers['Cache-Control'])
+            response.close()
+            self.assertEqual(self.client.get('/audio/..%2Fapp.py').status_code, 404)
+
+    def test_uncached_lines_fall_back_to_say(self):
+        with patch.object(self.app_module, 'audio_cache', self.cache):
+            twiml = self.client.post('/voice/handle-input', data={'CallSid': 'CAaudio2'}).get_data(as_text=True)
+        self.assertIn("<Say voice=\"alice\">I didn't catch that.</Say>", twiml)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+from configparser import ConfigParser
+from unittest.mock import Mock, patch
+
+from channel_profiles import ChannelProfile, ChannelProfiles, SentenceCap, sentence_ends
+from llm_manager import LLMManager
+from telemetry import telemetry
+
+LONG_ANSWER = ("We tutor reading, writing and math for every grade. Sessions run 9 a.m. to 7 p.m. on weekdays. "
+               "Most families start with an assessment. It takes about an hour. Would you like to book one?")
+
+
+def make_manager(**sections):
+    config = ConfigParser()
+    config.read_dict(dict({'llm': {'provider': 'openrouter'}}, **sections))
+    return LLMManager(config, "You are a test receptionist.")
+
+
+class TestChannelProfile(unittest.TestCase):
+    def test_defaults_and_per_provider_overrides(self):
+        config = ConfigParser()
+        config.read_dict({'profile:voice': {'max_tokens': '80', 'local_max_tokens': '60', 'local_stop': 'Caller:'}})
+        profiles = ChannelProfiles(config)
+        voice = profiles.get('voice_async')
+        self.assertEqual(voice.name, 'voice')
+        self.assertEqual(voice.setting('openai', 'max_tokens'), 80)
+        self.assertEqual(voice.setting('local', 'max_tokens'), 60)
+        self.assertEqual(voice.setting('openai', 'stop'), ['\n\n', 'Caller:', 'User:'])
+        self.assertEqual(voice.setting('local', 'stop'), ['Caller:'])
+        self.assertEqual(profiles.get('web_stream').max_sentences, 0)
+        self.assertIsNone(profiles.get(None))
+
+    def test_clip_stops_at_the_sentence_cap(self):
+        voice = ChannelProfile('voice', max_sentences=2)
+        self.assertEqual(voice.clip(LONG_ANSWER),
+                         "We tutor reading, writing and math for every grade. "
+                         "Sessions run 9 a.m. to 7 p.m. on weekdays.")
+        self.assertEqual(voice.clip("Yes, we do."), "Yes, we do.")
+
+    def test_clip_drops_a_fragment_left_by_max_tokens(self):
+        voice = ChannelProfile('voice', max_tokens=80, max_sentences=3)
+        self.assertEqual(voice.clip("We tutor every grade. Most families start with an assessment that",
+                                    truncated=True), "We tutor every grade.")
+        self.assertEqual(voice.clip("Call us at 555 0142", truncated=True), "Call us at 555 0142")
+
+    def test_clip_keeps_an_unpunctuated_ending_when_the_model_finished(self):
+        voice = ChannelProfile('voice', max_tokens=80, max_sentences=3)
+        self.assertEqual(voice.clip("Sure. You can reach us at (636) 552-4351"),
+                         "Sure. You can reach us at (636) 552-4351")
+        self.assertEqual(voice.clip("Yes! Our center is open Monday through Saturday"),
+                         "Yes! Our center is open Monday through Saturday")
+
+    def test_decimals_and_abbreviations_do_not_end_sentences(self):
+        self.assertEqual(len(sentence_ends("Dr. Smith charges 3.5 hours. Done!")), 2)
+
+    def test_no_ends_a_sentence_unless_a_number_follows(self):
+        voice = ChannelProfile('voice', max_sentences=1)
+        self.assertEqual(voice.clip("No. We are closed on Sundays, but Saturday works."), "No.")
+        self.assertEqual(voice.clip("Room No. 5 is upstairs. Ask at the desk."), "Room No. 5 is upstairs.")
+
+    def test_sentence_cap_cuts_a_stream_mid_chunk(self):
+        cap = SentenceCap(2)
+        out = [cap.feed(chunk) for chunk in ["Hi there", ". We tutor math", ". Also reading", " and more."]]
+        self.assertEqual("".join(out), "Hi there. We tutor math.")
+        self.assertTrue(cap.done)
+
+
+class TestManagerProfiles(unittest.TestCase):
+    def test_voice_payload_carries_max_tokens_and_stops(self):
+        manager = make_manager(openrouter={'api_key': 'k'})
+        with manager.profiles.use('voice'):
+            _, _, payload = manager._chat_payload('openrouter', "hi", [])
+        self.assertEqual(payload['max_tokens'], 80)
+        self.assertEqual(payload['stop'], ['\n\n', 'Caller:', 'User:'])
+        with manager.profiles.use('voice'):
+            self.assertEqual(manager._gemini_generation_config(),
+                             {'max_output_tokens': 80, 'stop_sequences': ['\n\n', 'Caller:', 'User:']})
+        _, _, payload = manager._chat_payload('openrouter', "hi", [])
+        self.assertNotIn('max_tokens', payload)
+
+    def test_voice_answers_are_clipped_and_counted(self):
+        manager = make_manager()
+        with patch.object(manager, 'get_openrouter_response', return_value=LONG_ANSWER):
+            voice = manager.get_response("what do you offer for the profile test", [], channel='voice')
+            web = manager.get_response("what do you offer for the profile test", [], channel='web')
+        self.assertEqual(len(sentence_ends(voice)), 3)
+        self.assertEqual(web, LONG_ANSWER)
+        metrics = telemetry.render()
+        self.assertIn('sylvan_clipped_tokens_total{channel="voice",provider="openrouter"}', metrics)
+        self.assertIn('sylvan_output_tokens_total{channel="web",provider="openrouter"}', metrics)
+
+    def test_only_a_length_finish_drops_the_unfinished_tail(self):
+        manager = make_manager(openrouter={'api_key': 'k'})
+        reply = "Sure. You can reach us at (636) 552-4351"
+
+        def completion(finish_reason):
+            response = Mock(status_code=200, headers={})
+            response.json.return_value = {'choices': [{'finish_reason': finish_reason,
+                                                       'message': {'content': reply}}]}
+            return response
+
+        with patch.object(manager, '_chat_request', return_value=completion('stop')):
+            self.assertEqual(manager.get_response("finish reason stop", [], channel='voice'), reply)
+        with patch.object(manager, '_chat_request', return_value=completion('length')):
+            self.assertEqual(manager.get_response("finish reason length", [], channel='voice'), "Sure.")
+
+    def test_disabled_profiles_leave_answers_alone(self):
+        manager = make_manager(llm={'provider': 'openrouter', 'channel_profiles': 'false'})
+        with patch.object(manager, 'get_openrouter_response', return_value=LONG_ANSWER):
+            self.assertEqual(manager.get_response("profiles off", [], channel='voice'), LONG_ANSWER)
+
+    def test_stream_is_closed_once_the_cap_is_reached(self):
+        manager = make_manager()
+        sent = []
+
+        def stream(user_message, history):
+            for word in LONG_ANSWER.split(' '):
+                sent.append(word)
+                yield word + ' '
+
+        with patch.object(manager, 'stream_openrouter_response', side_effect=stream):
+            text = "".join(manager.stream_response("hi", [], channel='voice'))
+        self.assertEqual(len(sentence_ends(text)), 3)
+        self.assertLess(len(sent), len(LONG_ANSWER.split(' ')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from configparser import ConfigParser
+
+from content_bundle import CONTENT_FILES, ContentStore
+
+
+class TestContentStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in CONTENT_FILES:
+            shutil.copy(name, self.dir)
+        config = ConfigParser()
+        config.read_dict({'reload': {'interval': '0'}})
+        self.store = ContentStore(config, self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # Make sure the mtime moves even on coarse-grained filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_unchanged_files_do_not_reload(self):
+        self.assertFalse(self.store.reload())
+
+    def test_edit_swaps_in_a_complete_new_bundle(self):
+        old = self.store.current
+        seen = []
+        self.store.subscribe(seen.append)
+        kb = dict(old.knowledge_base, questions=[{"keywords": ["parking"], "answer": "Park out front."}])
+        self.write('knowledge_base.json', json.dumps(kb))
+
+        self.assertTrue(self.store.reload())
+        new = self.store.current
+        self.assertIsNot(new, old)
+        self.assertEqual(seen, [new])
+        self.assertEqual(new.kb_index.best_answer("where do I find parking"), "Park out front.")
+        self.assertIn("Park out front.", new.retriever.context_note("is there parking")["content"])
+        # The old bundle is untouched for anyone still holding it
+        self.assertIsNone(old.retriever.context_note("is there parking"))
+
+    def test_broken_file_keeps_current_content(self):
+        old = self.store.current
+        self.write('conversation_config.json', '{"keywords": ')
+        self.assertFalse(self.store.reload())
+        self.assertIs(self.store.current, old)
+        self.assertEqual(self.store.stats()["failures"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
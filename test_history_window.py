@@ -0,0 +1,53 @@
+import unittest
+from configparser import ConfigParser
+
+from history_window import HistoryWindow, extract_slots, message_tokens
+from session_store import ConversationSession
+
+
+def make_window(**history):
+    config = ConfigParser()
+    config.read_dict({'history': history})
+    return HistoryWindow(config)
+
+
+class TestSlots(unittest.TestCase):
+    def test_extracts_lead_details(self):
+        slots = extract_slots("My name is Dana, my son is in 3rd grade and needs math. Call 555-123-4567.")
+        self.assertEqual(slots, {'name': 'Dana', 'grade': '3rd grade', 'subject': 'math', 'phone': '555-123-4567'})
+
+
+class TestHistoryWindow(unittest.TestCase):
+    def test_fold_keeps_budget_and_lead_data(self):
+        window = make_window(max_tokens='60')
+        session = ConversationSession("s")
+        session.add_message("user", "My daughter is in 5th grade. You can reach me at 555-987-6543.")
+        session.add_message("assistant", "Thanks! What subject does she need help with?")
+        session.add_message("user", "Reading. " + "She has been struggling a lot this year. " * 5)
+        session.add_message("assistant", "Our reading program would be a great fit.")
+        session.add_message("user", "Do you have weekend times?")
+        session.add_message("assistant", "Yes, Saturday mornings.")
+        window.fold(session)
+
+        self.assertEqual(len(session.history), 3)
+        self.assertLessEqual(sum(message_tokens(m) for m in session.history), 60)
+        self.assertEqual(session.context['slots']['phone'], '555-987-6543')
+        self.assertEqual(session.context['slots']['grade'], '5th grade')
+        self.assertEqual(session.context['summary'], ["My daughter is in 5th grade.", "Reading."])
+
+        note = window.prompt_history(session)[0]
+        self.assertEqual(note['role'], 'system')
+        self.assertIn('phone=555-987-6543', note['content'])
+
+    def test_fit_uses_provider_budget(self):
+        window = make_window(max_tokens='1000', local_max_tokens='25')
+        history = [{"role": "system", "content": "Known details: grade=3rd grade"}]
+        history += [{"role": "user", "content": "x" * 40}, {"role": "assistant", "content": "y" * 20}]
+        self.assertEqual(window.fit(history, 'openai'), history)
+        fitted = window.fit(history, 'local')
+        self.assertEqual([m['role'] for m in fitted], ['system', 'assistant'])
+        self.assertLessEqual(sum(message_tokens(m) for m in fitted), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import threading
+import unittest
+from configparser import ConfigParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_pool import TransportPool, base_url_of
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTransportPool(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/chat/completions"
+        self.pool = TransportPool(ConfigParser())
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_base_url_of(self):
+        self.assertEqual(base_url_of("https://openrouter.ai/api/v1/chat/completions"),
+                         "https://openrouter.ai")
+
+    def test_connections_are_reused(self):
+        transport = self.pool.for_url(self.url)
+        for _ in range(3):
+            self.assertEqual(transport.post(self.url, json={}).status_code, 200)
+
+        self.assertIs(self.pool.for_url(self.url), transport)
+        stats = self.pool.stats()[base_url_of(self.url)]
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["reused"], 2)
+        self.assertEqual(stats["open_idle"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
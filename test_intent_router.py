@@ -0,0 +1,49 @@
+import json
+import unittest
+from configparser import ConfigParser
+
+from intent_router import IntentRouter
+from kb_index import KnowledgeBaseIndex
+from session_store import ConversationSession
+
+with open('knowledge_base.json', encoding='utf-8') as f:
+    KB = json.load(f)
+
+
+def make_router(intents=None):
+    conversation_config = {'intents': intents} if intents else {}
+    return IntentRouter.from_config(ConfigParser(), KnowledgeBaseIndex(KB), conversation_config)
+
+
+class TestIntentRouter(unittest.TestCase):
+    def test_confident_intents_are_answered_from_the_kb(self):
+        router = make_router()
+        pricing = next(q['answer'] for q in KB['questions'] if 'price' in q['keywords'])
+        self.assertEqual(router.route("How much does it cost?"), pricing)
+        self.assertEqual(router.classify("where are you located")[0], 'location')
+        self.assertEqual(router.classify("what are your hours")[0], 'hours')
+
+    def test_ambiguous_or_long_messages_fall_through(self):
+        router = make_router()
+        self.assertIsNone(router.route("hi, my son needs help with algebra"))
+        self.assertIsNone(router.route("do you have weekend hours and what does it cost"))
+        self.assertIsNone(router.route("can I book an assessment"))
+
+    def test_greeting_only_on_the_first_turn(self):
+        router = make_router()
+        session = ConversationSession("s")
+        self.assertIsNotNone(router.route("hello", session))
+        session.add_message("user", "hello")
+        session.add_message("assistant", "Hi there!")
+        self.assertIsNone(router.route("hello", session))
+
+    def test_response_override_and_stats(self):
+        router = make_router({'hours': {'keyword': 'hours', 'response': "We're open Mon-Thu 3-7."}})
+        self.assertEqual(router.route("when are you open"), "We're open Mon-Thu 3-7.")
+        self.assertIsNone(router.route("how much does it cost"))
+        self.assertEqual(router.stats(), {"turns": 2, "absorbed": 1, "absorbed_ratio": 0.5,
+                                          "by_intent": {"hours": 1}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from kb_index import KnowledgeBaseIndex
+
+KB = {
+    "questions": [
+        {"keywords": ["price", "cost", "how much"], "answer": "pricing"},
+        {"keywords": ["hi", "hello"], "answer": "greeting"},
+        {"keywords": ["sat", "test prep"], "answer": "test prep"},
+        {"keywords": ["hours", "open", "time"], "answer": "hours"},
+        {"keywords": ["schedule", "book", "time"], "answer": "scheduling"},
+    ],
+    "default": "fallback",
+}
+
+
+class TestKnowledgeBaseIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = KnowledgeBaseIndex(KB)
+
+    def test_matches_whole_words_only(self):
+        self.assertEqual(self.index.best_answer("this is great"), "fallback")
+        self.assertEqual(self.index.best_answer("what are your hours on saturday"), "hours")
+        self.assertEqual(self.index.best_answer("Hi!"), "greeting")
+
+    def test_plurals_and_phrases(self):
+        self.assertEqual(self.index.best_answer("What are your prices?"), "pricing")
+        self.assertEqual(self.index.best_answer("How much is it"), "pricing")
+        self.assertEqual(self.index.best_answer("any SAT test prep?"), "test prep")
+
+    def test_best_scoring_entry_wins_over_order(self):
+        # "time" is shared; "book" only points at scheduling
+        self.assertEqual(self.index.best_answer("what time can I book"), "scheduling")
+        results = self.index.search("hi, how much for SAT test prep", top_k=3)
+        self.assertEqual(results[0][1], 2)
+        self.assertEqual(len(results), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from keyword_rules import KeywordRules
+
+
+class TestKeywordRules(unittest.TestCase):
+    def test_matches_every_category_in_one_pass(self):
+        rules = KeywordRules({'a': ['he', 'she'], 'b': ['hers'], 'c': ['his']})
+        self.assertEqual(rules.match("USHERS"), {'a', 'b'})
+        self.assertEqual(rules.match("this"), {'c'})
+        self.assertEqual(rules.match("nothing here"), {'a'})
+        self.assertEqual(rules.match("xyz"), set())
+
+    def test_same_results_as_substring_checks(self):
+        categories = {'affirmative': ['yes', 'ok', 'okay', "let's do it"],
+                      'uncertain': ['not sure', 'idk'],
+                      'scheduling': ['book', 'schedule', 'time']}
+        rules = KeywordRules(categories)
+        for text in ["Okay, let's do it", "hmm not sure", "booking sometime", "aaa", ""]:
+            expected = {n for n, ks in categories.items() if any(k in text.lower() for k in ks)}
+            self.assertEqual(rules.match(text), expected, text)
+
+    def test_from_config_fills_default_rules(self):
+        rules = KeywordRules.from_config({'keywords': {'affirmative': ['yep']}})
+        self.assertIn('affirmative', rules.match("yep"))
+        self.assertIn('scheduling_request', rules.match("can I book a visit"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from configparser import ConfigParser
+from unittest.mock import MagicMock, Mock, patch
+
+import requests
+
+from async_llm_manager import AsyncLLMManager
+from llm_manager import STREAM_TRUNCATED, LLMManager, StreamFailed
+
+
+def make_manager(**llm):
+    config = ConfigParser()
+    config.read_dict({'llm': llm})
+    return LLMManager(config, "You are a test receptionist.")
+
+
+def slow(value, delay):
+    def respond(user_message, history):
+        time.sleep(delay)
+        return value
+    return respond
+
+
+class TestProviderChain(unittest.TestCase):
+    def test_chain_follows_configured_provider(self):
+        self.assertEqual(make_manager(provider='local').provider_chain(),
+                         ['local', 'openai', 'gemini', 'openrouter'])
+        self.assertEqual(make_manager(provider='openrouter').provider_chain(),
+                         ['openrouter', 'gemini'])
+
+    def test_serial_falls_through_failures(self):
+        manager = make_manager(provider='openrouter')
+        with patch.object(manager, 'get_openrouter_response', return_value="OPENROUTER_FAILED"), \
+             patch.object(manager, 'get_gemini_response', return_value="From Gemini"):
+            self.assertEqual(manager.get_response("hi", []), "From Gemini")
+
+    def test_hedged_backup_wins_over_slow_primary(self):
+        manager = make_manager(provider='openrouter', mode='hedged', hedge_delay='0.05')
+        with patch.object(manager, 'get_openrouter_response', side_effect=slow("slow", 1.0)), \
+             patch.object(manager, 'get_gemini_response', side_effect=slow("fast", 0.01)):
+            start = time.monotonic()
+            self.assertEqual(manager.get_response("hi", []), "fast")
+            self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_race_prefers_chain_order_and_skips_failures(self):
+        manager = make_manager(provider='openrouter', mode='race')
+        with patch.object(manager, 'get_openrouter_response', side_effect=slow("OPENROUTER_FAILED", 0.01)), \
+             patch.object(manager, 'get_gemini_response', side_effect=slow("backup", 0.05)):
+            self.assertEqual(manager.get_response("hi", []), "backup")
+
+    def test_deadline_bounds_the_turn(self):
+        manager = make_manager(provider='openrouter', mode='hedged', hedge_delay='5', deadline='0.1')
+        with patch.object(manager, 'get_openrouter_response', side_effect=slow("late", 1.0)):
+            start = time.monotonic()
+            self.assertIsNone(manager.get_response("hi", []))
+            self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_deadline_bounds_a_slow_serial_attempt(self):
+        manager = make_manager(provider='openrouter', deadline='0.1')
+        with patch.object(manager, 'get_openrouter_response', side_effect=slow("late", 1.0)), \
+             patch.object(manager, 'get_gemini_response', return_value="From Gemini") as gemini:
+            start = time.monotonic()
+            self.assertIsNone(manager.get_response("hi", []))
+            self.assertLess(time.monotonic() - start, 0.5)
+            gemini.assert_not_called()
+
+
+class _StreamingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        events = [{"choices": [{"delta": {"content": word}}]} for word in ("Hello", " there", ".")]
+        events.append({"choices": [], "usage": {"prompt_tokens": 1200, "completion_tokens": 3,
+                                                "prompt_tokens_details": {"cached_tokens": 1024}}})
+        body = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+        body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPromptPrefix(unittest.TestCase):
+    def test_static_prefix_is_identical_across_turns(self):
+        manager = make_manager(provider='local')
+        history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+        _, _, first = manager._chat_payload('local', "hi", [])
+        _, _, second = manager._chat_payload('local', "how much?", history)
+        self.assertEqual(first["messages"][0], second["messages"][0])
+        self.assertTrue(second["cache_prompt"])
+        self.assertEqual(second["messages"][1:], history + [{"role": "user", "content": "how much?"}])
+
+    def test_hosted_providers_honour_base_url(self):
+        config = ConfigParser()
+        config.read_dict({'llm': {'provider': 'openai'},
+                          'openai': {'api_key': 'k', 'base_url': 'http://127.0.0.1:8901/v1/'},
+                          'openrouter': {'api_key': 'k'}})
+        manager = LLMManager(config, "Test.")
+        self.assertEqual(manager._openai_endpoint('openai')[0], "http://127.0.0.1:8901/v1/chat/completions")
+        self.assertEqual(manager._openai_endpoint('openrouter')[0], "https://openrouter.ai/api/v1/chat/completions")
+
+
+class TestGeminiTurns(unittest.TestCase):
+    def setUp(self):
+        self.manager = make_manager(provider='gemini')
+        self.model = Mock()
+        self.manager.gemini_model = self.model
+
+    def turns(self, history, message):
+        _, sent = self.manager._gemini_chat(history, message)
+        return [turn["role"] for turn in self.model.start_chat.call_args.kwargs["history"]], sent
+
+    def test_first_turn_notes_ride_on_the_message(self):
+        roles, sent = self.turns([{"role": "system", "content": "Facts: we open at 9."}], "when do you open?")
+        self.assertEqual(roles, [])
+        self.assertEqual(sent, "Facts: we open at 9.\n\nwhen do you open?")
+
+    def test_roles_alternate_with_slots_and_retrieval_notes(self):
+        history = [{"role": "system", "content": "Known details: grade=5th"},
+                   {"role": "assistant", "content": "Hi, how can I help?"},
+                   {"role": "user", "content": "math help"},
+                   {"role": "assistant", "content": "We tutor math."},
+                   {"role": "system", "content": "Facts: sessions are an hour."}]
+        roles, sent = self.turns(history, "how long is a session?")
+        self.assertEqual(roles, ["user", "model"])
+        self.assertEqual(sent, "Known details: grade=5th\n\nFacts: sessions are an hour.\n\nhow long is a session?")
+
+
+class TestCoalescing(unittest.TestCase):
+    def test_identical_concurrent_prompts_share_one_call(self):
+        manager = make_manager(provider='openrouter')
+        calls = []
+
+        def respond(user_message, history):
+            calls.append(user_message)
+            time.sleep(0.2)
+            return "One answer for everyone."
+
+        results = []
+        with patch.object(manager, 'get_openrouter_response', side_effect=respond):
+            threads = [threading.Thread(target=lambda: results.append(manager.get_response("hi", [])))
+                       for _ in range(10)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            # A different history is a different prompt
+            manager.get_response("hi", [{"role": "assistant", "content": "Hello!"}])
+        self.assertEqual(results, ["One answer for everyone."] * 10)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(manager.coalesce_stats(), {"calls": 2, "coalesced": 9, "in_flight": 0})
+
+    def test_coalescing_can_be_turned_off(self):
+        manager = make_manager(provider='openrouter', coalesce='false')
+        self.assertEqual(manager.coalesce_stats(), {"enabled": False})
+
+
+class TestAsyncCoalescing(unittest.IsolatedAsyncioTestCase):
+    async def test_cancelled_caller_does_not_cancel_the_shared_call(self):
+        config = ConfigParser()
+        config.read_dict({'llm': {'provider': 'openrouter'}})
+        manager = AsyncLLMManager(config, "You are a test receptionist.")
+        calls = []
+
+        async def respond(user_message, history):
+            calls.append(user_message)
+            await asyncio.sleep(0.2)
+            return "Shared."
+
+        with patch.object(manager, 'get_openrouter_response', side_effect=respond):
+            first = asyncio.ensure_future(manager.get_response("hi", []))
+            await asyncio.sleep(0.05)
+            second = asyncio.ensure_future(manager.get_response("hi", []))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            self.assertEqual(await second, "Shared.")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(manager.coalesce_stats()["coalesced"], 1)
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_stream_parses_server_sent_deltas(self):
+        config = ConfigParser()
+        config.read_dict({'llm': {'provider': 'local'},
+                          'local': {'base_url': f"http://127.0.0.1:{self.server.server_port}/v1"}})
+        manager = LLMManager(config, "system")
+        self.assertEqual(list(manager.stream_response("hi", [])), ["Hello", " there", "."])
+        usage = manager.token_stats()["providers"]["local"]
+        self.assertEqual((usage["prompt_tokens"], usage["cached_tokens"]), (1200, 1024))
+
+    def test_stream_falls_through_before_first_chunk(self):
+        manager = make_manager(provider='openrouter')
+        with patch.object(manager, 'stream_openrouter_response', side_effect=StreamFailed("down")), \
+             patch.object(manager, 'stream_gemini_response', return_value=iter(["backup"])):
+            self.assertEqual(list(manager.stream_response("hi", [])), ["backup"])
+
+    def test_connection_dropped_mid_stream_marks_the_stream_truncated(self):
+        config = ConfigParser()
+        config.read_dict({'llm': {'provider': 'openrouter'}, 'openrouter': {'api_key': 'k'}})
+        manager = LLMManager(config, "system")
+
+        def lines(decode_unicode=False):
+            yield 'data: {"choices": [{"delta": {"content": "We tutor "}}]}'
+            raise requests.exceptions.ChunkedEncodingError("connection broken")
+
+        response = MagicMock(status_code=200, headers={})
+        response.__enter__.return_value = response
+        response.iter_lines.side_effect = lines
+        with patch.object(manager, '_chat_request', return_value=response):
+            self.assertEqual(list(manager.stream_response("hi", [])), ["We tutor ", STREAM_TRUNCATED])
+
+    def test_stream_marks_a_mid_stream_failure(self):
+        manager = make_manager(provider='openrouter')
+
+        def broken(user_message, history):
+            yield "We tutor "
+            raise StreamFailed("connection reset")
+
+        with patch.object(manager, 'stream_openrouter_response', side_effect=broken):
+            self.assertEqual(list(manager.stream_response("hi", [])), ["We tutor ", STREAM_TRUNCATED])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import time
+import unittest
+from configparser import ConfigParser
+from unittest.mock import patch
+
+from llm_manager import LLMManager
+from provider_health import CLOSED, OPEN, HealthTracker, ProviderHealth
+
+
+def make_config(llm=None, health=None):
+    config = ConfigParser()
+    config.read_dict({'llm': llm or {}, 'health': health or {}})
+    return config
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        health = ProviderHealth('openai', failure_threshold=3, cooldown=60)
+        for _ in range(2):
+            health.record(False, 0.1)
+        self.assertTrue(health.allow())
+        health.record(False, 0.1)
+        self.assertEqual(health.state, OPEN)
+        self.assertFalse(health.allow())
+
+    def test_half_open_probe_recovers(self):
+        health = ProviderHealth('openai', failure_threshold=1, cooldown=0.05)
+        health.record(False, 0.1)
+        self.assertFalse(health.allow())
+        time.sleep(0.06)
+        self.assertTrue(health.available())
+        self.assertTrue(health.available())  # asking reserves nothing
+        self.assertTrue(health.allow())     # the probe
+        self.assertFalse(health.allow())    # only one at a time
+        health.record(True, 0.1)
+        self.assertEqual(health.state, CLOSED)
+        self.assertTrue(health.allow())
+
+    def test_failed_probe_reopens(self):
+        health = ProviderHealth('openai', failure_threshold=1, cooldown=0.05)
+        health.record(False, 0.1)
+        time.sleep(0.06)
+        self.assertTrue(health.allow())
+        health.record(False, 0.1)
+        self.assertEqual(health.state, OPEN)
+        self.assertFalse(health.allow())
+
+
+class TestRouting(unittest.TestCase):
+    def test_adaptive_routing_orders_by_p95(self):
+        tracker = HealthTracker(make_config({'adaptive_routing': 'true'}, {'min_samples': '3'}))
+        for _ in range(3):
+            tracker.record('local', True, 2.0)
+            tracker.record('gemini', True, 0.3)
+        self.assertEqual(tracker.route(['local', 'openai', 'gemini']), ['gemini', 'local', 'openai'])
+
+    def test_chain_order_kept_without_adaptive_routing(self):
+        tracker = HealthTracker(make_config())
+        for _ in range(5):
+            tracker.record('local', True, 2.0)
+            tracker.record('gemini', True, 0.3)
+        self.assertEqual(tracker.route(['local', 'gemini']), ['local', 'gemini'])
+
+    def test_manager_skips_open_provider(self):
+        manager = LLMManager(make_config({'provider': 'openrouter'}, {'failure_threshold': '2'}), "Test.")
+        with patch.object(manager, 'get_openrouter_response', return_value="OPENROUTER_FAILED") as openrouter, \
+             patch.object(manager, 'get_gemini_response', return_value="From Gemini"):
+            for _ in range(3):
+                self.assertEqual(manager.get_response("hi", []), "From Gemini")
+        self.assertEqual(openrouter.call_count, 2)
+        self.assertEqual(manager.health_stats()['openrouter']['state'], OPEN)
+        self.assertEqual(manager.routed_chain(), ['gemini'])
+
+    def test_status_reads_do_not_take_the_half_open_probe(self):
+        manager = LLMManager(make_config({'provider': 'openrouter'}, {'failure_threshold': '1', 'cooldown': '0.05'}),
+                             "Test.")
+        manager.health.record('openrouter', False, 0.1)
+        self.assertEqual(manager.routed_chain(), ['gemini'])
+        time.sleep(0.06)
+        for _ in range(3):
+            self.assertEqual(manager.routed_chain(), ['openrouter', 'gemini'])
+        with patch.object(manager, 'get_openrouter_response', return_value="From OpenRouter") as openrouter:
+            self.assertEqual(manager.get_response("status probe", []), "From OpenRouter")
+        self.assertEqual(openrouter.call_count, 1)
+        self.assertEqual(manager.health_stats()['openrouter']['state'], CLOSED)
+
+    def test_taken_probe_falls_through_to_the_next_provider(self):
+        manager = LLMManager(make_config({'provider': 'openrouter'}, {'failure_threshold': '1', 'cooldown': '0.05'}),
+                             "Test.")
+        manager.health.record('openrouter', False, 0.1)
+        time.sleep(0.06)
+        self.assertTrue(manager.health.get('openrouter').allow())    # a probe already in flight
+        with patch.object(manager, 'get_openrouter_response', return_value="From OpenRouter") as openrouter, \
+             patch.object(manager, 'get_gemini_response', return_value="From Gemini"):
+            self.assertEqual(manager.get_response("probe taken", []), "From Gemini")
+        self.assertEqual(openrouter.call_count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
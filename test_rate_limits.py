@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+import unittest
+from configparser import ConfigParser
+from unittest.mock import patch
+
+from llm_manager import LLMManager
+from rate_limits import POLL_INTERVAL, ProviderQuota, RateLimiter, TokenBucket
+from telemetry import Telemetry
+
+
+def make_config(**rate_limits):
+    config = ConfigParser()
+    config.read_dict({'llm': {'provider': 'openrouter'}, 'rate_limits': rate_limits})
+    return config
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refills_at_the_per_minute_rate(self):
+        bucket = TokenBucket(60)
+        now = time.monotonic()
+        self.assertEqual(bucket.wait_time(60, now), 0)
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(1, now), 1.0, places=2)
+        self.assertEqual(bucket.wait_time(1, now + 1.0), 0)
+
+    def test_unlimited_bucket_never_waits(self):
+        bucket = TokenBucket()
+        bucket.take(10 ** 6)
+        self.assertEqual(bucket.wait_time(10 ** 6, time.monotonic()), 0)
+
+
+class TestProviderQuota(unittest.TestCase):
+    def test_voice_goes_ahead_of_queued_web_chat(self):
+        quota = ProviderQuota('openrouter', rpm=1)
+        web, voice = (1, 0), (0, 1)
+        quota.enqueue(web)
+        quota.enqueue(voice)
+        self.assertEqual(quota.poll(web, 10), POLL_INTERVAL)
+        self.assertEqual(quota.poll(voice, 10), 0)
+        # The bucket is now empty, so web chat waits for the refill
+        self.assertGreater(quota.poll(web, 10), 50)
+
+    def test_learns_limits_and_retry_after_from_headers(self):
+        quota = ProviderQuota('openrouter')
+        quota.learn({'x-ratelimit-limit-requests': '20', 'x-ratelimit-remaining-requests': '0'}, 200, 10)
+        self.assertEqual(quota.snapshot()['rpm'], 20)
+        self.assertFalse(quota.has_capacity(1))
+
+        quota = ProviderQuota('openai')
+        quota.learn({'retry-after': '5'}, 429, 10)
+        self.assertAlmostEqual(quota.snapshot()['blocked_for'], 5, places=0)
+        self.assertEqual(quota.snapshot()['throttled'], 1)
+
+
+class TestRateLimitedManager(unittest.TestCase):
+    def test_turns_route_around_an_exhausted_provider(self):
+        manager = LLMManager(make_config(openrouter_rpm='1', queue_timeout='0.1'), "You are a test receptionist.")
+        with patch.object(manager, 'get_openrouter_response', return_value="From OpenRouter"), \
+             patch.object(manager, 'get_gemini_response', return_value="From Gemini"):
+            self.assertEqual(manager.get_response("hi", []), "From OpenRouter")
+            self.assertEqual(manager.routed_chain(), ['gemini', 'openrouter'])
+            self.assertEqual(manager.get_response("hi again", []), "From Gemini")
+
+    def test_queue_timeout_skips_the_provider(self):
+        limiter = RateLimiter(make_config(openrouter_rpm='1', queue_timeout='0.1'))
+        self.assertTrue(limiter.acquire('openrouter', 'key', 10, 'web'))
+        start = time.monotonic()
+        self.assertFalse(limiter.acquire('openrouter', 'key', 10, 'web'))
+        self.assertLess(time.monotonic() - start, 0.5)
+        # Another key has its own quota
+        self.assertTrue(limiter.acquire('openrouter', 'other key', 10, 'web'))
+        stats = limiter.stats()
+        self.assertEqual(sorted(s['granted'] for s in stats.values()), [1, 1])
+
+    def test_queue_depth_and_rejections_are_exported(self):
+        limiter = RateLimiter(make_config(queue_timeout='2', max_queue='1'))
+        limiter.throttle('gemini', 'key', 0.3)
+        with patch('rate_limits.telemetry', Telemetry()) as telemetry:
+            waiter = threading.Thread(target=limiter.acquire, args=('gemini', 'key', 10, 'web'))
+            waiter.start()
+            while not limiter.quota('gemini', 'key').waiters:
+                time.sleep(0.01)
+            # A second waiter overflows max_queue while the first one is still queued
+            self.assertFalse(limiter.acquire('gemini', 'key', 10, 'web'))
+            rendered = telemetry.render()
+            self.assertIn('# TYPE sylvan_ratelimit_queue_depth gauge\n'
+                          'sylvan_ratelimit_queue_depth{provider="gemini"} 1', rendered)
+            self.assertIn('sylvan_ratelimit_rejections_total{provider="gemini",reason="queue_full"} 1', rendered)
+            waiter.join()
+            self.assertIn('sylvan_ratelimit_queue_depth{provider="gemini"} 0', telemetry.render())
+
+    def test_cancelled_waiter_leaves_without_counting_a_rejection(self):
+        limiter = RateLimiter(make_config(queue_timeout='2'))
+        limiter.throttle('gemini', 'key', 1)
+
+        async def cancel_waiter():
+            task = asyncio.ensure_future(limiter.acquire_async('gemini', 'key', 10, 'web'))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_waiter())
+        stats = limiter.quota('gemini', 'key').snapshot()
+        self.assertEqual((stats['queued'], stats['rejected']), (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import unittest
+
+from response_cache import ResponseCache, build_synonyms
+
+KB = {"questions": [
+    {"keywords": ["price", "cost", "how much"], "answer": "It starts at $49."},
+    {"keywords": ["hours", "open"], "answer": "Weekday afternoons."},
+]}
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(synonyms=build_synonyms(KB))
+
+    def test_exact_and_fuzzy_hits(self):
+        self.cache.put("How much does it cost?", [], "Pricing depends on the plan.")
+        self.assertEqual(self.cache.get("how much does it cost", []), "Pricing depends on the plan.")
+        self.assertEqual(self.cache.get("What are your prices?", []), "Pricing depends on the plan.")
+        self.assertEqual(self.cache.get("What does math tutoring cost for my daughter?", []), None)
+        self.cache.put("math tutoring cost", [], "Math plans vary.")
+        self.assertEqual(self.cache.get("What does math tutoring cost for my daughter?", []), "Math plans vary.")
+        self.assertIsNone(self.cache.get("hours?", []))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits_exact"], stats["hits_fuzzy"], stats["misses"]), (2, 1, 2))
+
+    def test_history_fingerprint_separates_entries(self):
+        history = [{"role": "user", "content": "hi"},
+                   {"role": "assistant", "content": "Want to book a checkup?"}]
+        self.cache.put("yes", history, "Great, pick a time.")
+        self.assertIsNone(self.cache.get("yes", []))
+        self.assertEqual(self.cache.get("yes", history), "Great, pick a time.")
+
+    def test_personal_data_is_not_cached(self):
+        self.cache.put("my number is 636 555 1234", [], "Thanks!")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_lru_ttl_and_memory_bounds(self):
+        cache = ResponseCache(max_entries=2, ttl=0.05)
+        cache.put("math", [], "a")
+        cache.put("reading", [], "b")
+        cache.put("writing", [], "c")
+        self.assertIsNone(cache.get("math", []))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("reading", []))
+
+        small = ResponseCache(max_bytes=300)
+        small.put("math", [], "x" * 150)
+        small.put("reading", [], "y" * 150)
+        self.assertEqual(small.stats()["entries"], 1)
+
+    def test_invalidates_one_namespace(self):
+        cache = ResponseCache()
+        cache.put("math", [], "Kirkwood math.", namespace='kirkwood')
+        cache.put("math", [], "Kirkwood voice math.", namespace='kirkwood:voice')
+        cache.put("math", [], "Kirkwoodx math.", namespace='kirkwoodx')
+        cache.invalidate(namespace='kirkwood')
+        self.assertIsNone(cache.get("math", [], namespace='kirkwood'))
+        self.assertIsNone(cache.get("math", [], namespace='kirkwood:voice'))
+        self.assertEqual(cache.get("math", [], namespace='kirkwoodx'), "Kirkwoodx math.")
+        cache.invalidate()
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import threading
 import unittest
 from app import app, conversations, get_session, validate_response
 
@@ -78,5 +79,127 @@ class TestBotImprovements(unittest.TestCase):
         self.assertIn("[CALENDAR_EMBED]", resp)
         self.assertTrue("works best" in resp.lower() or "here" in resp.lower())
 
+    def test_validation_reads_the_content_bundle_once(self):
+        import app as core
+        from app import ConversationSession
+        session = ConversationSession()
+        session.add_message("assistant", "It is $49. Would you like to schedule an assessment?")
+        with patch.object(core, 'current_bundle', wraps=core.current_bundle) as current_bundle:
+            validate_response("yes", "Sure thing.", session)
+        self.assertEqual(current_bundle.call_count, 1)
+
+    def test_chat_stream_appends_calendar_tail(self):
+        """Streamed replies get validate_response's calendar tail in the done event."""
+        import json
+        from app import llm_manager
+        with patch.object(llm_manager, 'stream_response', return_value=iter(["We can ", "help with that."])):
+            response = self.app.post('/api/chat/stream', json={'message': 'I want to book a visit'})
+            body = response.get_data(as_text=True)
+
+        events = [block.split("\n") for block in body.strip().split("\n\n")]
+        names = [lines[0][len("event: "):] for lines in events]
+        self.assertEqual(names, ['session', 'token', 'token', 'done'])
+        done = json.loads(events[-1][1][len("data: "):])
+        self.assertIn("Pick a time", done['tail'])
+        self.assertTrue(done['response'].startswith("We can help with that."))
+        session = conversations[done['session_id']]
+        self.assertIn("[CALENDAR_EMBED]", session.history[-1]['content'])
+
+    def test_answer_registered_after_the_call_ended_is_dropped(self):
+        import app as core
+        with patch.object(core.llm_manager, 'get_response', return_value="We tutor all grades.") as mock_llm:
+            # /voice/status won the race: the session is gone before the answer is registered
+            core.start_async_answer('do you tutor chemistry', 'CA458').result(timeout=5)
+        self.assertNotIn('CA458', core.pending_answers)
+        self.assertNotIn('CA458', conversations)
+        self.assertEqual(len(conversations), 0)
+        self.assertEqual(mock_llm.call_count, 0)
+
+    def test_truncated_stream_is_not_cached(self):
+        from app import llm_manager
+        from llm_manager import STREAM_TRUNCATED
+        message = 'what grades do you cover for the truncation test'
+        partial = iter(["We tutor ", "all gra", STREAM_TRUNCATED])
+        with patch.object(llm_manager, 'stream_response', return_value=partial):
+            body = self.app.post('/api/chat/stream', json={'message': message}).get_data(as_text=True)
+        self.assertNotIn('STREAM_TRUNCATED', body)
+        with patch.object(llm_manager, 'get_response', return_value="We tutor all grades.") as mock_llm:
+            reply = self.app.post('/api/chat', json={'message': message}).get_json()['response']
+        self.assertEqual(mock_llm.call_count, 1)
+        self.assertIn("We tutor all grades.", reply)
+
+    def test_answers_shaped_by_session_details_are_not_shared(self):
+        import app as core
+        message = 'which day works best for the slots test'
+        _, known = get_session(None)
+        known.context = {'slots': {'grade': '5th'}}
+        core.remember_answer(message, known, "Saturday is great for 5th graders.")
+        _, stranger = get_session(None)
+        self.assertIsNone(core.cached_answer(message, stranger))
+        core.remember_answer(message, stranger, "Any weekday afternoon works.")
+        self.assertEqual(core.cached_answer(message, stranger), "Any weekday afternoon works.")
+        self.assertIsNone(core.cached_answer(message, known))
+
+    def test_voice_call_keeps_one_session_per_call_sid(self):
+        from app import llm_manager
+        with patch.object(llm_manager, 'get_response', return_value="We tutor all grades.") as mock_llm:
+            self.app.post('/voice', data={'CallSid': 'CA123'})
+            self.app.post('/voice/handle-input', data={'CallSid': 'CA123', 'SpeechResult': 'Do you tutor math'})
+            self.app.post('/voice/handle-input', data={'CallSid': 'CA123', 'SpeechResult': 'What about reading'})
+
+        self.assertEqual(len(conversations), 1)
+        session = conversations['CA123']
+        # Greeting + two user/assistant turns
+        self.assertEqual(len(session.history), 5)
+        # The second utterance was sent with the first one as context
+        self.assertEqual(mock_llm.call_args[0][1][1]['content'], 'do you tutor math')
+
+        self.app.post('/voice/status', data={'CallSid': 'CA123', 'CallStatus': 'completed'})
+        self.assertNotIn('CA123', conversations)
+
+    def test_async_voice_answers_with_filler_then_poll(self):
+        import app as core
+        release = threading.Event()
+
+        def slow_answer(user_message, history, channel=None):
+            release.wait(5)
+            return "We tutor all grades."
+
+        with patch.object(core, 'VOICE_ASYNC', True), patch.object(core, 'VOICE_POLL_WAIT', 0.05), \
+             patch.object(core.llm_manager, 'get_response', side_effect=slow_answer):
+            filler = self.app.post('/voice/handle-input',
+                                   data={'CallSid': 'CA456', 'SpeechResult': 'Do you help with chemistry'}).data.decode()
+            self.assertIn('<Redirect method="POST">/voice/answer</Redirect>', filler)
+
+            waiting = self.app.post('/voice/answer', data={'CallSid': 'CA456'}).data.decode()
+            self.assertIn('<Pause length="1" />', waiting)
+
+            release.set()
+            with patch.object(core, 'VOICE_POLL_WAIT', 5):
+                answer = self.app.post('/voice/answer', data={'CallSid': 'CA456'}).data.decode()
+        self.assertIn('We tutor all grades.', answer)
+        self.assertNotIn('CA456', core.pending_answers)
+
+    def test_ended_call_does_not_record_its_background_answer(self):
+        import app as core
+        asked, release = threading.Event(), threading.Event()
+
+        def slow_answer(user_message, history, channel=None):
+            asked.set()
+            release.wait(5)
+            return "We tutor all grades."
+
+        with patch.object(core, 'VOICE_ASYNC', True), \
+             patch.object(core.llm_manager, 'get_response', side_effect=slow_answer):
+            self.app.post('/voice', data={'CallSid': 'CA457'})
+            self.app.post('/voice/handle-input', data={'CallSid': 'CA457',
+                                                       'SpeechResult': 'can my nephew get help with his physics lab'})
+            future = core.pending_answers['CA457'][0]
+            self.assertTrue(asked.wait(5))
+            self.app.post('/voice/status', data={'CallSid': 'CA457', 'CallStatus': 'completed'})
+            release.set()
+            future.result(timeout=5)
+        self.assertNotIn('CA457', conversations)
+
 if __name__ == '__main__':
     unittest.main()
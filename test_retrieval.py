@@ -0,0 +1,56 @@
+import json
+import unittest
+
+from history_window import estimate_tokens
+from retrieval import Retriever, build_chunks
+
+
+def load_kb():
+    with open('knowledge_base.json', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_website():
+    with open('website_context.txt', encoding='utf-8') as f:
+        return f.read()
+
+
+class TestRetriever(unittest.TestCase):
+    def setUp(self):
+        self.retriever = Retriever(build_chunks(load_kb(), load_website()))
+
+    def top_ids(self, message, history=()):
+        return [self.retriever.chunks[idx]["id"] for _, idx in
+                self.retriever.search(self.retriever.query_for(message, list(history)))]
+
+    def test_chunks_cover_kb_objections_and_website_sections(self):
+        ids = [c["id"] for c in self.retriever.chunks]
+        self.assertIn("kb:price", ids)
+        self.assertIn("objection:too_expensive", ids)
+        self.assertIn("web:services offered", ids)
+
+    def test_relevant_entries_rank_first(self):
+        self.assertEqual(self.top_ids("How much does tutoring cost?")[0], "kb:price")
+        self.assertEqual(self.top_ids("my daughter is struggling with algebra")[0], "kb:math")
+        self.assertIn("web:services offered", self.top_ids("can you help him get ready for the GED"))
+
+    def test_recent_history_steers_follow_ups(self):
+        history = [{"role": "user", "content": "Can I schedule an assessment?"},
+                   {"role": "assistant", "content": "Sure, when works?"}]
+        self.assertIn("kb:schedule", self.top_ids("yes the afternoon works", history))
+
+    def test_note_stays_within_budget_as_the_kb_grows(self):
+        kb = load_kb()
+        kb["questions"] = kb["questions"] + [
+            {"keywords": [f"math club {i}"], "answer": f"Math club {i} meets on Fridays. " * 5} for i in range(2000)]
+        retriever = Retriever(build_chunks(kb), top_k=4, max_tokens=200)
+        note = retriever.context_note("do you have a math club")
+        self.assertLessEqual(estimate_tokens(note["content"]), 200 + 10)
+        self.assertLessEqual(note["content"].count("\n- "), 4)
+
+    def test_unrelated_message_gets_no_note(self):
+        self.assertIsNone(self.retriever.context_note("zzz qqq"))
+
+
+if __name__ == '__main__':
+    unittest.main()
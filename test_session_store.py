@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from session_store import ConversationSession, MemorySessionStore, SQLiteSessionStore
+
+
+def session_with(session_id, *messages):
+    session = ConversationSession(session_id)
+    for role, content in messages:
+        session.add_message(role, content)
+    return session
+
+
+class TestMemorySessionStore(unittest.TestCase):
+    def test_lru_cap_evicts_least_recently_saved(self):
+        store = MemorySessionStore(max_sessions=2)
+        for sid in ("a", "b"):
+            store.save(session_with(sid))
+        store.save(store["a"])
+        store.save(session_with("c"))
+        self.assertNotIn("b", store)
+        self.assertIn("a", store)
+        self.assertEqual(store.stats()["evicted"], 1)
+
+    def test_expired_sessions_are_dropped(self):
+        store = MemorySessionStore(ttl=60)
+        old = session_with("old")
+        old.last_active -= 120
+        store.save(old)
+        store.save(session_with("new"))
+        self.assertIsNone(store.get("old"))
+        self.assertEqual(len(store), 1)
+
+
+class TestSQLiteSessionStore(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.unlink(self.path + suffix)
+
+    def test_history_survives_a_new_store_instance(self):
+        session = session_with("call-1", ("user", "My son is in 5th grade"), ("assistant", "Got it!"))
+        session.context["grade"] = "5th"
+        SQLiteSessionStore(self.path).save(session)
+
+        restored = SQLiteSessionStore(self.path)["call-1"]
+        self.assertEqual(restored.history, session.history)
+        self.assertEqual(restored.context, {"grade": "5th"})
+        self.assertTrue(SQLiteSessionStore(self.path).delete("call-1"))
+        self.assertNotIn("call-1", SQLiteSessionStore(self.path))
+
+    def test_sweep_applies_ttl_and_cap(self):
+        store = SQLiteSessionStore(self.path, ttl=60, max_sessions=2, sweep_interval=0)
+        stale = session_with("stale")
+        stale.last_active -= 120
+        store.save(stale)
+        for sid in ("a", "b", "c"):
+            store.save(session_with(sid))
+        self.assertIsNone(store.get("stale"))
+        self.assertEqual(store.stats()["sessions"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from response_cache import MessageNormalizer
+from speculation import Speculator
+
+NORMALIZER = MessageNormalizer({"weekend": "kb1", "saturday": "kb1", "price": "kb2", "cost": "kb2"})
+
+
+def candidate(message, cost=100):
+    return (message, NORMALIZER.tokens(message), [], cost)
+
+
+class TestSpeculator(unittest.TestCase):
+    def test_matching_message_gets_the_pregenerated_answer(self):
+        speculator = Speculator(top_n=2)
+        speculator.speculate('s1', 'turn1', [candidate("do you have weekend times"), candidate("how much does it cost")],
+                             lambda message, history: f"answer to {message}")
+        self.assertEqual(speculator.lookup('s1', 'turn1', NORMALIZER.tokens("any times on saturday?")),
+                         "answer to do you have weekend times")
+        stats = speculator.stats()
+        self.assertEqual((stats["started"], stats["hits"], stats["hit_rate"]), (2, 1, 1.0))
+
+    def test_slot_is_tied_to_the_turn_it_follows(self):
+        speculator = Speculator()
+        speculator.speculate('s1', 'turn1', [candidate("how much does it cost")], lambda m, h: "It is $49.")
+        self.assertIsNone(speculator.lookup('s1', 'turn2', NORMALIZER.tokens("what is the price")))
+        speculator.speculate('s1', 'turn1', [candidate("how much does it cost")], lambda m, h: "It is $49.")
+        self.assertIsNone(speculator.lookup('s1', 'turn1', NORMALIZER.tokens("do you tutor chemistry")))
+        self.assertEqual(speculator.stats()["misses"], 1)
+
+    def test_budgets_drop_predictions_instead_of_queueing(self):
+        release = threading.Event()
+        speculator = Speculator(top_n=3, max_concurrent=1, tokens_per_minute=250)
+        speculator.speculate('s1', 't', [candidate("how much does it cost"), candidate("weekend times")],
+                             lambda m, h: release.wait(2) and "slow")
+        speculator.speculate('s2', 't', [candidate("how much does it cost")], lambda m, h: "never")
+        stats = speculator.stats()
+        self.assertEqual((stats["started"], stats["dropped_concurrency"]), (1, 2))
+        release.set()
+        self.assertEqual(speculator.lookup('s1', 't', NORMALIZER.tokens("how much is the price")), "slow")
+        speculator.speculate('s3', 't', [candidate("weekend times", cost=200)], lambda m, h: "over budget")
+        self.assertEqual(speculator.stats()["dropped_budget"], 1)
+
+    def test_call_still_running_is_joined_not_repeated(self):
+        release, calls = threading.Event(), []
+
+        def generate(message, history):
+            calls.append(message)
+            release.wait(2)
+            return "It is $49."
+
+        speculator = Speculator()
+        speculator.speculate('s1', 't', [candidate("how much does it cost")], generate)
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(speculator.lookup('s1', 't', NORMALIZER.tokens("how much is the price")), "It is $49.")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((speculator.stats()["joined"], speculator.stats()["hits"]), (1, 1))
+
+
+class TestAppSpeculation(unittest.TestCase):
+    def setUp(self):
+        import app
+        self.app_module = app
+        self.client = app.app.test_client()
+
+    def drain(self):
+        deadline = time.monotonic() + 2
+        while self.app_module.speculator.stats()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_next_message_is_served_from_the_speculative_slot(self):
+        calls = []
+
+        def answer(message, history, channel=None):
+            calls.append((message, channel))
+            if len(calls) == 1:
+                return "We'd be glad to help. Want to book an assessment for the speculation test?"
+            return f"Yes, we have openings ({message})."
+
+        with patch.object(self.app_module, 'speculator', Speculator(top_n=2)), \
+             patch.object(self.app_module.llm_manager, 'get_response', side_effect=answer):
+            first = self.client.post('/api/chat', json={'message': "my son needs help with fractions, speculation"})
+            session_id = first.get_json()['session_id']
+            self.drain()
+            reply = self.client.post('/api/chat', json={'message': "are there times on weekends",
+                                                        'session_id': session_id}).get_json()['response']
+            self.drain()
+            stats = self.app_module.speculator.stats()
+        self.assertIn("do you have times on weekends", reply)
+        # The real message never reached the provider; later calls speculate on the next turn
+        self.assertNotIn("are there times on weekends", [message for message, _ in calls])
+        self.assertEqual({channel for _, channel in calls}, {'web'})
+        self.assertEqual(stats["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
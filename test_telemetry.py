@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+from configparser import ConfigParser
+from unittest.mock import patch
+
+from llm_manager import LLMManager
+from telemetry import Telemetry
+
+
+def make_telemetry(**options):
+    config = ConfigParser()
+    config.read_dict({'telemetry': options})
+    return Telemetry(config)
+
+
+class TestTelemetry(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_render_prometheus_text(self):
+        telemetry = make_telemetry()
+        telemetry.count('sylvan_fallbacks_total', provider='local')
+        telemetry.observe('sylvan_span_seconds', 0.2, span='provider', provider='local')
+        text = telemetry.render({'local': {'prompt_tokens': 10, 'cached_tokens': 4, 'completion_tokens': 3}})
+        self.assertIn('# TYPE sylvan_fallbacks_total counter', text)
+        self.assertIn('sylvan_fallbacks_total{provider="local"} 1', text)
+        self.assertIn('sylvan_span_seconds_bucket{provider="local",span="provider",le="0.1"} 0', text)
+        self.assertIn('sylvan_span_seconds_bucket{provider="local",span="provider",le="0.25"} 1', text)
+        self.assertIn('sylvan_span_seconds_count{provider="local",span="provider"} 1', text)
+        self.assertIn('sylvan_tokens_total{kind="cached",provider="local"} 4', text)
+
+    def test_sampled_turn_is_written_with_spans(self):
+        telemetry = make_telemetry(sample_rate='1', trace_path=self.path)
+        with telemetry.turn('web'):
+            with telemetry.span('session_fetch'):
+                pass
+            telemetry.record_span('provider_first_token', 0.05, provider='gemini')
+        with open(self.path) as f:
+            trace = json.loads(f.readline())
+        self.assertEqual(trace['channel'], 'web')
+        self.assertEqual([s['span'] for s in trace['spans']], ['session_fetch', 'provider_first_token'])
+        self.assertEqual(trace['spans'][1]['provider'], 'gemini')
+
+    def test_unsampled_fast_turn_is_not_written(self):
+        telemetry = make_telemetry(sample_rate='0', trace_path=self.path)
+        with telemetry.turn('voice'):
+            pass
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertIn('sylvan_turns_total{channel="voice"} 1', telemetry.render())
+
+    def test_hedged_attempts_join_the_turn_trace(self):
+        config = ConfigParser()
+        config.read_dict({'llm': {'provider': 'openrouter', 'mode': 'race'}})
+        manager = LLMManager(config, "Test.")
+        telemetry = make_telemetry(sample_rate='1', trace_path=self.path)
+        with patch('llm_manager.telemetry', telemetry), \
+             patch.object(manager, 'get_openrouter_response', return_value="OPENROUTER_FAILED"), \
+             patch.object(manager, 'get_gemini_response', return_value="From Gemini"):
+            with telemetry.turn('web'):
+                self.assertEqual(manager.get_response("hi", []), "From Gemini")
+        with open(self.path) as f:
+            spans = json.loads(f.readline())['spans']
+        self.assertEqual(sorted(s['provider'] for s in spans), ['gemini', 'openrouter'])
+        self.assertIn('sylvan_fallbacks_total{provider="openrouter"} 1', telemetry.render())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from configparser import ConfigParser
+from types import SimpleNamespace
+
+from content_bundle import CONTENT_FILES
+from tenants import Tenant, TenantRegistry, normalize_host, normalize_number
+
+
+class FakeManager:
+    def __init__(self, config, system_prompt):
+        self.config = config
+        self.system_prompt = system_prompt
+
+    def set_system_prompt(self, prompt):
+        self.system_prompt = prompt
+
+
+class TestTenantRegistry(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in CONTENT_FILES:
+            shutil.copy(name, self.dir)
+        with open('system_context.json', encoding='utf-8') as f:
+            self.system_context = json.load(f)
+        self.config = ConfigParser()
+        self.config.read_dict({'reload': {'interval': '0'}, 'llm': {'provider': 'gemini'},
+                               'tenants': {'max_loaded': '2'}})
+        self.add_tenant('chesterfield', '+1 (636) 555-0100', 'chesterfield.example.com',
+                        phone='(636) 555-0100', provider='openai')
+        self.add_tenant('kirkwood', '314-555-0199', 'kirkwood.example.com')
+        self.add_tenant('ofallon', '636-555-0177', 'ofallon.example.com')
+        self.default = Tenant('', self.config, None, None)
+        self.registry = TenantRegistry(self.config, self.default, FakeManager, base_dir=self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def add_tenant(self, tenant_id, number, host, phone=None, provider=None):
+        tenant_dir = os.path.join(self.dir, 'tenants', tenant_id)
+        os.makedirs(tenant_dir)
+        with open(os.path.join(tenant_dir, 'tenant.ini'), 'w') as f:
+            f.write(f"[tenant]\nnumbers = {number}\nhosts = {host}\n")
+            if provider:
+                f.write(f"\n[llm]\nprovider = {provider}\n")
+        if phone:
+            context = json.loads(json.dumps(self.system_context))
+            context['business_profile']['contact']['phone'] = phone
+            with open(os.path.join(tenant_dir, 'system_context.json'), 'w', encoding='utf-8') as f:
+                json.dump(context, f)
+
+    def test_normalization(self):
+        self.assertEqual(normalize_number('+16365550100'), '6365550100')
+        self.assertEqual(normalize_number('(636) 555-0100'), '6365550100')
+        self.assertEqual(normalize_host('Kirkwood.Example.com:5000'), 'kirkwood.example.com')
+
+    def test_resolves_by_number_then_host(self):
+        self.assertEqual(self.registry.resolve('+16365550100', 'other.example.com').id, 'chesterfield')
+        self.assertEqual(self.registry.resolve(None, 'kirkwood.example.com:443').id, 'kirkwood')
+        self.assertIs(self.registry.resolve('+15555550000', 'localhost'), self.default)
+
+    def test_tenant_overrides_files_and_config(self):
+        tenant = self.registry.get('chesterfield')
+        bundle = tenant.content.current
+        self.assertEqual(bundle.system_config['business_profile']['contact']['phone'], '(636) 555-0100')
+        self.assertIn('(636) 555-0100', tenant.llm_manager.system_prompt)
+        # Files the tenant does not override come from the base directory
+        self.assertTrue(bundle.knowledge_base.get('questions'))
+        self.assertEqual(tenant.config.get('llm', 'provider'), 'openai')
+        self.assertEqual(self.registry.get('kirkwood').config.get('llm', 'provider'), 'gemini')
+
+    def test_gemini_credentials_cannot_be_overridden_per_tenant(self):
+        self.config.read_dict({'gemini': {'api_key': 'base-key'}})
+        with open(os.path.join(self.dir, 'tenants', 'kirkwood', 'tenant.ini'), 'a') as f:
+            f.write("\n[gemini]\napi_key = kirkwood-key\napi_endpoint = gemini.example.com\nmodel = gemini-flash\n")
+        config = self.registry.get('kirkwood').config
+        self.assertEqual(config.get('gemini', 'api_key'), 'base-key')
+        self.assertFalse(config.has_option('gemini', 'api_endpoint'))
+        # Per-call settings still override
+        self.assertEqual(config.get('gemini', 'model'), 'gemini-flash')
+
+    def test_lru_is_bounded(self):
+        first = self.registry.get('chesterfield')
+        self.registry.get('kirkwood')
+        self.assertIs(self.registry.get('chesterfield'), first)
+        self.registry.get('ofallon')
+        stats = self.registry.stats()
+        self.assertEqual(stats['loaded'], ['chesterfield', 'ofallon'])
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['known'], 3)
+
+    def test_content_reload_is_reported_per_tenant(self):
+        reloaded = []
+        registry = TenantRegistry(self.config, self.default, FakeManager, base_dir=self.dir,
+                                  on_content=lambda tenant_id, bundle: reloaded.append(tenant_id))
+        tenant = registry.get('kirkwood')
+        registry.get('chesterfield')
+        self.assertEqual(reloaded, ['kirkwood', 'chesterfield'])
+        self.assertTrue(tenant.content.reload(force=True))
+        self.assertEqual(reloaded[-1], 'kirkwood')
+
+    def test_cold_tenant_builds_once_without_blocking_loaded_ones(self):
+        release, builds = threading.Event(), []
+
+        def slow_factory(config, system_prompt):
+            if config.get('llm', 'provider') == 'openai':
+                builds.append(system_prompt)
+                release.wait(5)
+            return FakeManager(config, system_prompt)
+
+        registry = TenantRegistry(self.config, self.default, slow_factory, base_dir=self.dir)
+        kirkwood = registry.get('kirkwood')
+        cold = [threading.Thread(target=registry.get, args=('chesterfield',)) for _ in range(3)]
+        for thread in cold:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while not builds and time.monotonic() < deadline:
+            time.sleep(0.01)
+        start = time.perf_counter()
+        self.assertIs(registry.get('kirkwood'), kirkwood)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        release.set()
+        for thread in cold:
+            thread.join(5)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(registry.stats()['loaded'], ['kirkwood', 'chesterfield'])
+
+    def test_cold_tenant_loads_in_milliseconds(self):
+        start = time.perf_counter()
+        self.registry.get('kirkwood')
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+class TestTenantRequests(unittest.TestCase):
+    def test_calendar_fallback_uses_the_tenants_phone(self):
+        import app
+        content = SimpleNamespace(current=SimpleNamespace(
+            system_config={'business_profile': {'contact': {'phone': '(314) 555-0199'}}}))
+        config = ConfigParser()
+        token = app._tenant.set(Tenant('kirkwood', config, content, app.llm_manager))
+        try:
+            self.assertEqual(app.render_calendar_embed('[CALENDAR_EMBED]'),
+                             'Please contact us at (314) 555-0199 to schedule an appointment.')
+        finally:
+            app._tenant.reset(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
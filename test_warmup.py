@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from configparser import ConfigParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_manager import LLMManager
+from warmup import BootClock, Warmup
+
+
+class _PrimingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    payloads = []
+
+    def do_POST(self):
+        self.payloads.append(json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0)))))
+        body = json.dumps({"choices": [{"message": {"content": "H"}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        _PrimingHandler.payloads = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _PrimingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.config = ConfigParser()
+        self.config.read_dict({'llm': {'provider': 'local'},
+                               'local': {'base_url': f"http://127.0.0.1:{self.server.server_port}/v1"},
+                               'warmup': {'keepalive_interval': '0.05'}})
+        self.manager = LLMManager(self.config, "You are a test receptionist.")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_primes_configured_providers_with_the_system_prompt(self):
+        warmup = Warmup(self.manager, self.config)
+        warmup.run_once()
+        self.assertTrue(warmup.results['local']['ok'])
+        self.assertTrue(warmup.results['openai']['skipped'])
+        self.assertTrue(warmup.results['gemini']['skipped'])
+        self.assertTrue(warmup.results['openrouter']['skipped'])
+        payload = _PrimingHandler.payloads[0]
+        self.assertEqual(payload['max_tokens'], 1)
+        self.assertEqual(payload['messages'][0]['content'], "You are a test receptionist.")
+        self.assertEqual(payload['keep_alive'], '30m')
+        stats = self.manager.pool_stats()
+        self.assertEqual([s['open_idle'] for s in stats.values()], [1])
+
+    def test_keepalive_pings_keep_the_local_model_resident(self):
+        warmup = Warmup(self.manager, self.config)
+        warmup.start()
+        try:
+            deadline = time.monotonic() + 2
+            while warmup.keepalives < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            warmup.stop()
+        self.assertGreaterEqual(warmup.keepalives, 2)
+        self.assertGreaterEqual(len(_PrimingHandler.payloads), 3)
+
+    def test_unreachable_provider_is_reported_not_raised(self):
+        closed = ThreadingHTTPServer(("127.0.0.1", 0), _PrimingHandler)
+        closed.server_close()
+        self.config.set('local', 'base_url', f"http://127.0.0.1:{closed.server_port}/v1")
+        result = Warmup(self.manager, self.config).prime('local')
+        self.assertFalse(result['ok'])
+        self.assertIn('error', result)
+
+
+class TestBootClock(unittest.TestCase):
+    def test_stages_are_recorded_once(self):
+        clock = BootClock()
+        self.assertIsNotNone(clock.mark('ready'))
+        self.assertIsNone(clock.mark('ready'))
+        clock.first_response('local')
+        clock.first_response('gemini')
+        stats = clock.stats()
+        self.assertEqual(stats['first_response_provider'], 'local')
+        self.assertLessEqual(stats['stages_seconds']['ready'], stats['stages_seconds']['first_response'])
+
+    def test_local_only_start_does_not_import_the_gemini_sdk(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False) as f:
+            f.write("[llm]\nprovider = local\n\n[warmup]\nenabled = false\n")
+        try:
+            env = dict(os.environ, SYLVAN_CONFIG=f.name)
+            out = subprocess.run([sys.executable, '-c', "import app, sys; print('google.generativeai' in sys.modules)"],
+                                 capture_output=True, text=True, env=env, timeout=60,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+        finally:
+            os.remove(f.name)
+        self.assertEqual(out.stdout.strip().splitlines()[-1], "False", out.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from telemetry import telemetry
+
+
+class BootClock:
+    """Start-up milestones of this process, in seconds since it began importing the app.
+
+    app.py imports this module before anything heavy, so 'ready' is the
+    import cost of the app. 'warm' is when every provider has been primed
+    and 'first_response' is the first valid provider answer after a
+    deploy. Each stage is recorded once and exported as the
+    sylvan_boot_seconds{stage} gauge.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {}
+        self.first_provider = None
+        self._lock = threading.Lock()
+
+    def mark(self, stage):
+        """Record a stage; returns its seconds since start, or None if it was already recorded."""
+        with self._lock:
+            if stage in self.stages:
+                return None
+            seconds = time.monotonic() - self.started
+            self.stages[stage] = seconds
+        telemetry.gauge('sylvan_boot_seconds', round(seconds, 3), stage=stage)
+        return seconds
+
+    def ready(self, budget_ms=0):
+        """Module set-up is done; warns when it took longer than budget_ms."""
+        seconds = self.mark('ready')
+        if seconds is not None and budget_ms and seconds * 1000 > budget_ms:
+            print(f"[WARN] Start-up took {seconds * 1000:.0f} ms, over the {budget_ms:.0f} ms "
+                  f"[warmup] import_budget_ms.")
+
+    def first_response(self, provider):
+        if 'first_response' in self.stages:
+            return
+        seconds = self.mark('first_response')
+        if seconds is not None:
+            self.first_provider = provider
+            print(f"[HEALTH] First good response from {provider} {seconds:.2f}s after start.")
+
+    def stats(self):
+        return {"stages_seconds": {stage: round(s, 3) for stage, s in self.stages.items()},
+                "first_response_provider": self.first_provider}
+
+
+# One clock per process
+boot = BootClock()
+
+
+class Warmup:
+    """Background warm-up so the first caller after a deploy does not pay for it.
+
+    Once at start, every provider in the chain gets a priming request
+    (LLMManager.prime): it opens the pooled keep-alive connection, caches
+    the system prompt prefix and, for Ollama, loads the model. Unconfigured
+    providers are skipped. While the chain includes 'local', a priming
+    request is repeated every [warmup] keepalive_interval seconds so the
+    model stays resident between quiet spells.
+    """
+
+    def __init__(self, manager, config):
+        self.manager = manager
+        self.enabled = config.getboolean('warmup', 'enabled', fallback=True)
+        self.keepalive_interval = config.getfloat('warmup', 'keepalive_interval', fallback=240)
+        self.results = {}
+        self.keepalives = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.run_once()
+        if 'local' not in self.manager.provider_chain() or self.keepalive_interval <= 0:
+            return
+        while not self._stop.wait(self.keepalive_interval):
+            self.results['local'] = self.prime('local')
+            self.keepalives += 1
+
+    def run_once(self):
+        for name in self.manager.provider_chain():
+            self.results[name] = self.prime(name)
+        boot.mark('warm')
+        primed = [name for name, result in self.results.items() if result.get('ok')]
+        print(f"[HEALTH] Warm-up done; primed {', '.join(primed) or 'no providers'}.")
+
+    def prime(self, name):
+        start = time.monotonic()
+        try:
+            ok = self.manager.prime(name)
+        except Exception as e:
+            print(f"[WARN] Warm-up of {name} failed: {type(e).__name__}: {e}")
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if ok is None:
+            return {"ok": False, "skipped": True}
+        seconds = time.monotonic() - start
+        telemetry.gauge('sylvan_warmup_seconds', round(seconds, 3), provider=name)
+        return {"ok": ok, "ms": round(seconds * 1000, 1)}
+
+    def stats(self):
+        return {"enabled": self.enabled, "keepalive_interval": self.keepalive_interval,
+                "keepalives": self.keepalives, "providers": dict(self.results)}